@@ -0,0 +1,160 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langgraph.constants import TAG_NOSTREAM
+
+from agent.concurrency import llm_slot, run_blocking
+from agent.models import get_model
+
+# Opt-in: with SQL_CANDIDATES > 1, generate_sql fires that many generations at
+# once and keeps the best valid one instead of retrying one at a time
+SQL_CANDIDATES = int(os.getenv("SQL_CANDIDATES", "1"))
+# Variants are (role, temperature) pairs; both lists are cycled, so
+# SQL_CANDIDATE_ROLES=sql,sql_alt with MODEL_SQL_ALT set mixes two models
+SQL_CANDIDATE_TEMPERATURES = [float(t) for t in os.getenv("SQL_CANDIDATE_TEMPERATURES", "0,0.4,0.8").split(",")]
+SQL_CANDIDATE_ROLES = os.getenv("SQL_CANDIDATE_ROLES", "sql").split(",")
+# "first": the first candidate that validates wins and the rest are dropped;
+# "cheapest": wait for all of them and take the lowest estimated cost
+SQL_CANDIDATE_PICK = os.getenv("SQL_CANDIDATE_PICK", "first")
+
+_candidate_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sql-candidate")
+
+
+class Candidate:
+    """One generated query and what validation made of it."""
+
+    def __init__(self, index, role, temperature, sql, gen_ms):
+        self.index = index
+        self.role = role
+        self.temperature = temperature
+        self.sql = sql
+        self.gen_ms = gen_ms
+        self.canonical = ""
+        self.error = ""
+        self.cost = None
+
+    @property
+    def valid(self):
+        return not self.error
+
+    def describe(self):
+        cost = f", ~{self.cost:,.0f} rows" if self.cost is not None else ""
+        return f"#{self.index} ({self.role}, t={self.temperature:g}{cost})"
+
+
+def candidate_variants(n=None):
+    n = n or SQL_CANDIDATES
+    return [
+        (SQL_CANDIDATE_ROLES[i % len(SQL_CANDIDATE_ROLES)], SQL_CANDIDATE_TEMPERATURES[i % len(SQL_CANDIDATE_TEMPERATURES)])
+        for i in range(n)
+    ]
+
+
+def _chain(prompt, role, temperature):
+    # Tagged nostream: N interleaved token streams would be unreadable, the
+    # winner is shown once it is picked
+    return (prompt | get_model(role).bind(temperature=temperature)).with_config(tags=[TAG_NOSTREAM])
+
+
+def _apply_validation(candidate, validate):
+    # validate(sql) -> (cleaned sql, canonical, error, estimated rows)
+    candidate.sql, candidate.canonical, candidate.error, candidate.cost = validate(candidate.sql)
+    return candidate
+
+
+def _pick(done, pick):
+    valid = [c for c in done if c.valid]
+    if not valid:
+        # Nothing usable: hand over the first one, the normal retry path takes it from there
+        return done[0]
+    if pick == "cheapest":
+        return min(valid, key=lambda c: c.cost if c.cost is not None else float("inf"))
+    return valid[0]
+
+
+def _report(best, done, n, started):
+    valid = sum(c.valid for c in done)
+    return (
+        f"{n} SQL candidates, {len(done)} evaluated, {valid} valid, picked {best.describe()} "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+
+def _generate_one(index, prompt, role, temperature, inputs, validate):
+    started = time.perf_counter()
+    response = _chain(prompt, role, temperature).invoke(inputs)
+    candidate = Candidate(index, role, temperature, response.content, (time.perf_counter() - started) * 1000)
+    return _apply_validation(candidate, validate)
+
+
+def generate_candidates(prompt, inputs, validate, variants=None, pick=None):
+    """
+    Runs every variant on a thread pool, validates each result as it lands
+    (guardrail + EXPLAIN dry run) and returns (best Candidate, report).
+    """
+    variants = variants or candidate_variants()
+    pick = pick or SQL_CANDIDATE_PICK
+    started = time.perf_counter()
+    futures = [
+        _candidate_executor.submit(
+            contextvars.copy_context().run, _generate_one, i, prompt, role, temperature, inputs, validate
+        )
+        for i, (role, temperature) in enumerate(variants, 1)
+    ]
+
+    done = []
+    for future in as_completed(futures):
+        try:
+            done.append(future.result())
+        except Exception:
+            # A failed request is just one candidate fewer
+            continue
+        if pick == "first" and done[-1].valid:
+            break
+    for future in futures:
+        future.cancel()
+    if not done:
+        raise RuntimeError("every SQL candidate generation failed")
+
+    best = _pick(done, pick)
+    return best, _report(best, done, len(variants), started)
+
+
+async def _agenerate_one(index, prompt, role, temperature, inputs, validate):
+    started = time.perf_counter()
+    async with llm_slot():
+        response = await _chain(prompt, role, temperature).ainvoke(inputs)
+    candidate = Candidate(index, role, temperature, response.content, (time.perf_counter() - started) * 1000)
+    return await run_blocking(_apply_validation, candidate, validate)
+
+
+async def agenerate_candidates(prompt, inputs, validate, variants=None, pick=None):
+    """Async counterpart of generate_candidates; losing requests are cancelled."""
+    variants = variants or candidate_variants()
+    pick = pick or SQL_CANDIDATE_PICK
+    started = time.perf_counter()
+    tasks = [
+        asyncio.ensure_future(_agenerate_one(i, prompt, role, temperature, inputs, validate))
+        for i, (role, temperature) in enumerate(variants, 1)
+    ]
+
+    done = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                done.append(await next_done)
+            except Exception:
+                continue
+            if pick == "first" and done[-1].valid:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+    if not done:
+        raise RuntimeError("every SQL candidate generation failed")
+
+    best = _pick(done, pick)
+    return best, _report(best, done, len(variants), started)
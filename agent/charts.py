@@ -0,0 +1,289 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Rendered PNGs kept in memory, least recently used dropped first past this size
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Column names that mark a time axis or a share of a whole
+_TIME_NAME_RE = re.compile(r"(date|day|week|month|quarter|year|period|time)", re.IGNORECASE)
+_SHARE_NAME_RE = re.compile(r"(weight|pct|percent|share|allocation|exposure|market_value)", re.IGNORECASE)
+_ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}(-\d{2})?")
+
+MAX_CATEGORIES = 25
+MAX_SERIES = 4
+PIE_MAX_SLICES = 6
+
+
+class ChartSpec:
+    """What to draw: chart kind, the x column, the value columns and an optional series column."""
+
+    def __init__(self, kind, x, y, series=None):
+        self.kind = kind
+        self.x = x
+        self.y = list(y)
+        self.series = series
+
+    @property
+    def title(self):
+        values = ", ".join(c.replace("_", " ") for c in self.y)
+        split = f" per {self.series.replace('_', ' ')}" if self.series else ""
+        return f"{values}{split} by {self.x.replace('_', ' ')}".capitalize() if self.x else values.capitalize()
+
+    def __repr__(self):
+        return f"ChartSpec({self.kind}, x={self.x}, y={self.y}, series={self.series})"
+
+
+def _column_kind(name, series):
+    if pd.api.types.is_bool_dtype(series):
+        return "cat"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "time"
+    if pd.api.types.is_numeric_dtype(series):
+        # 2023, 2024 ... in a column called "year" is an axis, not a measure
+        return "time" if _TIME_NAME_RE.search(name) and pd.api.types.is_integer_dtype(series) else "num"
+    sample = series.dropna().head(20).astype(str)
+    if len(sample) and (_TIME_NAME_RE.search(name) or sample.str.match(_ISO_DATE_RE).all()):
+        if pd.to_datetime(sample, errors="coerce").notna().mean() >= 0.9:
+            return "time"
+    return "cat"
+
+
+def _bucket(n):
+    return "few" if n <= PIE_MAX_SLICES else "some" if n <= MAX_CATEGORIES else "many"
+
+
+def chart_shape(df):
+    """
+    Hashable description of a result's shape: column names and kinds, the
+    cardinality bucket of the first categorical column and a few value flags.
+    Results with the same shape get the same chart, so specs are cached on it.
+    """
+    kinds = tuple((str(name), _column_kind(str(name), df[name])) for name in df.columns)
+    cats = [name for name, kind in kinds if kind == "cat"]
+    nums = [name for name, kind in kinds if kind == "num"]
+    cardinality = _bucket(df[cats[0]].nunique()) if cats else None
+    nonneg = bool(nums) and bool((df[nums[0]].dropna() >= 0).all())
+    ordered = len(nums) > 1 and df[nums[0]].is_monotonic_increasing
+    return kinds, cardinality, nonneg, ordered
+
+
+@lru_cache(maxsize=256)
+def spec_for_shape(shape):
+    """The template for a shape, or None when no template fits (the LLM then writes the chart)."""
+    kinds, cardinality, nonneg, ordered = shape
+    times = [name for name, kind in kinds if kind == "time"]
+    cats = [name for name, kind in kinds if kind == "cat"]
+    nums = [name for name, kind in kinds if kind == "num"]
+    if not nums:
+        return None
+
+    if times:
+        # One measure split by a small category: one line per category
+        if cats and len(nums) == 1 and cardinality in ("few", "some"):
+            return ChartSpec("timeseries", times[0], nums, series=cats[0])
+        return ChartSpec("timeseries", times[0], nums[:MAX_SERIES])
+
+    if cats:
+        if len(nums) == 1:
+            if cardinality == "few" and nonneg and _SHARE_NAME_RE.search(nums[0]):
+                return ChartSpec("pie", cats[0], nums)
+            return ChartSpec("bar" if cardinality == "few" else "barh", cats[0], nums)
+        return ChartSpec("grouped_bar", cats[0], nums[:MAX_SERIES])
+
+    if ordered:
+        return ChartSpec("line", nums[0], nums[1:MAX_SERIES + 1])
+    return ChartSpec("bar", None, nums[:MAX_SERIES])
+
+
+def infer_spec(df):
+    """(shape, spec) for a result frame; spec is None when no template fits."""
+    if df.empty:
+        return None, None
+    shape = chart_shape(df)
+    return shape, spec_for_shape(shape)
+
+
+def _by_category(df, spec):
+    # Repeated categories (one row per trade, say) are summed, biggest first
+    grouped = df.groupby(spec.x, sort=False)[spec.y].sum()
+    return grouped.sort_values(spec.y[0], ascending=False).head(MAX_CATEGORIES)
+
+
+def _bars(ax, labels, data, horizontal=False):
+    # Plain Axes calls on numpy arrays; pandas' plot layer costs more than the drawing
+    positions = np.arange(len(labels))
+    width = 0.8 / len(data.columns)
+    for i, column in enumerate(data.columns):
+        offset = positions + (i - (len(data.columns) - 1) / 2) * width
+        if horizontal:
+            ax.barh(offset, data[column].to_numpy(), height=width, label=column)
+        else:
+            ax.bar(offset, data[column].to_numpy(), width=width, label=column)
+    labels = [str(label) for label in labels]
+    if horizontal:
+        ax.set_yticks(positions, labels)
+    else:
+        ax.set_xticks(positions, labels, rotation=45 if len(labels) > 6 else 0, ha="right" if len(labels) > 6 else "center")
+
+
+def _draw_bar(ax, df, spec):
+    data = df[spec.y].head(MAX_CATEGORIES) if spec.x is None else _by_category(df, spec)
+    _bars(ax, data.index, data)
+
+
+def _draw_barh(ax, df, spec):
+    # Long category labels read better sideways; largest at the top
+    data = _by_category(df, spec).iloc[::-1]
+    _bars(ax, data.index, data, horizontal=True)
+
+
+def _draw_pie(ax, df, spec):
+    data = _by_category(df, spec)[spec.y[0]]
+    ax.pie(data.to_numpy(), labels=data.index.astype(str), autopct="%1.1f%%", startangle=90)
+    ax.axis("equal")
+
+
+def _draw_line(ax, df, spec):
+    data = df.sort_values(spec.x)
+    for column in spec.y:
+        ax.plot(data[spec.x].to_numpy(), data[column].to_numpy(), label=column)
+
+
+def _draw_timeseries(ax, df, spec):
+    x = df[spec.x]
+    if not pd.api.types.is_datetime64_any_dtype(x) and not pd.api.types.is_integer_dtype(x):
+        x = pd.to_datetime(x, errors="coerce")
+    frame = df.assign(**{spec.x: x})
+    if spec.series:
+        data = frame.pivot_table(index=spec.x, columns=spec.series, values=spec.y[0], aggfunc="sum")
+    else:
+        data = frame.groupby(spec.x)[spec.y].sum()
+    data = data.sort_index()
+    index = data.index.to_numpy()
+    for column in data.columns:
+        ax.plot(index, data[column].to_numpy(), label=str(column))
+
+
+RENDERERS = {
+    "bar": _draw_bar,
+    "grouped_bar": _draw_bar,
+    "barh": _draw_barh,
+    "pie": _draw_pie,
+    "line": _draw_line,
+    "timeseries": _draw_timeseries,
+}
+
+
+def render_chart(df, spec):
+    """Draws `spec` on a fresh Figure (no pyplot global state); returns the PNG bytes."""
+    fig = Figure(figsize=(10, 5.5), dpi=80)
+    FigureCanvasAgg(fig)
+    # Fixed margins: tight_layout would lay the figure out twice
+    fig.subplots_adjust(left=0.16 if spec.kind == "barh" else 0.09, right=0.97, top=0.92,
+                        bottom=0.2 if spec.kind in ("bar", "grouped_bar") else 0.1)
+    ax = fig.add_subplot()
+    RENDERERS[spec.kind](ax, df, spec)
+    ax.set_title(spec.title)
+    if spec.kind != "pie":
+        ax.set_xlabel((spec.x or "row").replace("_", " "))
+        ax.set_ylabel(", ".join(spec.y).replace("_", " ") if len(spec.y) == 1 else "value")
+        ax.grid(alpha=0.3)
+        if len(ax.get_lines()) > 1 or len(ax.containers) > 1:
+            ax.legend()
+    # Rasterizing and zlib dominate; fast compression is worth the bigger file
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", pil_kwargs={"compress_level": 1})
+    return buffer.getvalue()
+
+
+class FallbackCodeCache:
+    """
+    LLM plotting code for the shapes no template covers, keyed by (question,
+    chart shape): the code is written for what the user asked (a pie of the
+    allocation, a trend line...), so it is only reused when the same
+    question comes back with a result of the same shape, e.g. after new
+    trades. The sandbox workers keep it compiled.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, question, shape):
+        key = (question, shape)
+        with self._lock:
+            code = self._entries.get(key)
+            if code is not None:
+                self._entries.move_to_end(key)
+            return code
+
+    def put(self, question, shape, code):
+        key = (question, shape)
+        with self._lock:
+            self._entries[key] = code
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def chart_key(df, spec_text):
+    """Content address of a chart: the result's columns, dtypes and values plus what draws them."""
+    digest = hashlib.sha256()
+    digest.update(repr([(str(name), str(dtype)) for name, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(spec_text.encode())
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """
+    Rendered chart PNGs by chart_key(), bounded by total size with LRU
+    eviction. The same result drawn the same way is rendered once, and the
+    UIs read the bytes from here instead of a shared file on disk.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or CHART_CACHE_MAX_BYTES
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = png
+            self._bytes += len(png)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+chart_cache = ChartCache()
@@ -0,0 +1,328 @@
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHECKPOINT_BLOB_DB = os.getenv("CHECKPOINT_BLOB_DB", "agent_memory_blobs.db")
+# Strings at least this long are stored once in the blob store and referenced by hash
+CHECKPOINT_BLOB_MIN_BYTES = int(os.getenv("CHECKPOINT_BLOB_MIN_BYTES", "2048"))
+# Payloads smaller than this are left as the inner serializer wrote them
+CHECKPOINT_COMPRESS_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", "256"))
+# Unreferenced blobs younger than this are kept: their checkpoint may not be committed yet
+BLOB_GC_GRACE_SECONDS = 3600
+
+# Stands in for an externalized string inside the serialized payload
+_REF_PREFIX = "\x00blob:"
+_DIGEST_SIZE = 32
+
+
+class _Zlib:
+    name = "zlib"
+
+    def compress(self, data):
+        return zlib.compress(data, 6)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class _Zstd:
+    name = "zstd"
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def decompress(self, data):
+        return self._decompressor.decompress(data)
+
+
+def default_codec():
+    return _Zstd() if zstandard is not None else _Zlib()
+
+
+def referenced_digests(data):
+    """Blob digests a `.cas` payload points to, read from its header without decompressing."""
+    (count,) = struct.unpack_from(">H", data)
+    return [data[2 + i * _DIGEST_SIZE:2 + (i + 1) * _DIGEST_SIZE] for i in range(count)]
+
+
+class CompressedSerializer:
+    """
+    Checkpoint serializer that compresses payloads and stores large strings
+    content-addressed.
+
+    Wraps another serializer the way langgraph's EncryptedSerializer does:
+    the inner type gets a suffix ("msgpack+zlib", "msgpack+zstd.cas") and
+    anything without one, i.e. every checkpoint SqliteSaver wrote before this,
+    is handed to the inner serializer unchanged.
+
+    Every checkpoint carries the whole state, so the same message contents,
+    db_results and analysis strings are re-serialized at each step. Strings of
+    `min_blob_bytes` or more are swapped for a hash reference and written once
+    to a separate SQLite file. That keeps the blob writes out of the saver's
+    own transactions. A `.cas` payload starts with the digests it references,
+    so garbage collection never has to decompress anything.
+
+    The serializer protocol is synchronous, so under AsyncSqliteSaver the
+    blob writes (and blob reads on a cold cache) run on the event loop and
+    block it for their duration: one small local transaction for every
+    payload that carries a large string. Hosts that cannot afford that should keep
+    min_blob_bytes high or use the sync saver from a worker thread.
+
+    The format only goes one way: a plain SqliteSaver cannot read rows this
+    serializer wrote. downgrade() (python main.py --decompress-checkpoints)
+    rewrites them in the inner serializer's format before switching back.
+    """
+
+    def __init__(self, serde=None, blob_path=None, min_blob_bytes=None, min_compress_bytes=None, codec=None):
+        self.serde = serde or JsonPlusSerializer()
+        self.blob_path = blob_path or CHECKPOINT_BLOB_DB
+        self.min_blob_bytes = min_blob_bytes or CHECKPOINT_BLOB_MIN_BYTES
+        self.min_compress_bytes = min_compress_bytes if min_compress_bytes is not None else CHECKPOINT_COMPRESS_MIN_BYTES
+        self.codec = codec or default_codec()
+        self._codecs = {"zlib": _Zlib()}
+        self._codecs[self.codec.name] = self.codec
+
+        self._lock = threading.Lock()
+        self._conn = None
+        # str -> digest; str hashes are cached on the object, so a repeated
+        # message content costs a dict lookup instead of a sha256
+        self._digests = OrderedDict()
+        self._loaded = OrderedDict()
+        self._stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats():
+        return {"payloads": 0, "steps": 0, "raw_bytes": 0, "written_bytes": 0, "blobs_written": 0, "blob_bytes": 0}
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.blob_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Only takes effect on a new file, which is the point: GC can give pages back cheaply
+            self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    digest BLOB PRIMARY KEY,
+                    codec TEXT,
+                    data BLOB,
+                    size INTEGER,
+                    created_at REAL
+                )
+            ''')
+        return self._conn
+
+    def _codec(self, name):
+        if name not in self._codecs:
+            if name != "zstd" or zstandard is None:
+                raise ValueError(f"checkpoint was written with {name}, which is not available here")
+            self._codecs[name] = _Zstd()
+        return self._codecs[name]
+
+    # --- content-addressed strings ---
+
+    def _digest(self, text):
+        digest = self._digests.get(text)
+        if digest is None:
+            digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()
+            self._digests[text] = digest
+            if len(self._digests) > 4096:
+                self._digests.popitem(last=False)
+        return digest
+
+    def _store(self, text, refs):
+        with self._lock:
+            digest = self._digest(text)
+        refs[digest] = text
+        return _REF_PREFIX + digest.hex()
+
+    def _write_blobs(self, refs):
+        """
+        Makes sure every referenced blob exists, in one transaction. Blobs that
+        are already stored only get created_at refreshed: that keeps a
+        collect_garbage() in another process (which spares recent blobs and
+        re-checks the age as it deletes) from dropping one we are about to
+        reference again. Nothing is remembered across calls for the same reason.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for digest, text in refs.items():
+                    if conn.execute("UPDATE blobs SET created_at = ? WHERE digest = ?", (now, digest)).rowcount:
+                        continue
+                    raw = text.encode("utf-8", "surrogatepass")
+                    data = self.codec.compress(raw)
+                    conn.execute(
+                        "INSERT OR IGNORE INTO blobs (digest, codec, data, size, created_at) VALUES (?,?,?,?,?)",
+                        (digest, self.codec.name, data, len(raw), now),
+                    )
+                    self._stats["blobs_written"] += 1
+                    self._stats["blob_bytes"] += len(data)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _fetch(self, hex_digest):
+        with self._lock:
+            text = self._loaded.get(hex_digest)
+            if text is not None:
+                self._loaded.move_to_end(hex_digest)
+                return text
+            row = self._connection().execute(
+                "SELECT codec, data FROM blobs WHERE digest = ?", (bytes.fromhex(hex_digest),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"checkpoint blob {hex_digest} is missing from {self.blob_path}")
+        text = self._codec(row[0]).decompress(row[1]).decode("utf-8", "surrogatepass")
+        with self._lock:
+            self._loaded[hex_digest] = text
+            if len(self._loaded) > 1024:
+                self._loaded.popitem(last=False)
+        return text
+
+    def _externalize(self, obj, refs):
+        if isinstance(obj, str):
+            return self._store(obj, refs) if len(obj) >= self.min_blob_bytes else obj
+        if isinstance(obj, BaseMessage):
+            if isinstance(obj.content, str) and len(obj.content) >= self.min_blob_bytes:
+                return obj.model_copy(update={"content": self._store(obj.content, refs)})
+            return obj
+        if isinstance(obj, dict):
+            return {k: self._externalize(v, refs) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._externalize(v, refs) for v in obj]
+        if isinstance(obj, tuple):
+            return tuple(self._externalize(v, refs) for v in obj)
+        return obj
+
+    def _resolve(self, obj):
+        if isinstance(obj, str):
+            return self._fetch(obj[len(_REF_PREFIX):]) if obj.startswith(_REF_PREFIX) else obj
+        if isinstance(obj, BaseMessage):
+            if isinstance(obj.content, str) and obj.content.startswith(_REF_PREFIX):
+                return obj.model_copy(update={"content": self._fetch(obj.content[len(_REF_PREFIX):])})
+            return obj
+        if isinstance(obj, dict):
+            return {k: self._resolve(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._resolve(v) for v in obj]
+        if isinstance(obj, tuple):
+            return tuple(self._resolve(v) for v in obj)
+        return obj
+
+    # --- SerializerProtocol ---
+
+    def dumps_typed(self, obj):
+        refs = {}
+        typ, data = self.serde.dumps_typed(self._externalize(obj, refs))
+        raw_bytes = len(data) + sum(len(text) for text in refs.values())
+
+        if refs:
+            # Before the payload is handed back, so the blobs exist by the time the checkpoint commits
+            self._write_blobs(refs)
+            header = struct.pack(">H", len(refs)) + b"".join(refs)
+            typ, data = f"{typ}+{self.codec.name}.cas", header + self.codec.compress(data)
+        elif len(data) >= self.min_compress_bytes:
+            typ, data = f"{typ}+{self.codec.name}", self.codec.compress(data)
+
+        with self._lock:
+            self._stats["payloads"] += 1
+            # One checkpoint per graph step; the other payloads are pending writes
+            self._stats["steps"] += isinstance(obj, dict) and "channel_values" in obj
+            self._stats["raw_bytes"] += raw_bytes
+            self._stats["written_bytes"] += len(data)
+        return typ, data
+
+    def loads_typed(self, data):
+        typ, payload = data
+        if "+" not in typ:
+            return self.serde.loads_typed(data)
+        typ, codec = typ.split("+", 1)
+        if codec.endswith(".cas"):
+            count = len(referenced_digests(payload))
+            body = self._codec(codec[:-4]).decompress(payload[2 + count * _DIGEST_SIZE:])
+            return self._resolve(self.serde.loads_typed((typ, body)))
+        return self.serde.loads_typed((typ, self._codec(codec).decompress(payload)))
+
+    # --- reporting and maintenance ---
+
+    def take_stats(self):
+        """Bytes serialized vs. written since the last call (blob writes included), then resets."""
+        with self._lock:
+            stats, self._stats = self._stats, self._empty_stats()
+        written = stats["written_bytes"] + stats["blob_bytes"]
+        stats["ratio"] = round(written / stats["raw_bytes"], 3) if stats["raw_bytes"] else 0.0
+        return stats
+
+    def collect_garbage(self, conn):
+        """
+        Deletes blobs no checkpoint or write in `conn` (the saver's database)
+        references any more. Returns (blobs deleted, bytes freed).
+        """
+        referenced = set()
+        for table, column in (("checkpoints", "checkpoint"), ("writes", "value")):
+            for (payload,) in conn.execute(f"SELECT {column} FROM {table} WHERE type LIKE '%.cas'"):
+                referenced.update(referenced_digests(payload))
+
+        with self._lock:
+            blobs = self._connection()
+            cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+            stale = [
+                (digest, size) for digest, size in blobs.execute(
+                    "SELECT digest, LENGTH(data) FROM blobs WHERE created_at < ?", (cutoff,)
+                )
+                if digest not in referenced
+            ]
+            deleted = freed = 0
+            blobs.execute("BEGIN IMMEDIATE")
+            for digest, size in stale:
+                # A writer that re-referenced the blob since the SELECT refreshed created_at
+                if blobs.execute("DELETE FROM blobs WHERE digest = ? AND created_at < ?", (digest, cutoff)).rowcount:
+                    deleted += 1
+                    freed += size
+            blobs.execute("COMMIT")
+            if deleted:
+                blobs.execute("PRAGMA incremental_vacuum").fetchall()
+        return deleted, freed
+
+    def downgrade(self, conn):
+        """
+        Rewrites every row this serializer wrote in `conn` (the saver's
+        database) in the inner serializer's format, so a plain SqliteSaver can
+        read the file again. Returns the number of rows rewritten.
+        """
+        rewritten = 0
+        for table, key, column in (
+            ("checkpoints", ("thread_id", "checkpoint_ns", "checkpoint_id"), "checkpoint"),
+            ("writes", ("thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx"), "value"),
+        ):
+            rows = conn.execute(
+                f"SELECT {', '.join(key)}, type, {column} FROM {table} WHERE type LIKE '%+%'"
+            ).fetchall()
+            for row in rows:
+                typ, data = self.serde.dumps_typed(self.loads_typed((row[-2], row[-1])))
+                conn.execute(
+                    f"UPDATE {table} SET type = ?, {column} = ? WHERE {' AND '.join(f'{k} = ?' for k in key)}",
+                    (typ, data, *row[:-2]),
+                )
+                rewritten += 1
+        return rewritten
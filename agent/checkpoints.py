@@ -0,0 +1,316 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+CHECKPOINT_DB = "agent_memory.db"
+# Newest checkpoints kept per thread; older ones (and their writes) are deleted
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "50"))
+# Of those, only the newest few keep their large fields; the rest are stripped
+CHECKPOINT_KEEP_FULL = int(os.getenv("CHECKPOINT_KEEP_FULL", "10"))
+CHECKPOINT_STRIP_MIN_BYTES = int(os.getenv("CHECKPOINT_STRIP_MIN_BYTES", "4096"))
+# How often maybe_compact() actually runs, in seconds
+CHECKPOINT_COMPACT_INTERVAL = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL", str(6 * 3600)))
+
+# Channels that only matter for the turn that produced them. The conversation
+# itself lives in `messages`, which is never touched.
+STRIP_CHANNELS = ("db_results", "db_summary", "analysis")
+
+console = Console()
+
+COMPACTION_DDL = '''
+    CREATE TABLE IF NOT EXISTS checkpoint_compaction (
+        key TEXT PRIMARY KEY,
+        value REAL
+    );
+    CREATE TABLE IF NOT EXISTS compacted_checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    );
+'''
+
+# Rank 1 is the newest checkpoint of its thread/namespace. Ids are uuid6, so
+# they sort by creation time, which is also how SqliteSaver.list orders them.
+_RANKED = '''
+    SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER (
+        PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+    ) AS rank
+    FROM checkpoints
+'''
+
+
+def _placeholder(value):
+    return f"[compacted: {len(value.encode('utf-8', 'ignore')):,} bytes dropped from an old checkpoint]"
+
+
+def _strip_value(value, min_bytes):
+    if isinstance(value, str) and len(value) >= min_bytes and not value.startswith("[compacted:"):
+        return _placeholder(value), True
+    return value, False
+
+
+class CheckpointCompactor:
+    """
+    Retention and compaction for the SqliteSaver behind the graph.
+
+    SqliteSaver writes a full checkpoint per step and never deletes anything.
+    Per thread this keeps the newest `keep_last` checkpoints, replaces large
+    `STRIP_CHANNELS` values in all but the newest `keep_full` with a short
+    placeholder, and hands the freed pages back to the filesystem (after a
+    one-off full VACUUM, see vacuum()). Works through the saver's own
+    connection, lock and serializer.
+    """
+
+    def __init__(self, saver, keep_last=None, keep_full=None, min_bytes=None, interval=None):
+        self.saver = saver
+        self.keep_last = keep_last or CHECKPOINT_KEEP_LAST
+        self.keep_full = min(keep_full or CHECKPOINT_KEEP_FULL, self.keep_last)
+        self.min_bytes = min_bytes or CHECKPOINT_STRIP_MIN_BYTES
+        self.interval = interval if interval is not None else CHECKPOINT_COMPACT_INTERVAL
+        self._ready = False
+        self._lock = threading.Lock()
+        self._running = False
+        self._finished = None
+
+    @classmethod
+    def from_path(cls, path=CHECKPOINT_DB, **kwargs):
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        from agent.checkpoint_serde import CompressedSerializer
+
+        saver = SqliteSaver(sqlite3.connect(path, check_same_thread=False), serde=CompressedSerializer())
+        return cls(saver, **kwargs)
+
+    def _cursor(self):
+        # saver.cursor() sets the tables up, holds the saver's lock and commits
+        if not self._ready:
+            with self.saver.cursor() as cur:
+                cur.executescript(COMPACTION_DDL)
+            self._ready = True
+        return self.saver.cursor()
+
+    def usage(self):
+        """Per-thread storage: [(thread_id, checkpoints, writes, checkpoint bytes, write bytes)], biggest first."""
+        with self._cursor() as cur:
+            return cur.execute('''
+                SELECT c.thread_id, c.n, COALESCE(w.n, 0), c.bytes, COALESCE(w.bytes, 0)
+                FROM (
+                    SELECT thread_id, COUNT(*) AS n,
+                           SUM(LENGTH(checkpoint) + COALESCE(LENGTH(metadata), 0)) AS bytes
+                    FROM checkpoints GROUP BY thread_id
+                ) c
+                LEFT JOIN (
+                    SELECT thread_id, COUNT(*) AS n, SUM(COALESCE(LENGTH(value), 0)) AS bytes
+                    FROM writes GROUP BY thread_id
+                ) w ON w.thread_id = c.thread_id
+                ORDER BY c.bytes + COALESCE(w.bytes, 0) DESC
+            ''').fetchall()
+
+    def file_stats(self):
+        with self._cursor() as cur:
+            page_size = cur.execute("PRAGMA page_size").fetchone()[0]
+            pages = cur.execute("PRAGMA page_count").fetchone()[0]
+            free = cur.execute("PRAGMA freelist_count").fetchone()[0]
+        return {"file_bytes": pages * page_size, "free_bytes": free * page_size}
+
+    def prune(self):
+        """Deletes all but the newest `keep_last` checkpoints per thread; returns (checkpoints, writes) deleted."""
+        with self._cursor() as cur:
+            cur.execute(f"CREATE TEMP TABLE _expired AS SELECT thread_id, checkpoint_ns, checkpoint_id FROM ({_RANKED}) WHERE rank > ?",
+                        (self.keep_last,))
+            try:
+                match = '''
+                    WHERE (thread_id, checkpoint_ns, checkpoint_id) IN (
+                        SELECT thread_id, checkpoint_ns, checkpoint_id FROM _expired
+                    )
+                '''
+                checkpoints = cur.execute("DELETE FROM checkpoints" + match).rowcount
+                writes = cur.execute("DELETE FROM writes" + match).rowcount
+                cur.execute("DELETE FROM compacted_checkpoints" + match)
+            finally:
+                cur.execute("DROP TABLE _expired")
+        return checkpoints, writes
+
+    def strip(self):
+        """Replaces large STRIP_CHANNELS values past the newest `keep_full`; returns (checkpoints stripped, bytes saved)."""
+        serde = self.saver.serde
+        stripped = saved = 0
+        with self._cursor() as cur:
+            rows = cur.execute(f'''
+                SELECT r.thread_id, r.checkpoint_ns, r.checkpoint_id, c.type, c.checkpoint
+                FROM ({_RANKED}) r
+                JOIN checkpoints c USING (thread_id, checkpoint_ns, checkpoint_id)
+                LEFT JOIN compacted_checkpoints d USING (thread_id, checkpoint_ns, checkpoint_id)
+                WHERE r.rank > ? AND d.checkpoint_id IS NULL
+            ''', (self.keep_full,)).fetchall()
+
+            for thread_id, ns, checkpoint_id, type_, blob in rows:
+                key = (thread_id, ns, checkpoint_id)
+                # A .cas payload is small however much it references (see agent/checkpoint_serde.py)
+                if len(blob) >= self.min_bytes or type_.endswith(".cas"):
+                    checkpoint = serde.loads_typed((type_, blob))
+                    values = checkpoint.get("channel_values", {})
+                    changed = False
+                    for channel in STRIP_CHANNELS:
+                        if channel in values:
+                            values[channel], hit = _strip_value(values[channel], self.min_bytes)
+                            changed |= hit
+                    if changed:
+                        new_type, new_blob = serde.dumps_typed(checkpoint)
+                        cur.execute(
+                            "UPDATE checkpoints SET type = ?, checkpoint = ? "
+                            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                            (new_type, new_blob) + key,
+                        )
+                        stripped += 1
+                        saved += len(blob) - len(new_blob)
+
+                # Writes recorded against this checkpoint carry the same values
+                writes = cur.execute(
+                    "SELECT task_id, idx, type, value FROM writes "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+                    f"AND channel IN ({','.join('?' * len(STRIP_CHANNELS))}) AND (LENGTH(value) >= ? OR type LIKE '%.cas')",
+                    key + STRIP_CHANNELS + (self.min_bytes,),
+                ).fetchall()
+                for task_id, idx, w_type, w_blob in writes:
+                    value, hit = _strip_value(serde.loads_typed((w_type, w_blob)), self.min_bytes)
+                    if hit:
+                        new_type, new_blob = serde.dumps_typed(value)
+                        cur.execute(
+                            "UPDATE writes SET type = ?, value = ? WHERE thread_id = ? AND checkpoint_ns = ? "
+                            "AND checkpoint_id = ? AND task_id = ? AND idx = ?",
+                            (new_type, new_blob) + key + (task_id, idx),
+                        )
+                        saved += len(w_blob) - len(new_blob)
+
+                cur.execute("INSERT OR IGNORE INTO compacted_checkpoints VALUES (?, ?, ?)", key)
+        return stripped, saved
+
+    def vacuum(self, full=False):
+        """
+        Returns free pages to the filesystem. Once the file uses incremental
+        auto-vacuum only the free pages are released, which is cheap enough
+        to run routinely. Switching it over takes one full VACUUM, which
+        rewrites the whole file under the saver's lock, so that only happens
+        with `full=True` (the --compact-checkpoints CLI flag).
+        """
+        with self._cursor() as cur:
+            if cur.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                cur.execute("PRAGMA incremental_vacuum").fetchall()
+            elif full:
+                self.saver.conn.commit()
+                cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                cur.execute("VACUUM")
+            cur.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def compact(self, full_vacuum=False):
+        """Prune, strip and vacuum (see vacuum() for `full_vacuum`); returns a report dict."""
+        started = time.perf_counter()
+        before = self.file_stats()["file_bytes"]
+        checkpoints, writes = self.prune()
+        stripped, saved = self.strip()
+        blobs = blob_bytes = 0
+        if hasattr(self.saver.serde, "collect_garbage"):
+            with self._cursor() as cur:
+                blobs, blob_bytes = self.saver.serde.collect_garbage(cur)
+        self.vacuum(full=full_vacuum)
+        with self._cursor() as cur:
+            cur.execute("INSERT OR REPLACE INTO checkpoint_compaction VALUES ('last_run', ?)", (time.time(),))
+        return {
+            "deleted_checkpoints": checkpoints,
+            "deleted_writes": writes,
+            "stripped_checkpoints": stripped,
+            "stripped_bytes": saved,
+            "deleted_blobs": blobs,
+            "deleted_blob_bytes": blob_bytes,
+            "file_bytes_before": before,
+            "file_bytes_after": self.file_stats()["file_bytes"],
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+
+    def downgrade(self):
+        """Rewrites compressed / content-addressed rows for a plain SqliteSaver; returns the row count."""
+        if not hasattr(self.saver.serde, "downgrade"):
+            return 0
+        with self._cursor() as cur:
+            return self.saver.serde.downgrade(cur)
+
+    def maybe_compact(self, background=True):
+        """
+        Runs compact() when the last run is older than `interval`; cheap to
+        call after every turn. By default it runs on a background thread so
+        the next question is not held up, and its report is printed by the
+        next call rather than over whatever prompt is on screen by then.
+        """
+        self._print_finished()
+        with self._cursor() as cur:
+            row = cur.execute("SELECT value FROM checkpoint_compaction WHERE key = 'last_run'").fetchone()
+        if row and time.time() - row[0] < self.interval:
+            return None
+        if not background:
+            report = self.compact()
+            _print_report(report)
+            return report
+        with self._lock:
+            if self._running:
+                return None
+            self._running = True
+        thread = threading.Thread(target=self._compact_in_background, name="checkpoint-compaction", daemon=True)
+        thread.start()
+        return thread
+
+    def _compact_in_background(self):
+        try:
+            finished = self.compact()
+        except Exception as e:
+            finished = e
+        with self._lock:
+            self._finished = finished
+            self._running = False
+
+    def _print_finished(self):
+        with self._lock:
+            finished, self._finished = self._finished, None
+        if isinstance(finished, Exception):
+            console.print(f"[bold red]⚠️ Checkpoint compaction failed:[/bold red] {finished}")
+        elif finished:
+            _print_report(finished)
+
+
+def _print_report(report):
+    console.print(
+        f"[dim]🧹 Checkpoints compacted: {report['deleted_checkpoints']} pruned, "
+        f"{report['stripped_checkpoints']} stripped, "
+        f"{report['file_bytes_before'] / 1e6:.1f}MB -> {report['file_bytes_after'] / 1e6:.1f}MB "
+        f"in {report['seconds']}s[/dim]"
+    )
+
+
+def print_usage(compactor, top=20):
+    rows = compactor.usage()
+    table = Table(title="🗄️ Checkpoint storage per thread", header_style="bold cyan")
+    for column in ("Thread", "Checkpoints", "Writes", "Checkpoint MB", "Writes MB"):
+        table.add_column(column, justify="left" if column == "Thread" else "right")
+    for thread_id, checkpoints, writes, c_bytes, w_bytes in rows[:top]:
+        table.add_row(thread_id, f"{checkpoints:,}", f"{writes:,}", f"{c_bytes / 1e6:.2f}", f"{w_bytes / 1e6:.2f}")
+    console.print(table)
+    stats = compactor.file_stats()
+    console.print(
+        f"[dim]{len(rows)} threads, file {stats['file_bytes'] / 1e6:.1f}MB "
+        f"({stats['free_bytes'] / 1e6:.1f}MB free pages)[/dim]"
+    )
+
+
+if __name__ == "__main__":
+    # python -m agent.checkpoints [--compact] [--keep N] [--db agent_memory.db]
+    path = sys.argv[sys.argv.index("--db") + 1] if "--db" in sys.argv else CHECKPOINT_DB
+    keep = int(sys.argv[sys.argv.index("--keep") + 1]) if "--keep" in sys.argv else None
+    compactor = CheckpointCompactor.from_path(path, keep_last=keep)
+    if "--compact" in sys.argv:
+        print(compactor.compact(full_vacuum=True))
+    print_usage(compactor)
@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+import functools
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+# Limits for the async graph: how many LLM requests may be in flight, how many
+# threads may run blocking SQLite work, and how many turns run at once.
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "16"))
+MAX_DB_WORKERS = int(os.getenv("MAX_DB_WORKERS", os.getenv("DB_POOL_SIZE", "8")))
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "32"))
+
+_db_executor = ThreadPoolExecutor(max_workers=MAX_DB_WORKERS, thread_name_prefix="sqlite")
+# (llm slots, turn slots) per event loop. A semaphore belongs to the loop that
+# first waits on it, and every asyncio.run() (a Streamlit rerun, a test) brings
+# a new loop; the limits therefore apply per loop.
+_loop_semaphores = weakref.WeakKeyDictionary()
+
+
+def _semaphores():
+    loop = asyncio.get_running_loop()
+    semaphores = _loop_semaphores.get(loop)
+    if semaphores is None:
+        # A used semaphore refers back to its loop, so closed loops are dropped by hand
+        for closed in [old for old in _loop_semaphores if old.is_closed()]:
+            del _loop_semaphores[closed]
+        semaphores = (asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS), asyncio.Semaphore(MAX_CONCURRENT_TURNS))
+        _loop_semaphores[loop] = semaphores
+    return semaphores
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Holds one of the MAX_CONCURRENT_LLM_CALLS slots while awaiting a model."""
+    llm_slots, _ = _semaphores()
+    async with llm_slots:
+        yield
+
+
+async def run_blocking(fn, *args):
+    """Runs blocking (SQLite / stdin / exec) work on the bounded DB thread pool."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. LangGraph's run config) into the worker
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await loop.run_in_executor(_db_executor, call)
+
+
+async def astream_turn(app, state_input, config, **kwargs):
+    """`app.astream` gated by MAX_CONCURRENT_TURNS, for servers running many threads."""
+    _, turn_slots = _semaphores()
+    async with turn_slots:
+        async for event in app.astream(state_input, config=config, **kwargs):
+            yield event
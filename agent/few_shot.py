@@ -0,0 +1,162 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from langchain_core.messages import SystemMessage
+
+from agent.sql_cache import normalize_question
+
+FEW_SHOT_K = int(os.getenv("FEW_SHOT_K", "3"))
+# Oldest approvals are dropped past this many pairs
+FEW_SHOT_MAX_PAIRS = int(os.getenv("FEW_SHOT_MAX_PAIRS", "5000"))
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "to", "and", "or", "is", "are", "was", "were", "me", "my",
+    "what", "which", "show", "list", "give", "get", "tell", "how", "do", "does", "i", "we", "our", "with",
+    "by", "from", "all", "their", "there", "that", "this", "it", "be", "can", "you", "please",
+}
+
+
+def terms(text):
+    return [w for w in _WORD_RE.findall(normalize_question(text)) if w not in _STOPWORDS]
+
+
+class FewShotIndex:
+    """
+    In-memory TF-IDF index (BM25 weighting) over approved (question, SQL) pairs.
+
+    An inverted index keeps retrieval to the postings of the question's own
+    terms, and BM25 only needs document frequencies and lengths, so pairs can
+    be added and removed one at a time without re-weighting the rest.
+    Bootstrapped lazily from the SQL cache, which only ever holds SQL a human
+    approved; pairs the cache invalidates are removed again, only pairs
+    approved against the current schema are returned, and past `max_pairs`
+    the oldest approvals go first.
+    """
+
+    def __init__(self, sql_cache=None, k1=1.2, b=0.75, max_pairs=None):
+        self.sql_cache = sql_cache
+        self.k1 = k1
+        self.b = b
+        self.max_pairs = max_pairs or FEW_SHOT_MAX_PAIRS
+        self.docs = {}          # doc id -> (question, sql, length, schema_fp), oldest approval first
+        self.by_question = {}   # normalized question -> doc id
+        self.postings = {}      # term -> {doc id: term frequency}
+        self.total_length = 0
+        self._next_id = 0
+        self._loaded = sql_cache is None
+        self._lock = threading.Lock()
+
+        # Kept up to date on add/remove, so stats() is O(1)
+        self.posting_count = 0
+        self.text_bytes = 0
+        self.searches = 0
+        self.search_ms = 0.0
+        self.last_search_ms = 0.0
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            for question, sql, schema_fp in self.sql_cache.approved_pairs():
+                self._add(question, sql, schema_fp)
+
+    def _remove(self, key):
+        doc_id = self.by_question.pop(key, None)
+        if doc_id is None:
+            return False
+        question, sql, length, _ = self.docs.pop(doc_id)
+        self.total_length -= length
+        self.text_bytes -= len(question) + len(sql)
+        for term in set(terms(question)):
+            postings = self.postings[term]
+            del postings[doc_id]
+            self.posting_count -= 1
+            if not postings:
+                del self.postings[term]
+        return True
+
+    def _add(self, question, sql, schema_fp=None):
+        # Re-approval replaces the old pair and counts as the newest
+        self._remove(normalize_question(question))
+        words = terms(question)
+        doc_id = self._next_id
+        self._next_id += 1
+        self.docs[doc_id] = (question, sql, len(words), schema_fp)
+        self.by_question[normalize_question(question)] = doc_id
+        self.total_length += len(words)
+        self.text_bytes += len(question) + len(sql)
+        for term, tf in Counter(words).items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+            self.posting_count += 1
+        while len(self.docs) > self.max_pairs:
+            oldest = self.docs[next(iter(self.docs))][0]
+            self._remove(normalize_question(oldest))
+
+    def add(self, question, sql, schema_fp=None):
+        with self._lock:
+            self._ensure_loaded()
+            self._add(question, sql, schema_fp)
+
+    def remove(self, question):
+        """Drops the pair for `question` (e.g. when its cached SQL was invalidated)."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._remove(normalize_question(question))
+
+    def search(self, question, k=None, schema_fp=None):
+        """
+        Top-k approved pairs for `question` as [(question, sql, score)], best
+        first. With `schema_fp`, pairs approved against another schema are skipped.
+        """
+        k = k or FEW_SHOT_K
+        started = time.perf_counter()
+        with self._lock:
+            self._ensure_loaded()
+            n = len(self.docs)
+            scores = Counter()
+            if n:
+                avg_length = self.total_length / n or 1.0
+                for term in set(terms(question)):
+                    postings = self.postings.get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, tf in postings.items():
+                        length = self.docs[doc_id][2]
+                        norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                        scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            top = []
+            for doc_id, score in scores.most_common():
+                q, sql, _, fp = self.docs[doc_id]
+                if schema_fp is None or fp is None or fp == schema_fp:
+                    top.append((q, sql, score))
+                    if len(top) == k:
+                        break
+
+            self.last_search_ms = (time.perf_counter() - started) * 1000
+            self.searches += 1
+            self.search_ms += self.last_search_ms
+        return top
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pairs": len(self.docs),
+                "terms": len(self.postings),
+                "postings": self.posting_count,
+                # Question and SQL text only; cheap enough to report on every search
+                "text_bytes": self.text_bytes,
+                "searches": self.searches,
+                "last_search_ms": round(self.last_search_ms, 3),
+                "avg_search_ms": round(self.search_ms / self.searches, 3) if self.searches else 0.0,
+            }
+
+
+def examples_message(examples):
+    """Retrieved pairs as one SystemMessage for the SQL prompt."""
+    shots = "\n\n".join(f"Question: {question}\nSQL: {sql}" for question, sql, _ in examples)
+    return SystemMessage(content="Approved queries for similar past questions:\n\n" + shots)
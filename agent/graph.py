@@ -1,10 +1,11 @@
 import os
 import sqlite3
+import threading
+from contextlib import asynccontextmanager
 from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph import StateGraph, START, END
 from .state import AgentState
-from .nodes import generate_sql_node, guardrail_node, execute_query_node, analysis_node, human_review_node, \
-    summarize_history_node, visualization_node
+from .checkpoint_serde import CompressedSerializer
 
 
 def should_continue(state: AgentState):
@@ -16,51 +17,150 @@ def check_viz_request(state: AgentState):
         return "visualization"
     return END
 
-conn = sqlite3.connect("agent_memory.db", check_same_thread=False)
-memory = SqliteSaver(conn)
-workflow = StateGraph(AgentState)
-workflow.add_node("summarize", summarize_history_node)
-workflow.add_node("generate_sql", generate_sql_node)
-workflow.add_node("guardrail", guardrail_node)
-workflow.add_node("execute_query", execute_query_node)
-workflow.add_node("analysis", analysis_node)
-workflow.add_node("human_review", human_review_node)
-workflow.add_node("visualization", visualization_node)
-
-
-
-workflow.add_edge(START, "summarize")
-workflow.add_edge("summarize", "generate_sql")
-workflow.add_edge("generate_sql", "guardrail")
-workflow.add_edge("guardrail", "human_review")
-workflow.add_edge("human_review", "execute_query")
-workflow.add_conditional_edges("execute_query", should_continue)
-# After analysis, check if we need a chart
-workflow.add_conditional_edges(
-    "analysis",
-    check_viz_request,
-    {
-        "visualization": "visualization",
-        END: END
-    }
-)
-workflow.add_edge("analysis", END)
-
-app = workflow.compile(checkpointer=memory)
-
-def generate_visual_graph():
-    graph_filename = "graph_flow.png"
+def build_workflow(nodes, human_review=True):
+    """
+    Wires the graph from a node table, so sync and async graphs share one
+    topology. Without `human_review` the query goes straight from the
+    guardrail to execution (the Streamlit graph interrupts there instead).
+    """
+    workflow = StateGraph(AgentState)
+    workflow.add_node("summarize", nodes["summarize"])
+    workflow.add_node("generate_sql", nodes["generate_sql"])
+    workflow.add_node("guardrail", nodes["guardrail"])
+    workflow.add_node("execute_query", nodes["execute_query"])
+    workflow.add_node("analysis", nodes["analysis"])
+    if human_review:
+        workflow.add_node("human_review", nodes["human_review"])
+    workflow.add_node("visualization", nodes["visualization"])
+
+    workflow.add_edge(START, "summarize")
+    workflow.add_edge("summarize", "generate_sql")
+    workflow.add_edge("generate_sql", "guardrail")
+    if human_review:
+        workflow.add_edge("guardrail", "human_review")
+        workflow.add_edge("human_review", "execute_query")
+    else:
+        workflow.add_edge("guardrail", "execute_query")
+    workflow.add_conditional_edges("execute_query", should_continue)
+    # After analysis, check if we need a chart
+    workflow.add_conditional_edges(
+        "analysis",
+        check_viz_request,
+        {
+            "visualization": "visualization",
+            END: END
+        }
+    )
+    workflow.add_edge("analysis", END)
+    return workflow
+
+
+CHECKPOINT_DB = "agent_memory.db"
+GRAPH_FILENAME = "graph_flow.png"
+# Compressed, with large strings stored once; reads older uncompressed checkpoints as before
+checkpoint_serde = CompressedSerializer()
+
+
+class LazyGraph:
+    """
+    One variant of the graph (this module's terminal graph, or the Streamlit
+    one in agent/streamlit/graph.py) with its checkpointer.
+
+    Nothing is opened until first use: get_app() builds the sync graph once
+    and keeps it (with `memory` and `conn`) for the process; async_app()
+    opens an aiosqlite-backed graph for one event loop and closes its
+    connection on exit.
+    """
+
+    def __init__(self, human_review=True, interrupt_before=None, checkpoint_db=CHECKPOINT_DB):
+        self.human_review = human_review
+        self.interrupt_before = interrupt_before
+        self.checkpoint_db = checkpoint_db
+        self._lock = threading.Lock()
+        self._built = {}
+
+    def _compile(self, nodes, checkpointer):
+        return build_workflow(nodes, self.human_review).compile(
+            checkpointer=checkpointer, interrupt_before=self.interrupt_before
+        )
+
+    def get_app(self):
+        # The nodes (and with them the LLM clients and pandas) are imported here, not on import
+        with self._lock:
+            if not self._built:
+                from .nodes import SYNC_NODES
+
+                conn = sqlite3.connect(self.checkpoint_db, check_same_thread=False)
+                memory = SqliteSaver(conn, serde=checkpoint_serde)
+                self._built.update(conn=conn, memory=memory, app=self._compile(SYNC_NODES, memory))
+            return self._built["app"]
+
+    def built(self, name):
+        self.get_app()
+        return self._built[name]
+
+    @asynccontextmanager
+    async def async_app(self, db_path=None):
+        """
+        Same graph with async nodes and an AsyncSqliteSaver, for serving many
+        threads from one event loop (see agent/concurrency.py for the limits).
+        Must be entered inside the loop that will run it. Checkpoint blob
+        writes still block the loop (see CompressedSerializer).
+        """
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        from .nodes import ASYNC_NODES
+
+        async with aiosqlite.connect(db_path or self.checkpoint_db) as async_conn:
+            yield self._compile(ASYNC_NODES, AsyncSqliteSaver(async_conn, serde=checkpoint_serde))
+
+
+_graph = LazyGraph()
+
+
+def get_app():
+    """
+    The compiled graph, built on first use. Importing this module opens
+    nothing; the nodes and the checkpointer connection are only set up here.
+    """
+    return _graph.get_app()
+
+
+def __getattr__(name):
+    # `from agent.graph import app` still works; the first access builds it
+    if name in ("app", "memory", "conn"):
+        return _graph.built(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def build_async_app(db_path=CHECKPOINT_DB):
+    """`async with build_async_app() as app:` the async graph; the checkpointer connection closes on exit."""
+    return _graph.async_app(db_path)
+
+def draw_graph_image(path=GRAPH_FILENAME, human_review=True):
+    """
+    Writes the workflow diagram to `path`; raises when it cannot be drawn (it
+    is a round trip to mermaid.ink). Drawn from the workflow compiled without
+    a checkpointer, so no graph has to be built and no database is opened.
+    """
+    from .nodes import SYNC_NODES
+
+    # draw_mermaid_png returns the binary data of the image
+    png_data = build_workflow(SYNC_NODES, human_review).compile().get_graph().draw_mermaid_png()
+    with open(path, "wb") as f:
+        f.write(png_data)
+
+def generate_visual_graph(human_review=True):
+    graph_filename = GRAPH_FILENAME
     print(f"📈 Will try to create the graph visual '{graph_filename}'")
     # Only generate if the file does not exist
     if not os.path.exists(graph_filename):
         try:
-            # draw_mermaid_png returns the binary data of the image
-            png_data = app.get_graph().draw_mermaid_png()
-            with open(graph_filename, "wb") as f:
-                f.write(png_data)
+            draw_graph_image(graph_filename, human_review)
             print(f"📈 First run detected: Workflow visual saved to '{graph_filename}'")
         except Exception as e:
             print(f"⚠️ Could not generate graph image: {e}")
     else:
         # We skip generation to save resources
-        print(f"✅ Workflow visual '{graph_filename}' already exists. Skipping generation.")
\ No newline at end of file
+        print(f"✅ Workflow visual '{graph_filename}' already exists. Skipping generation.")
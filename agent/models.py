@@ -0,0 +1,191 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+# Use the specific OpenRouter base URL unless pointed elsewhere (e.g. a local
+# OpenAI-compatible stub server)
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "openai/gpt-oss-120b:free"
+
+# Per-role model selection: a cheap model is plenty for summaries, SQL and
+# analysis get the stronger one. Each can be overridden with MODEL_<ROLE>.
+ROLE_MODELS = {
+    "sql": DEFAULT_MODEL,
+    "analysis": DEFAULT_MODEL,
+    "visualization": DEFAULT_MODEL,
+    "summary": "openai/gpt-oss-20b:free",
+}
+
+
+class ConnectionStats:
+    """
+    Counts HTTP requests against TCP connects / TLS handshakes, using httpcore's
+    trace extension, so we can see how often keep-alive connections are reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+
+    def _on_trace(self, event_name):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def trace(self, event_name, info):
+        self._on_trace(event_name)
+
+    async def atrace(self, event_name, info):
+        self._on_trace(event_name)
+
+    def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    async def aon_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.atrace
+
+    def as_dict(self):
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_rate": round(reused / self.requests, 3) if self.requests else 0.0,
+                "tls_handshakes": self.tls_handshakes,
+            }
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class ModelRegistry:
+    """
+    Process-wide ChatOpenAI clients, one per role, all sharing a single pooled
+    httpx client so keep-alive connections and TLS sessions survive across
+    nodes, turns and threads.
+
+    The async side is kept per event loop: an httpx.AsyncClient's pool belongs
+    to the loop it first ran on, and a second asyncio.run() (a Streamlit
+    rerun, a test) has a new one. Called inside a loop, get() returns a model
+    whose async client belongs to that loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._loop_models = weakref.WeakKeyDictionary()
+        self._registered = {}
+        self._http_client = None
+        self._http_async_client = None
+        self._loop_async_clients = weakref.WeakKeyDictionary()
+        self.connection_stats = ConnectionStats()
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "32")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "16")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+        )
+
+    def _timeout(self):
+        return httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "120")), connect=10.0)
+
+    def _async_client(self):
+        return httpx.AsyncClient(
+            limits=self._limits(),
+            timeout=self._timeout(),
+            event_hooks={"request": [self.connection_stats.aon_request]},
+        )
+
+    def _clients(self, loop):
+        if self._http_client is None:
+            self._http_client = httpx.Client(
+                limits=self._limits(),
+                timeout=self._timeout(),
+                event_hooks={"request": [self.connection_stats.on_request]},
+            )
+        if loop is None:
+            # Only used if a sync caller later awaits the model in some loop of its own
+            if self._http_async_client is None:
+                self._http_async_client = self._async_client()
+            return self._http_client, self._http_async_client
+        if loop not in self._loop_async_clients:
+            self._loop_async_clients[loop] = self._async_client()
+        return self._http_client, self._loop_async_clients[loop]
+
+    def _forget_closed_loops(self):
+        # The clients' connections refer back to their loop, so the weak keys alone never let go
+        for mapping in (self._loop_models, self._loop_async_clients):
+            for loop in [loop for loop in mapping if loop.is_closed()]:
+                del mapping[loop]
+
+    def model_name(self, role):
+        return os.getenv(f"MODEL_{role.upper()}", ROLE_MODELS.get(role, DEFAULT_MODEL))
+
+    def get(self, role="sql"):
+        with self._lock:
+            if role in self._registered:
+                return self._registered[role]
+            loop = _running_loop()
+            if loop is not None and loop not in self._loop_models:
+                self._forget_closed_loops()
+            models = self._models if loop is None else self._loop_models.setdefault(loop, {})
+            if role not in models:
+                http_client, http_async_client = self._clients(loop)
+                models[role] = ChatOpenAI(
+                    model=self.model_name(role),
+                    # Ensure your .env has OPENAI_API_KEY (read on first use, after load_dotenv)
+                    openai_api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=os.getenv("OPENAI_BASE_URL", DEFAULT_BASE_URL),
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    # OpenRouter often requires these headers for rankings/analytics
+                    # default_headers={
+                    #     "HTTP-Referer": "http://localhost:3000", # Your site URL
+                    #     "X-Title": "Investment Analyst Agent",   # Your site name
+                    # }
+                )
+            return models[role]
+
+    def register(self, role, model):
+        """Installs a specific model (e.g. a fake chat model in tests) for a role, in every loop."""
+        with self._lock:
+            self._registered[role] = model
+
+    def reset(self):
+        with self._lock:
+            self._models = {}
+            self._loop_models = weakref.WeakKeyDictionary()
+            self._registered = {}
+
+    def stats(self):
+        models = {**self._models, **self._registered}
+        return {
+            "models": {role: getattr(m, "model_name", type(m).__name__) for role, m in models.items()},
+            "connections": self.connection_stats.as_dict(),
+        }
+
+
+registry = ModelRegistry()
+
+
+def get_model(role="sql"):
+    return registry.get(role)
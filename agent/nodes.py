@@ -1,40 +1,42 @@
-import os
-import matplotlib.pyplot as plt
+import sqlite3
+import time
 import pandas as pd
-import json
-import climage
+from io import StringIO
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+from db.cost import DEFAULT_MAX_COST, QueryTooExpensive
 from db.dbmanager import DatabaseManager
+from db.sqlguard import SQLGuard, GuardrailViolation
+from db.index_advisor import QueryLog
+from agent.sql_cache import SQLCache, schema_fingerprint, user_questions
+from agent.few_shot import FewShotIndex, examples_message
+from agent.charts import FallbackCodeCache, chart_cache, chart_key, infer_spec, render_chart
+from agent.sandbox import ChartSandboxPool, SandboxError
+from agent.candidates import SQL_CANDIDATES, generate_candidates, agenerate_candidates
+from agent.concurrency import llm_slot, run_blocking
+from agent.models import get_model
+from agent.summarizer import RollingSummarizer
+from agent.telemetry import record_cache_hit, record_db, telemetry
 from rich.prompt import Prompt, Confirm
 from rich.console import Console
 
 
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage, RemoveMessage
+from langchain_core.messages import SystemMessage, HumanMessage
 
 db_manager = DatabaseManager()
+sql_cache = SQLCache()
+# Approved (question, SQL) pairs retrieved as examples for generate_sql
+few_shot = FewShotIndex(sql_cache)
+# Approved SQL and its DB time, for the index advisor
+query_log = QueryLog()
+summarizer = RollingSummarizer()
+# LLM plotting code for result shapes no chart template covers
+chart_code_cache = FallbackCodeCache()
+# Worker processes that run that code; started on first use
+chart_sandbox = ChartSandboxPool()
 # Then initialize it
 console = Console()
 
-def get_model():
-    # Use the specific OpenRouter base URL
-    base_url = "https://openrouter.ai/api/v1"
-    # Ensure your .env has OPENROUTER_API_KEY
-    api_key = os.getenv("OPENAI_API_KEY")
-
-    return ChatOpenAI(
-        #model="openai/gpt-oss-20b:free",
-        model="openai/gpt-oss-120b:free",
-        # The exact string from OpenRouter
-        openai_api_key=api_key,
-        base_url=base_url,
-        # OpenRouter often requires these headers for rankings/analytics
-        # default_headers={
-        #     "HTTP-Referer": "http://localhost:3000", # Your site URL
-        #     "X-Title": "Investment Analyst Agent",   # Your site name
-        # }
-    )
 def generate_sql_node_deprecated(state):
     llm = get_model()
     schema = db_manager.get_schema()
@@ -47,13 +49,7 @@ def generate_sql_node_deprecated(state):
     return {"sql_query": res.content.strip(), "attempts": state.get("attempts", 0) + 1}
 
 
-def generate_sql_node(state):
-    llm = get_model() # Using the OpenRouter config we built
-
-    # 1. Define the System Prompt with the Schema
-    # We tell the LLM how to handle the history
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are a Senior SQL Expert for an investment firm.
+SQL_SYSTEM_PROMPT = """You are a Senior SQL Expert for an investment firm.
         Your goal is to write SQLite queries based on user questions.
         
         DB SCHEMA:
@@ -61,36 +57,171 @@ def generate_sql_node(state):
         
         INSTRUCTIONS:
         - Use the conversation history to understand context (e.g., 'it', 'those', 'same again').
-        - If the user provides a follow-up, modify the previous logic accordingly.
-        - Return ONLY the SQL query. No explanation. No markdown blocks."""),
+        - If the user provides a follow-up, modify the previous logic accordingly.{hints}
+        - Return ONLY the SQL query. No explanation. No markdown blocks."""
+
+# Only offered when the database has the summary tables (see db.summaries)
+SUMMARY_TABLES_HINT = """
+        - For current positions, P&L and sector exposure use the `positions` and `sector_exposure_daily` summary tables instead of aggregating `transactions`."""
+SUMMARY_TABLES = {"positions", "sector_exposure_daily"}
+
 
-        # 2. This placeholder injects the entire conversation history automatically
+def _schema_hints(snapshot):
+    tables = snapshot.render("sql_guard", SQLGuard.from_snapshot).tables
+    return SUMMARY_TABLES_HINT if SUMMARY_TABLES <= tables.keys() else ""
+
+
+def build_sql_prompt(snapshot):
+    # The system prompt only depends on the schema, so it is rendered once per
+    # schema version and reused; only the history is templated per call.
+    return ChatPromptTemplate.from_messages([
+        SystemMessage(content=SQL_SYSTEM_PROMPT.format(schema=snapshot.text, hints=_schema_hints(snapshot))),
+        # Similar approved queries from the few-shot index, filled per call
+        MessagesPlaceholder(variable_name="examples", optional=True),
+        # This placeholder injects the entire conversation history automatically
         MessagesPlaceholder(variable_name="messages"),
     ])
 
-    # 3. Get the database schema (from our manager)
 
-    db = DatabaseManager()
-    schema = db.get_schema()
+def _prepare_sql_generation(state):
+    """
+    Shared by the sync and async nodes. Returns (cached_update, prompt, cache_key):
+    a ready state update when the NL-to-SQL cache hits, otherwise the prompt to run.
+    """
+    snapshot = db_manager.schema_snapshot()
+    schema_fp = snapshot.render("fingerprint", schema_fingerprint)
+    cache_key, question = sql_cache.make_key(state["messages"], schema_fp)
+
+    # 1. Serve previously approved SQL for the same question, unless we are
+    # here because the last attempt failed
+    if cache_key and not state.get("error"):
+        cached_sql = sql_cache.get(cache_key)
+        if cached_sql:
+            console.print("[dim]⚡ SQL cache hit, skipping generation[/dim]")
+            record_cache_hit("sql")
+            return {"sql_query": cached_sql, "sql_cache_key": cache_key, "sql_cache_hit": True}, None, cache_key
+
+    # 2. Get the system prompt with the schema, pre-rendered for this schema version
+    return None, snapshot.render("sql_prompt", build_sql_prompt), cache_key
+
 
-    # 4. Chain it together and invoke
-    chain = prompt | llm
+def _sql_generation_update(sql, cache_key, started):
+    return {
+        "sql_query": sql,
+        "sql_cache_key": cache_key or "",
+        "sql_cache_hit": False,
+        "sql_gen_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+def _sql_messages(state):
+    # On a retry the model sees why its last query failed (DB error, cost
+    # refusal, rejection) so it can rewrite instead of guessing again
+    if not state.get("error") or not state.get("sql_query"):
+        return state["messages"]
+    feedback = (
+        f"The previous SQL query failed.\nQUERY: {state['sql_query']}\n"
+        f"ERROR: {state['error']}\nWrite a corrected query."
+    )
+    return state["messages"] + [HumanMessage(content=feedback)]
+
+
+def _sql_inputs(state):
+    inputs = {"messages": _sql_messages(state)}
+    questions = user_questions(state["messages"])
+    if questions:
+        # Only pairs approved against the schema the model is about to see
+        schema_fp = db_manager.schema_snapshot().render("fingerprint", schema_fingerprint)
+        examples = few_shot.search(questions[-1], schema_fp=schema_fp)
+        stats = few_shot.stats()
+        console.print(
+            f"[dim]📚 {len(examples)} similar approved queries in {stats['last_search_ms']:.2f}ms "
+            f"(index: {stats['pairs']} pairs, {stats['terms']} terms, ~{stats['text_bytes'] / 1024:.0f} KiB of text)[/dim]"
+        )
+        if examples:
+            inputs["examples"] = [examples_message(examples)]
+    return inputs
+
+
+def _validate_candidate(sql):
+    """Guardrail plus an EXPLAIN dry run: (sql, canonical, error, estimated rows)."""
+    sql, canonical, error = _check_sql(sql)
+    if error:
+        return sql, canonical, error, None
+    try:
+        # EXPLAIN compiles the statement, so unknown columns and syntax errors show up here
+        cost = db_manager.estimate_cost(sql)
+    except sqlite3.Error as e:
+        return sql, canonical, str(e), None
+    if cost.estimated_rows > DEFAULT_MAX_COST:
+        error = str(QueryTooExpensive(
+            "estimated_cost", f"the plan visits about {cost.estimated_rows:,.0f} rows", cost.flags,
+            estimated_rows=cost.estimated_rows,
+        ))
+    return sql, canonical, error, cost.estimated_rows
 
-    # We pass the 'messages' from the state directly
-    response = chain.invoke({
-        "schema": schema,
-        "messages": state["messages"]
-    })
 
-    return {"sql_query": response.content}
+def generate_sql_node(state):
+    cached, prompt, cache_key = _prepare_sql_generation(state)
+    if cached:
+        return cached
+
+    # The conversation plus a few similar approved queries
+    inputs = _sql_inputs(state)
+    started = time.perf_counter()
+    if SQL_CANDIDATES > 1:
+        best, report = generate_candidates(prompt, inputs, _validate_candidate)
+        console.print(f"[dim]🧪 {report}[/dim]")
+        return _sql_generation_update(best.sql, cache_key, started)
+
+    # Shared, pooled client from the model registry
+    response = (prompt | get_model("sql")).invoke(inputs)
+    return _sql_generation_update(response.content, cache_key, started)
+
+
+async def agenerate_sql_node(state):
+    # Schema and cache lookups touch SQLite, so they run off the event loop
+    cached, prompt, cache_key = await run_blocking(_prepare_sql_generation, state)
+    if cached:
+        return cached
+
+    inputs = await run_blocking(_sql_inputs, state)
+    started = time.perf_counter()
+    if SQL_CANDIDATES > 1:
+        best, report = await agenerate_candidates(prompt, inputs, _validate_candidate)
+        console.print(f"[dim]🧪 {report}[/dim]")
+        return _sql_generation_update(best.sql, cache_key, started)
+
+    async with llm_slot():
+        response = await (prompt | get_model("sql")).ainvoke(inputs)
+    return _sql_generation_update(response.content, cache_key, started)
+
+def _check_sql(sql):
+    """Runs the schema-aware guard; returns (cleaned sql, canonical text, error)."""
+    guard = db_manager.schema_snapshot().render("sql_guard", SQLGuard.from_snapshot)
+    sql = SQLGuard.clean(sql)
+    try:
+        return sql, guard.check(sql), ""
+    except GuardrailViolation as e:
+        return sql, "", f"Security check failed: {e}."
 
 def guardrail_node(state):
-    query = state["sql_query"].upper()
-    if any(word in query for word in ["DROP", "DELETE", "UPDATE", "INSERT"]):
-        return {"error": "Security check failed: Read-only access only."}
-    return {"error": ""}
+    sql, canonical, error = _check_sql(state["sql_query"])
+    if error:
+        # Counts as an attempt, so a model that keeps writing bad SQL still runs out of retries
+        return {"error": error, "attempts": state.get("attempts", 0) + 1}
+    return {"sql_query": sql, "sql_canonical": canonical, "error": ""}
+
+async def aguardrail_node(state):
+    # The schema snapshot behind the guard may read SQLite
+    return await run_blocking(guardrail_node, state)
 
 def human_review_node(state):
+    if state.get("error"):
+        # The guardrail already refused it; nothing to review, go back for a rewrite
+        console.print(f"[bold red]🛡️ {state['error']}[/bold red]")
+        return {}
+
     console.print(f"\n[bold yellow]🔍 AI PROPOSED QUERY:[/bold yellow]")
     console.print(f"[green]{state['sql_query']}[/green]\n")
 
@@ -107,63 +238,126 @@ def human_review_node(state):
         return {"user_approved": True, "show_viz": True}
     elif choice == "c":
         new_sql = Prompt.ask("[bold cyan]Enter modified SQL[/bold cyan]")
-        return {"sql_query": new_sql, "user_approved": True, "error": ""}
+        # Edited SQL is held to the same read-only rules
+        new_sql, canonical, error = _check_sql(new_sql)
+        if error:
+            console.print(f"[bold red]🛡️ {error}[/bold red]")
+        return {"sql_query": new_sql, "sql_canonical": canonical, "user_approved": not error, "error": error}
     else:
         return {"user_approved": False, "error": "User rejected the query."}
 
+async def ahuman_review_node(state):
+    # Rich prompts block on stdin
+    return await run_blocking(human_review_node, state)
+
+def _invalidate_cached_sql(state):
+    # Cached SQL that failed or was rejected should be neither served again
+    # nor offered as a few-shot example
+    if state.get("sql_cache_hit"):
+        question = sql_cache.invalidate(state["sql_cache_key"])
+        if question:
+            few_shot.remove(question)
+
 def execute_query_node(state):
-    if state["error"]: return state
+    if state["error"]:
+        _invalidate_cached_sql(state)
+        return state
     try:
-        results = db_manager.execute_query(state["sql_query"])
-        # Convert to a JSON string for the AgentState
-        # indent=2 makes it readable if you decide to print it for debugging
-        json_data = json.dumps(results, indent=2)
-        console.print(f"[green]{json_data}[/green]\n")
-        return {"db_results": json_data, "error": ""}
+        # Bounded fetch: the state (and the LLM context) only ever gets the
+        # first rows, plus a summary describing the full result
+        started = time.perf_counter()
+        canonical = state.get("sql_canonical") or None
+        result = db_manager.execute_query_stream(state["sql_query"], canonical=canonical)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        record_db(elapsed_ms, result.row_count)
+        if result.from_cache:
+            record_cache_hit("result")
+        else:
+            # Only real runs feed the index advisor; a cache hit says nothing about the plan
+            query_log.record(state["sql_query"], elapsed_ms, canonical=canonical)
+        # The result itself stays out-of-band; the state only carries its handle
+        # and a compact rendering for the LLM
+        result_handle = db_manager.results.put(result)
+        json_data = result.to_json()
+        summary = result.summary()
+        console.print(f"[green]{json_data[:2000]}{' ...' if len(json_data) > 2000 else ''}[/green]")
+        console.print(f"[dim]{summary}[/dim]\n")
+
+        # Reaching here means the guardrail and the human review both passed
+        if state.get("sql_cache_key") and not state.get("sql_cache_hit"):
+            question = user_questions(state["messages"])[-1]
+            schema_fp = db_manager.schema_snapshot().render("fingerprint", schema_fingerprint)
+            sql_cache.put(state["sql_cache_key"], question, state["sql_query"], schema_fp, state.get("sql_gen_ms", 0.0))
+            few_shot.add(question, state["sql_query"], schema_fp)
+        return {"db_results": json_data, "db_summary": summary, "result_handle": result_handle, "error": ""}
     except Exception as e:
+        _invalidate_cached_sql(state)
+        if isinstance(e, QueryTooExpensive):
+            # Goes back to generate_sql through should_continue, with the plan issues
+            console.print(f"[bold red]⏱️ Query refused ({e.reason}):[/bold red] [red]{e.detail}[/red]")
+            for flag in e.flags:
+                console.print(f"[dim red]  - {flag}[/dim red]")
         return {
             "error": str(e),
             "attempts": state.get("attempts", 0) + 1
         }
 
+def rejection_update(state, feedback):
+    """
+    State update for SQL the reviewer rejected at the execute_query breakpoint
+    (Streamlit). Apply it with as_node="summarize": the graph then resumes at
+    generate_sql, so the rejected SQL is never run nor cached, and the
+    feedback reaches the model as the reason the last query failed.
+    """
+    _invalidate_cached_sql(state)
+    return {
+        "error": f"User rejected the query. Feedback: {feedback}",
+        "attempts": state.get("attempts", 0) + 1,
+        "sql_cache_hit": False,
+    }
+
+async def aexecute_query_node(state):
+    return await run_blocking(execute_query_node, state)
+
 def analysis_node_deprecated(state):
     llm = get_model()
     prompt = f"Analyze these results: {state['db_results']} for the question: {state['question']}"
     res = llm.invoke(prompt)
     return {"analysis": res.content}
 
-def analysis_node(state):
-    llm = get_model()
-
-    # 1. Define the Senior Analyst prompt
-    # We include the database results as a system context
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are a Senior Investment Analyst. 
-        Your task is to take the provided database results and explain them to the user.
-        
-        DATABASE RESULTS:
-        {db_results}
-        
-        INSTRUCTIONS:
-        - Use the conversation history to provide a context-aware response.
-        - Be professional, concise, and highlight key financial findings.
-        - If the results are empty, explain that no data was found for their specific criteria."""),
+# 1. Define the Senior Analyst prompt
+# We include the database results as a system context
+ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a Senior Investment Analyst. 
+    Your task is to take the provided database results and explain them to the user.
+    
+    DATABASE RESULTS:
+    {db_results}
+    
+    RESULT SUMMARY:
+    {db_summary}
+    
+    INSTRUCTIONS:
+    - Use the conversation history to provide a context-aware response.
+    - Be professional, concise, and highlight key financial findings.
+    - If the results are empty, explain that no data was found for their specific criteria.
+    - If the summary says the results were truncated, base totals on the summary stats, not on the rows shown."""),
 
-        # 2. Injects the message history so the AI knows what the user asked
-        MessagesPlaceholder(variable_name="messages"),
-    ])
+    # 2. Injects the message history so the AI knows what the user asked
+    MessagesPlaceholder(variable_name="messages"),
+])
 
-    # 3. Create the chain
-    chain = prompt | llm
 
-    # 4. Invoke with current state data
+def _analysis_inputs(state):
     # We pass the history (messages) and the raw SQL results
-    response = chain.invoke({
+    return {
         "messages": state["messages"],
-        "db_results": state["db_results"]
-    })
+        "db_results": state["db_results"],
+        "db_summary": state.get("db_summary", "")
+    }
+
 
-    # 5. Update the state
+def _analysis_update(response):
     # We return 'analysis' for your specific field and append the AI's response to 'messages'
     return {
         "analysis": response.content,
@@ -171,84 +365,194 @@ def analysis_node(state):
     }
 
 
-def summarize_history_node(state):
-    messages = state["messages"]
+def analysis_node(state):
+    # 3. Create the chain and invoke with current state data
+    chain = ANALYSIS_PROMPT | get_model("analysis")
+    response = chain.invoke(_analysis_inputs(state))
 
-    # Only summarize if we have more than, say, 10 messages
-    if len(messages) <= 5:
-        return {}
+    # 4. Update the state
+    return _analysis_update(response)
 
-    llm = get_model()
 
-    # We take everything except the last 2 messages (to keep current context fresh)
-    to_summarize = messages[:-2]
+async def aanalysis_node(state):
+    chain = ANALYSIS_PROMPT | get_model("analysis")
+    async with llm_slot():
+        response = await chain.ainvoke(_analysis_inputs(state))
+    return _analysis_update(response)
 
-    summary_prompt = (
-        "Summarize the following conversation history into a concise paragraph. "
-        "Focus on the financial assets discussed and any specific user preferences mentioned."
-    )
 
-    # Generate the summary
-    summary_response = llm.invoke([HumanMessage(content=summary_prompt + str(to_summarize))])
-    summary = summary_response.content
-    console.print(f"{summary}")
+def summarize_history_node(state, config):
+    # Summaries are folded in incrementally, in the background, once the
+    # history passes a token budget; see agent/summarizer.py
+    return summarizer.update(state["messages"], config["configurable"]["thread_id"])
 
-    # We use 'RemoveMessage' logic or simply re-initialize the thread
-    # In LangGraph, to "clear" history while keeping the summary, we can do this:
-    new_system_message = SystemMessage(content=f"Summary of previous conversation: {summary}")
 
-    # 2. Identify the messages to REMOVE
-    # We want to remove everything except the last 2 messages
-    delete_messages = [RemoveMessage(id=m.id) for m in messages[:-2]]
+async def asummarize_history_node(state, config):
+    # May wait on a summary job when the history is far over budget
+    return await run_blocking(summarizer.update, state["messages"], config["configurable"]["thread_id"])
 
-    # We keep the summary and the last two messages
-    # This effectively "resets" the window while keeping the brain intact
-    return {"messages": delete_messages + [new_system_message] + messages[-2:]}
 
 
+def load_result_frame(state):
+    """DataFrame for the current result: zero-copy from the result store when
+    the handle is still live, otherwise parsed back from the compact JSON."""
+    result = db_manager.results.get(state.get("result_handle"))
+    if result is not None:
+        return result.to_frame()
+    return pd.read_json(StringIO(state["db_results"]), orient="split")
 
-def visualization_node(state):
-    if not state.get("show_viz"):
-        return {}
 
-    llm = get_model()
-    # Convert string results back to a format the LLM can reason about
+def _visualization_prompt(state):
+    # The LLM only needs the compact rendering to reason about the shape;
+    # the generated code gets the DataFrame itself
     json_data = state["db_results"]
 
     # THE SENIOR PROMPT:
     # We tell the LLM exactly how the data is structured
-    prompt = f"""
+    return f"""
         You are a Senior Data Visualizer. 
-        Create a professional chart using the following JSON data:
+        Create a professional chart using the following data
+        (JSON with "columns" and "data" rows):
         {json_data}
     
         INSTRUCTIONS:
-        1. Use 'from io import StringIO' and 'pd.read_json(StringIO(json_data))' to load the data.
-        2. Do NOT pass the JSON string directly to read_json.
+        1. The data is already loaded in a pandas DataFrame named 'df'. Use it directly.
+        2. Do NOT load or parse the JSON yourself.
         3. Choose the best chart type (Bar for categories, Line for trends, Pie for portions).
         4. Use a professional Matplotlib style (e.g., 'ggplot' or 'seaborn-v0_8').
-        5. Ensure the chart has a Title, X/Y Labels, and is saved as 'output_chart.png'.
+        5. Ensure the chart has a Title and X/Y Labels. Draw it with pyplot; do not save or show it.
         6. Return ONLY the executable Python code. No explanations, no markdown backticks.
         """
-    # Generate the code
-    response = llm.invoke(prompt)
-    generated_code = response.content.strip()
 
+
+def _chart_update(state, kind, key):
+    return {
+        "analysis": state["analysis"] + f"\n\n[Visual Insight]: A {kind} chart has been generated to support this analysis.",
+        "chart_key": key,
+    }
+
+
+def _cached_chart(state, kind, key):
+    if chart_cache.get(key) is None:
+        return None
+    console.print("[dim]⚡ Chart cache hit, skipping rendering[/dim]")
+    record_cache_hit("chart")
+    return _chart_update(state, kind, key)
+
+
+def _template_chart(state):
+    """
+    Draws the chart from a template when one fits the result's shape, or
+    serves it from the chart cache. Returns (frame, shape, update); update is
+    None when the LLM has to write it.
+    """
+    df = load_result_frame(state)
+    shape = spec = None
+    try:
+        shape, spec = infer_spec(df)
+        if spec is None:
+            return df, shape, _code_chart_from_cache(state, df, shape)
+
+        key = chart_key(df, repr(spec))
+        cached = _cached_chart(state, spec.kind, key)
+        if cached:
+            return df, shape, cached
+        started = time.perf_counter()
+        chart_cache.put(key, render_chart(df, spec))
+    except Exception as e:
+        # Data the shape inference or a template chokes on falls back to the LLM
+        what = f"{spec.kind} template" if spec is not None else "chart inference"
+        console.print(f"[dim]⚠️ {what} failed ({e}), asking the LLM[/dim]")
+        return df, shape, None
+    console.print(f"[green]✅ {spec.kind} chart rendered from template in {(time.perf_counter() - started) * 1000:.0f}ms[/green]")
+    return df, shape, _chart_update(state, spec.kind, key)
+
+
+def _cached_chart_code(state, shape):
+    # Code the LLM already wrote for this question and result shape
+    if shape is None:
+        return None
+    return chart_code_cache.get(user_questions(state["messages"])[-1], shape)
+
+
+def _code_chart_from_cache(state, df, shape):
+    # ...drawn for this exact data before
+    code = _cached_chart_code(state, shape)
+    return _cached_chart(state, "custom", chart_key(df, code)) if code else None
+
+
+def _run_chart_code(state, generated_code, df, shape):
+    generated_code = generated_code.strip()
     # Safety: Basic sanitization to remove markdown backticks if the LLM ignores instructions
     if generated_code.startswith("```python"):
         generated_code = generated_code.split("```python")[1].split("```")[0].strip()
 
+    key = chart_key(df, generated_code)
+    cached = _cached_chart(state, "custom", key)
+    if cached:
+        return cached
     try:
-        # EXECUTION: This runs the code generated by the AI
-        # We pass a dictionary to exec to keep the namespace clean
-        exec_globals = {"json": json, "pd": pd, "plt": plt}
-        exec(generated_code, exec_globals)
+        # EXECUTION: the generated code runs in a sandbox worker process with
+        # CPU, memory and wall-clock limits; only the PNG comes back
+        chart_cache.put(key, chart_sandbox.render(generated_code, df))
+        if shape is not None:
+            chart_code_cache.put(user_questions(state["messages"])[-1], shape, generated_code)
 
-        print(f"✅ Visualization generated successfully and saved to 'output_chart.png'")
+        console.print(f"[green]✅ Visualization generated in {chart_sandbox.last_ms:.0f}ms[/green]")
+        return _chart_update(state, "custom", key)
+    except SandboxError as e:
+        console.print(f"[bold red]⚠️ Visualization failed:[/bold red] {e}")
+        return {"error": f"Chart generation failed: {str(e)}"}
 
-        return {
-            "analysis": state["analysis"] + "\n\n[Visual Insight]: A chart has been generated to support this analysis."
-        }
-    except Exception as e:
-        print(f"⚠️ Visualization failed: {e}")
-        return {"error": f"Chart generation failed: {str(e)}"}
\ No newline at end of file
+
+def visualization_node(state):
+    if not state.get("show_viz"):
+        return {}
+
+    # Templates first; the LLM only writes code for shapes they do not cover,
+    # and only once per question and shape
+    df, shape, update = _template_chart(state)
+    if update:
+        return update
+    code = _cached_chart_code(state, shape)
+    if code is None:
+        code = get_model("visualization").invoke(_visualization_prompt(state)).content
+    return _run_chart_code(state, code, df, shape)
+
+
+async def avisualization_node(state):
+    if not state.get("show_viz"):
+        return {}
+
+    # Drawing is CPU-bound and blocking
+    df, shape, update = await run_blocking(_template_chart, state)
+    if update:
+        return update
+    code = _cached_chart_code(state, shape)
+    if code is None:
+        async with llm_slot():
+            code = (await get_model("visualization").ainvoke(_visualization_prompt(state))).content
+    return await run_blocking(_run_chart_code, state, code, df, shape)
+
+
+# Node implementations by graph node name, for building sync or async graphs;
+# each one is timed and metered by agent.telemetry
+SYNC_NODES = telemetry.instrument_nodes({
+    "summarize": summarize_history_node,
+    "generate_sql": generate_sql_node,
+    "guardrail": guardrail_node,
+    "execute_query": execute_query_node,
+    "analysis": analysis_node,
+    "human_review": human_review_node,
+    "visualization": visualization_node,
+})
+
+ASYNC_NODES = telemetry.instrument_nodes({
+    "summarize": asummarize_history_node,
+    "generate_sql": agenerate_sql_node,
+    "guardrail": aguardrail_node,
+    "execute_query": aexecute_query_node,
+    "analysis": aanalysis_node,
+    "human_review": ahuman_review_node,
+    "visualization": avisualization_node,
+})
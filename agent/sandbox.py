@@ -0,0 +1,242 @@
+import atexit
+import hashlib
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows: jobs there only get the wall-clock limit
+    resource = None
+
+CHART_SANDBOX_WORKERS = int(os.getenv("CHART_SANDBOX_WORKERS", "2"))
+CHART_SANDBOX_CPU_SECONDS = float(os.getenv("CHART_SANDBOX_CPU_SECONDS", "5"))
+CHART_SANDBOX_MEMORY_MB = int(os.getenv("CHART_SANDBOX_MEMORY_MB", "2048"))
+CHART_SANDBOX_WALL_SECONDS = float(os.getenv("CHART_SANDBOX_WALL_SECONDS", "15"))
+
+
+class SandboxError(Exception):
+    """A chart job that failed or was stopped; `reason` is "timeout", "cpu", "memory" or "error"."""
+
+    def __init__(self, reason, detail):
+        self.reason = reason
+        self.detail = detail
+        super().__init__(f"{reason}: {detail}")
+
+
+class _CPUTimeExceeded(BaseException):
+    # BaseException, so a bare `except Exception` in the generated code cannot swallow it
+    pass
+
+
+def _on_sigxcpu(signum, frame):
+    raise _CPUTimeExceeded()
+
+
+def _worker_main(conn, memory_mb):
+    """
+    Worker loop. Receives (source, df, cpu_seconds), runs the code against
+    `df` and answers ("ok", png bytes) or (reason, detail). Whatever the code
+    drew is exported from pyplot's current figure, so it does not matter
+    where (or whether) it tried to save the file.
+    """
+    import io
+    import json
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    # Stray savefig("output_chart.png") calls land here, not in the app's cwd
+    os.chdir(tempfile.mkdtemp(prefix="chart-sandbox-"))
+    if resource is not None:
+        if memory_mb:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024, hard))
+        signal.signal(signal.SIGXCPU, _on_sigxcpu)
+
+    compiled = OrderedDict()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        source, df, cpu_seconds = job
+
+        if resource is not None:
+            # RLIMIT_CPU counts the process' lifetime, so each job gets "now + budget"
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            resource.setrlimit(resource.RLIMIT_CPU, (int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1, hard))
+        try:
+            key = hashlib.sha256(source.encode()).hexdigest()
+            code = compiled.get(key)
+            if code is None:
+                code = compile(source, "<chart>", "exec")
+                compiled[key] = code
+                if len(compiled) > 64:
+                    compiled.popitem(last=False)
+            exec(code, {"json": json, "pd": pd, "plt": plt, "df": df})
+            if not plt.get_fignums():
+                raise ValueError("the code did not draw a figure")
+            buffer = io.BytesIO()
+            plt.gcf().savefig(buffer, format="png")
+            reply = ("ok", buffer.getvalue())
+        except _CPUTimeExceeded:
+            reply = ("cpu", f"used more than {cpu_seconds:g}s of CPU")
+        except MemoryError:
+            reply = ("memory", f"went over {memory_mb}MB")
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        finally:
+            # Nothing carries over to the next job
+            plt.close("all")
+            if resource is not None:
+                resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.jobs = 0
+
+
+class ChartSandboxPool:
+    """
+    Pre-started worker processes for LLM-written plotting code.
+
+    Workers are forked from a forkserver that has matplotlib and pandas
+    imported already, so a job pays neither the import nor the fork of a
+    big parent. Each job runs under a CPU-time and an address-space limit
+    in its worker and a wall-clock limit enforced from here; a worker that
+    dies or overruns is killed and replaced. Jobs run concurrently, one per
+    idle worker; results come back as PNG bytes over the worker's pipe.
+    """
+
+    def __init__(self, workers=None, cpu_seconds=None, memory_mb=None, wall_seconds=None):
+        self.size = workers or CHART_SANDBOX_WORKERS
+        self.cpu_seconds = cpu_seconds or CHART_SANDBOX_CPU_SECONDS
+        self.memory_mb = memory_mb if memory_mb is not None else CHART_SANDBOX_MEMORY_MB
+        self.wall_seconds = wall_seconds or CHART_SANDBOX_WALL_SECONDS
+
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._ctx = None
+        self.last_ms = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._ctx is not None:
+                return
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                self._ctx = multiprocessing.get_context("forkserver")
+                self._ctx.set_forkserver_preload(["matplotlib.pyplot", "pandas"])
+            else:
+                self._ctx = multiprocessing.get_context("spawn")
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            atexit.register(self.close)
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, args=(child_conn, self.memory_mb), daemon=True, name="chart-sandbox"
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        worker.process.kill()
+        worker.process.join(timeout=1)
+        worker.conn.close()
+        with self._lock:
+            self._workers.remove(worker)
+            return self._spawn()
+
+    def _checkout(self):
+        while True:
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                pass
+            with self._lock:
+                # A replacement that failed to start left the pool short
+                if self._ctx is not None and len(self._workers) < self.size:
+                    return self._spawn()
+
+    def _checkin(self, worker, reusable):
+        # Only a worker that answered goes back; anything else may still be
+        # running the job (or be dead) and is swapped for a fresh one
+        if reusable:
+            self._idle.put(worker)
+            return
+        try:
+            self._idle.put(self._replace(worker))
+        except Exception:
+            # Not re-queued: the next render() starts one when the pool is short
+            pass
+
+    def render(self, source, df):
+        """Runs `source` against `df` in a worker and returns the PNG bytes, or raises SandboxError."""
+        self.start()
+        try:
+            worker = self._checkout()
+        except Exception as e:
+            raise SandboxError("error", f"could not start a worker: {type(e).__name__}: {e}") from e
+        started = time.perf_counter()
+        answered = False
+        try:
+            try:
+                worker.conn.send((source, df, self.cpu_seconds))
+            except (BrokenPipeError, ConnectionResetError):
+                raise SandboxError("error", "worker was gone before the job started")
+            if not worker.conn.poll(self.wall_seconds):
+                raise SandboxError("timeout", f"still running after {self.wall_seconds:g}s")
+            try:
+                status, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                # Killed outright (os._exit in the code, the OOM killer, a segfault)
+                worker.process.join(timeout=1)
+                raise SandboxError("error", f"worker died (exit code {worker.process.exitcode})")
+            answered = True
+        except SandboxError:
+            raise
+        except Exception as e:
+            # e.g. a result frame that cannot be pickled; the visualization node only handles SandboxError
+            raise SandboxError("error", f"{type(e).__name__}: {e}") from e
+        finally:
+            self._checkin(worker, answered)
+
+        worker.jobs += 1
+        if status != "ok":
+            raise SandboxError(status, payload)
+        self.last_ms = (time.perf_counter() - started) * 1000
+        return payload
+
+    def close(self):
+        with self._lock:
+            for worker in self._workers:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+                worker.process.join(timeout=1)
+                if worker.process.is_alive():
+                    worker.process.kill()
+            self._workers = []
+            self._ctx = None
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_question(text):
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    text = re.sub(r"\s+", " ", str(text).strip().lower())
+    return text.rstrip(" ?.!")
+
+
+def user_questions(messages):
+    """Normalized content of every user message, oldest first."""
+    return [normalize_question(m.content) for m in messages if m.type == "human"]
+
+
+def schema_fingerprint(snapshot):
+    # Hashing the DDL text (rather than schema_version) keeps entries valid
+    # across a wipe & recreate that produces the same tables.
+    return hashlib.sha256(snapshot.text.encode()).hexdigest()[:16]
+
+
+class SQLCache:
+    """
+    Persistent NL-to-SQL cache.
+
+    Maps (normalized question, recent conversation context, schema) to the SQL
+    a human already approved, so repeated questions skip the LLM round trip.
+    Entries are evicted by TTL and, past `max_entries`, least recently used
+    first. Only `put()` SQL that cleared the guardrail and human review.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl_seconds=None, context_turns=None):
+        self.path = path or os.getenv("SQL_CACHE_DB", "sql_cache.db")
+        self.max_entries = max_entries or int(os.getenv("SQL_CACHE_MAX_ENTRIES", "5000"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("SQL_CACHE_TTL", str(7 * 24 * 3600)))
+        # How many earlier user questions take part in the key (follow-ups like "same for MSFT")
+        self.context_turns = context_turns if context_turns is not None else int(os.getenv("SQL_CACHE_CONTEXT_TURNS", "1"))
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.lookups = 0
+        self.hits = 0
+        self.saved_ms = 0.0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS sql_cache (
+                    key TEXT PRIMARY KEY,
+                    question TEXT,
+                    sql TEXT,
+                    schema_fp TEXT,
+                    created_at REAL,
+                    last_used REAL,
+                    hits INTEGER DEFAULT 0,
+                    gen_ms REAL
+                )
+            ''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sql_cache_last_used ON sql_cache(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def make_key(self, messages, schema_fp):
+        """
+        Builds the cache key from the latest user question plus the previous
+        `context_turns` user questions. Returns (key, question), or (None, None)
+        when there is no user question to key on.
+        """
+        questions = user_questions(messages)
+        if not questions:
+            return None, None
+
+        question = questions[-1]
+        context = questions[-1 - self.context_turns:-1] if self.context_turns else []
+        raw = "\x1f".join([schema_fp, question] + context)
+        return hashlib.sha256(raw.encode()).hexdigest(), question
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            self.lookups += 1
+            conn = self._connection()
+            row = conn.execute("SELECT sql, created_at, gen_ms FROM sql_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            sql, created_at, gen_ms = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+
+            conn.execute("UPDATE sql_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            self.saved_ms += gen_ms or 0.0
+            return sql
+
+    def put(self, key, question, sql, schema_fp, gen_ms):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO sql_cache (key, question, sql, schema_fp, created_at, last_used, hits, gen_ms) "
+                "VALUES (?,?,?,?,?,?,0,?) "
+                "ON CONFLICT(key) DO UPDATE SET sql = excluded.sql, created_at = excluded.created_at, "
+                "last_used = excluded.last_used, gen_ms = excluded.gen_ms",
+                (key, question, sql, schema_fp, now, now, gen_ms)
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def invalidate(self, key):
+        """Deletes an entry; returns its question (None if there was none), so other indexes can drop it too."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT question FROM sql_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+            conn.commit()
+        return row[0] if row else None
+
+    def approved_pairs(self):
+        """Every live (question, sql, schema_fp), oldest first, e.g. to seed the few-shot index."""
+        with self._lock:
+            return self._connection().execute(
+                "SELECT question, sql, schema_fp FROM sql_cache WHERE created_at >= ? ORDER BY created_at",
+                (time.time() - self.ttl_seconds,)
+            ).fetchall()
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM sql_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = conn.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM sql_cache WHERE key IN (SELECT key FROM sql_cache ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        with self._lock:
+            entries, lifetime_hits, lifetime_saved = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(hits * gen_ms), 0) FROM sql_cache"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "latency_saved_ms": round(self.saved_ms, 1),
+            "lifetime_hits": lifetime_hits,
+            "lifetime_latency_saved_ms": round(lifetime_saved, 1),
+        }
@@ -9,9 +9,21 @@ class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
 
     sql_query: str
+    # Canonical text of sql_query from the guardrail (see db/sqltext.py), used as the cache key
+    sql_canonical: str
     db_results: str
+    # Row count, truncation marker and column stats for db_results
+    db_summary: str
+    # Handle into db_manager.results, where the columnar result itself lives
+    result_handle: str
     analysis: str
     error: str
     attempts: int
     # NEW: Flag to trigger the optional visualization node
-    show_viz: bool
\ No newline at end of file
+    show_viz: bool
+    # Key of the rendered chart in agent.charts.chart_cache
+    chart_key: str
+    # NL-to-SQL cache bookkeeping (see agent/sql_cache.py)
+    sql_cache_key: str
+    sql_cache_hit: bool
+    sql_gen_ms: float
\ No newline at end of file
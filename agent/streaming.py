@@ -0,0 +1,46 @@
+import time
+
+# Nodes whose LLM output is worth showing token by token
+STREAMED_NODES = ("generate_sql", "analysis")
+
+
+class TurnTimer:
+    """Time-to-first-token per node, measured from the start of the turn."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = {}
+
+    def mark(self, node):
+        """Records the first token of `node`; returns the TTFT the first time, else None."""
+        if node in self.first_token:
+            return None
+        self.first_token[node] = time.perf_counter() - self.started
+        return self.first_token[node]
+
+    def report(self):
+        return ", ".join(f"{node} {seconds:.2f}s" for node, seconds in self.first_token.items())
+
+
+def stream_turn(app, state_input, config, timer=None):
+    """
+    Runs one turn with LangGraph's "updates" + "messages" stream modes and
+    yields normalized events:
+
+      ("token", node, text)     - an LLM token from one of STREAMED_NODES
+      ("update", node, output)  - a node finished, with its state update
+
+    Pass a TurnTimer to have time-to-first-token recorded per node.
+    """
+    timer = timer or TurnTimer()
+    for mode, chunk in app.stream(state_input, config=config, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            text = message.content if isinstance(message.content, str) else ""
+            if node in STREAMED_NODES and text:
+                timer.mark(node)
+                yield "token", node, text
+        else:
+            for node, output in chunk.items():
+                yield "update", node, output
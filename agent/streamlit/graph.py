@@ -1,65 +1,26 @@
-import os
-import sqlite3
-from langgraph.checkpoint.sqlite import SqliteSaver
-from langgraph.graph import StateGraph, START, END
-from agent.state import AgentState
-from agent.nodes import generate_sql_node, guardrail_node, execute_query_node, analysis_node, human_review_node, \
-    summarize_history_node, visualization_node
+from agent.graph import CHECKPOINT_DB, LazyGraph, generate_visual_graph as _generate_visual_graph
 
+# Same graph as the terminal one, without the terminal review node: the run
+# stops before execute_query and the UI asks for approval
+_graph = LazyGraph(human_review=False, interrupt_before=["execute_query"])
 
-def should_continue(state: AgentState):
-    if state["error"] and state["attempts"] < 3:
-        return "generate_sql" # Retry loop
-    return "analysis"
-def check_viz_request(state: AgentState):
-    if state.get("show_viz"):
-        return "visualization"
-    return END
 
-conn = sqlite3.connect("agent_memory.db", check_same_thread=False)
-memory = SqliteSaver(conn)
-workflow = StateGraph(AgentState)
-workflow.add_node("summarize", summarize_history_node)
-workflow.add_node("generate_sql", generate_sql_node)
-workflow.add_node("guardrail", guardrail_node)
-workflow.add_node("execute_query", execute_query_node)
-workflow.add_node("analysis", analysis_node)
-workflow.add_node("visualization", visualization_node)
+def get_app():
+    """The compiled Streamlit graph, built on first use (see agent.graph.LazyGraph)."""
+    return _graph.get_app()
 
 
+def __getattr__(name):
+    # `from agent.streamlit.graph import app` still works; the first access builds it
+    if name in ("app", "memory", "conn"):
+        return _graph.built(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-workflow.add_edge(START, "summarize")
-workflow.add_edge("summarize", "generate_sql")
-workflow.add_edge("generate_sql", "guardrail")
-workflow.add_edge("guardrail", "execute_query")
-workflow.add_conditional_edges("execute_query", should_continue)
-# After analysis, check if we need a chart
-workflow.add_conditional_edges(
-    "analysis",
-    check_viz_request,
-    {
-        "visualization": "visualization",
-        END: END
-    }
-)
-workflow.add_edge("analysis", END)
 
-app = workflow.compile(checkpointer=memory,
-                       interrupt_before=["execute_query"])
+def build_async_app(db_path=CHECKPOINT_DB):
+    """`async with build_async_app() as app:` the async Streamlit graph; the checkpointer connection closes on exit."""
+    return _graph.async_app(db_path)
+
 
 def generate_visual_graph():
-    graph_filename = "graph_flow.png"
-    print(f"📈 Will try to create the graph visual '{graph_filename}'")
-    # Only generate if the file does not exist
-    if not os.path.exists(graph_filename):
-        try:
-            # draw_mermaid_png returns the binary data of the image
-            png_data = app.get_graph().draw_mermaid_png()
-            with open(graph_filename, "wb") as f:
-                f.write(png_data)
-            print(f"📈 First run detected: Workflow visual saved to '{graph_filename}'")
-        except Exception as e:
-            print(f"⚠️ Could not generate graph image: {e}")
-    else:
-        # We skip generation to save resources
-        print(f"✅ Workflow visual '{graph_filename}' already exists. Skipping generation.")
\ No newline at end of file
+    _generate_visual_graph(human_review=False)
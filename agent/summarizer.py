@@ -0,0 +1,97 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import SystemMessage, HumanMessage, RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from agent.models import get_model
+
+# The rolling summary always lives in one SystemMessage with this id, so
+# updating it replaces the previous summary instead of stacking new ones
+SUMMARY_ID = "conversation_summary"
+SUMMARY_PREFIX = "Summary of previous conversation: "
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation with an investment analyst agent.\n"
+    "Update the summary below with the new messages. Keep it to one concise paragraph. "
+    "Focus on the financial assets discussed and any specific user preferences mentioned.\n\n"
+    "CURRENT SUMMARY:\n{summary}\n\nNEW MESSAGES:\n{new_messages}"
+)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional; fall back to a ~4 chars/token estimate
+    _encoding = None
+
+
+def count_tokens(messages):
+    """Prompt size of a message list, using tiktoken when it is installed."""
+    total = 0
+    for m in messages:
+        content = m.content if isinstance(m.content, str) else str(m.content)
+        total += 4 + (len(_encoding.encode(content)) if _encoding else len(content) // 4 + 1)
+    return total
+
+
+def _render(messages):
+    return "\n".join(f"{m.type}: {m.content}" for m in messages)
+
+
+class RollingSummarizer:
+    """
+    Incremental, token-budget-driven conversation summarization.
+
+    When a thread's history grows past `token_budget`, the messages before the
+    last `keep_recent` are folded into the existing summary by a background
+    job, so the turn that crossed the budget is not kept waiting. The next
+    turn swaps the finished summary in. Only if the history blows past
+    `hard_limit` does the node wait for the summary inline.
+    """
+
+    def __init__(self, token_budget=None, hard_limit=None, keep_recent=2):
+        self.token_budget = token_budget or int(os.getenv("SUMMARY_TOKEN_BUDGET", "3000"))
+        self.hard_limit = hard_limit or int(os.getenv("SUMMARY_HARD_LIMIT", str(self.token_budget * 3)))
+        self.keep_recent = keep_recent
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarizer")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _summarize(self, prior_summary, to_fold):
+        prompt = SUMMARY_PROMPT.format(summary=prior_summary or "(none yet)", new_messages=_render(to_fold))
+        response = get_model("summary").invoke([HumanMessage(content=prompt)])
+        return response.content, [m.id for m in to_fold]
+
+    def update(self, messages, thread_id):
+        """State update for the summarize node: applies a finished summary and/or schedules a new one."""
+        summary_msg = next((m for m in messages if m.id == SUMMARY_ID), None)
+        prior_summary = summary_msg.content[len(SUMMARY_PREFIX):] if summary_msg else ""
+
+        with self._lock:
+            job = self._jobs.get(thread_id)
+            if job is None and count_tokens(messages) > self.token_budget:
+                to_fold = [m for m in messages[:-self.keep_recent] if m.id != SUMMARY_ID]
+                if to_fold:
+                    job = self._executor.submit(self._summarize, prior_summary, to_fold)
+                    self._jobs[thread_id] = job
+
+        if job is None:
+            return {}
+        if not job.done() and count_tokens(messages) <= self.hard_limit:
+            # Still running: keep going with the full history this turn
+            return {}
+
+        with self._lock:
+            self._jobs.pop(thread_id, None)
+        try:
+            summary, folded_ids = job.result()
+        except Exception:
+            # A failed summary only costs us context size; try again next turn
+            return {}
+
+        folded = set(folded_ids)
+        kept = [m for m in messages if m.id not in folded and m.id != SUMMARY_ID]
+        new_summary = SystemMessage(content=SUMMARY_PREFIX + summary, id=SUMMARY_ID)
+        # Rebuild the list so the summary sits first, ahead of the kept messages
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), new_summary] + kept}
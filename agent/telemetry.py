@@ -0,0 +1,293 @@
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+# Every finished node span is appended here as one JSON line, when set
+AGENT_METRICS_JSONL = os.getenv("AGENT_METRICS_JSONL", "")
+# Finished spans kept in memory for the waterfall and JSONL export
+AGENT_METRICS_MAX_SPANS = int(os.getenv("AGENT_METRICS_MAX_SPANS", "5000"))
+# USD per million (prompt, completion) tokens by model name, e.g.
+# LLM_PRICES='{"openai/gpt-4o-mini": [0.15, 0.6]}'; unlisted models cost 0
+# (the default models are OpenRouter's free tier)
+LLM_PRICES = json.loads(os.getenv("LLM_PRICES", "{}"))
+
+# The graph's entry node: running it means a new user turn started
+TURN_START_NODE = "summarize"
+# Upper bounds of the node latency histogram, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span = ContextVar("agent_node_span", default=None)
+_usage_handler = ContextVar("agent_usage_handler", default=None)
+
+
+class NodeSpan:
+    """One run of one node: timings and what it spent, filled in while it runs."""
+
+    def __init__(self, node, thread_id, turn, attempt):
+        self.node = node
+        self.thread_id = thread_id
+        self.turn = turn
+        self.attempt = attempt
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+        self.status = "ok"
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.cost_usd = 0.0
+        self.db_ms = 0.0
+        self.rows = 0
+        self.cache_hits = []
+        self._lock = threading.Lock()
+
+    def as_dict(self):
+        return {
+            "ts": round(self.started_at, 3),
+            "thread_id": self.thread_id,
+            "turn": self.turn,
+            "node": self.node,
+            "status": self.status,
+            "attempt": self.attempt,
+            "duration_ms": round(self.duration_ms, 2),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "llm_calls": self.llm_calls,
+            "cost_usd": round(self.cost_usd, 6),
+            "db_ms": round(self.db_ms, 2),
+            "rows": self.rows,
+            "cache_hits": self.cache_hits,
+        }
+
+
+class _UsageHandler(BaseCallbackHandler):
+    # Registered through a configure hook, so every model call made inside a
+    # node reports its token usage to that node's span, streamed or not
+    def on_llm_end(self, response, **kwargs):
+        span = _current_span.get()
+        if span is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        model = (response.llm_output or {}).get("model_name", "")
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    metadata = getattr(message, "usage_metadata", None) or {}
+                    prompt += metadata.get("input_tokens", 0)
+                    completion += metadata.get("output_tokens", 0)
+                    model = model or (getattr(message, "response_metadata", None) or {}).get("model_name", "")
+        price_in, price_out = LLM_PRICES.get(model, (0.0, 0.0))
+        with span._lock:
+            span.llm_calls += 1
+            span.prompt_tokens += prompt
+            span.completion_tokens += completion
+            span.cost_usd += (prompt * price_in + completion * price_out) / 1_000_000
+
+
+register_configure_hook(_usage_handler, inheritable=True)
+
+
+class Telemetry:
+    """
+    Per-node metrics for the graph. instrument() wraps the node functions;
+    finished spans are kept per thread and turn (a turn starts when the
+    graph's entry node runs) and aggregated into counters and a latency
+    histogram per node for the Prometheus / OpenMetrics export.
+    """
+
+    def __init__(self, max_spans=None, jsonl_path=None):
+        self.spans = deque(maxlen=max_spans or AGENT_METRICS_MAX_SPANS)
+        self.jsonl_path = jsonl_path if jsonl_path is not None else AGENT_METRICS_JSONL
+        self._lock = threading.Lock()
+        self._turns = defaultdict(int)
+        self._handler = _UsageHandler()
+        self._runs = defaultdict(int)
+        # int for counts (tokens, rows, hits), float once a float was added (cost, seconds)
+        self._counters = defaultdict(int)
+        self._histograms = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self._latency_sum = defaultdict(float)
+
+    # --- recording ---
+
+    def _start(self, node, state, config):
+        thread_id = str(((config or {}).get("configurable") or {}).get("thread_id", ""))
+        with self._lock:
+            if node == TURN_START_NODE or thread_id not in self._turns:
+                self._turns[thread_id] += 1
+            turn = self._turns[thread_id]
+        span = NodeSpan(node, thread_id, turn, state.get("attempts", 0) if isinstance(state, dict) else 0)
+        return span, _current_span.set(span), _usage_handler.set(self._handler)
+
+    def _finish(self, span, tokens, failed):
+        span_token, handler_token = tokens
+        _current_span.reset(span_token)
+        _usage_handler.reset(handler_token)
+        span.duration_ms = (time.perf_counter() - span.started) * 1000
+        if failed:
+            span.status = "error"
+        record = span.as_dict()
+
+        with self._lock:
+            self.spans.append(span)
+            self._runs[(span.node, span.status)] += 1
+            for name, value in (
+                ("llm_prompt_tokens", span.prompt_tokens),
+                ("llm_completion_tokens", span.completion_tokens),
+                ("llm_calls", span.llm_calls),
+                ("llm_cost_usd", span.cost_usd),
+                ("db_seconds", span.db_ms / 1000),
+                ("db_rows", span.rows),
+            ):
+                self._counters[(name, span.node)] += value
+            for cache in span.cache_hits:
+                self._counters[("cache_hits", cache)] += 1
+            if span.node == "generate_sql" and span.attempt:
+                self._counters[("retries", span.node)] += 1
+            seconds = span.duration_ms / 1000
+            bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+            self._histograms[span.node][bucket] += 1
+            self._latency_sum[span.node] += seconds
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def instrument(self, name, fn):
+        """
+        Wraps a node function. The wrapper always takes `config` (LangGraph
+        passes it by parameter name) and hands it on only if `fn` wants it.
+        """
+        wants_config = "config" in inspect.signature(fn).parameters
+
+        if inspect.iscoroutinefunction(fn):
+            async def node(state, config):
+                span, *tokens = self._start(name, state, config)
+                failed = True
+                try:
+                    result = await (fn(state, config) if wants_config else fn(state))
+                    failed = False
+                    return result
+                finally:
+                    self._finish(span, tokens, failed)
+        else:
+            def node(state, config):
+                span, *tokens = self._start(name, state, config)
+                failed = True
+                try:
+                    result = fn(state, config) if wants_config else fn(state)
+                    failed = False
+                    return result
+                finally:
+                    self._finish(span, tokens, failed)
+
+        # Not functools.wraps: LangGraph would follow __wrapped__ to the
+        # original signature and stop passing `config`
+        node.__name__ = node.__qualname__ = fn.__name__
+        node.__doc__ = fn.__doc__
+        return node
+
+    def instrument_nodes(self, nodes):
+        return {name: self.instrument(name, fn) for name, fn in nodes.items()}
+
+    # --- reading ---
+
+    def turn(self, thread_id, turn=None):
+        """Spans of one turn of a thread, in start order (the latest turn by default)."""
+        thread_id = str(thread_id)
+        with self._lock:
+            turn = turn or self._turns.get(thread_id)
+            spans = [s for s in self.spans if s.thread_id == thread_id and s.turn == turn]
+        return sorted(spans, key=lambda s: s.started)
+
+    def write_jsonl(self, path):
+        with self._lock:
+            records = [span.as_dict() for span in self.spans]
+        with open(path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        return len(records)
+
+    def exposition(self, openmetrics=False):
+        """
+        The metrics in Prometheus text format, or OpenMetrics with
+        `openmetrics=True` (counter families named without `_total`, `# EOF`).
+        """
+        with self._lock:
+            runs = dict(self._runs)
+            counters = dict(self._counters)
+            histograms = {node: list(counts) for node, counts in self._histograms.items()}
+            latency_sum = dict(self._latency_sum)
+
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            # samples: [(suffix, {label: value}, number)]
+            family_name = name[:-len("_total")] if openmetrics and kind == "counter" else name
+            lines.append(f"# HELP {family_name} {help_text}")
+            lines.append(f"# TYPE {family_name} {kind}")
+            for suffix, labels, value in samples:
+                rendered = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{suffix}{{{rendered}}} {_number(value)}" if rendered else f"{name}{suffix} {_number(value)}")
+
+        family("agent_node_runs_total", "counter", "Node runs by outcome.",
+               [("", {"node": node, "status": status}, n) for (node, status), n in sorted(runs.items())])
+
+        samples = []
+        for node, counts in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", {"node": node, "le": "+Inf" if bound == float("inf") else f"{bound:g}"}, cumulative))
+            samples.append(("_count", {"node": node}, cumulative))
+            samples.append(("_sum", {"node": node}, latency_sum[node]))
+        family("agent_node_duration_seconds", "histogram", "Wall time per node run.", samples)
+
+        for metric, label, help_text in (
+            ("llm_prompt_tokens", "node", "Prompt tokens sent to the LLM."),
+            ("llm_completion_tokens", "node", "Completion tokens received from the LLM."),
+            ("llm_calls", "node", "LLM requests."),
+            ("llm_cost_usd", "node", "LLM spend in USD at LLM_PRICES."),
+            ("db_seconds", "node", "Time spent running SQL."),
+            ("db_rows", "node", "Rows returned by SQL queries."),
+            ("cache_hits", "cache", "Cache hits (sql, result, chart)."),
+            ("retries", "node", "SQL generation retries after a failed attempt."),
+        ):
+            family(f"agent_{metric}_total", "counter", help_text,
+                   [("", {label: key}, value) for (name, key), value in sorted(counters.items()) if name == metric])
+
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+telemetry = Telemetry()
+
+
+def _number(value):
+    # Counts stay exact integers; :g would print 1234567 as 1.23457e+06
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def record_db(elapsed_ms, rows):
+    """Adds SQL time and returned rows to the running node's span."""
+    span = _current_span.get()
+    if span is not None:
+        with span._lock:
+            span.db_ms += elapsed_ms
+            span.rows += rows
+
+
+def record_cache_hit(cache):
+    """Notes a cache hit ("sql", "result", "chart") on the running node's span."""
+    span = _current_span.get()
+    if span is not None:
+        with span._lock:
+            span.cache_hits.append(cache)
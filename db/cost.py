@@ -0,0 +1,113 @@
+import os
+import re
+
+from db.sqltext import tokenize, table_references
+
+# Estimated rows visited above which a query is refused before it runs
+DEFAULT_MAX_COST = float(os.getenv("QUERY_MAX_COST", "50000000"))
+# Wall-clock budget for running a query and streaming its rows, in seconds
+DEFAULT_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "10"))
+# Full scans of tables at least this big are reported in the plan flags
+FULL_SCAN_FLAG_ROWS = int(os.getenv("QUERY_FULL_SCAN_FLAG_ROWS", "10000"))
+
+# "SCAN t", "SEARCH t USING INDEX idx (ticker=?)", "SCAN transactions AS t"
+_LOOP_RE = re.compile(r"^(SCAN|SEARCH) (\S+)(?: AS \S+)?(.*)$")
+
+
+class QueryTooExpensive(Exception):
+    """
+    Raised instead of running (or instead of finishing) a query that would
+    cost too much. `reason` is "estimated_cost" or "timeout"; the message is
+    written for the LLM, which sees it on the retry.
+    """
+
+    def __init__(self, reason, detail, flags=(), estimated_rows=None, elapsed=None):
+        self.reason = reason
+        self.detail = detail
+        self.flags = list(flags)
+        self.estimated_rows = estimated_rows
+        self.elapsed = elapsed
+        super().__init__(self._message())
+
+    def _message(self):
+        text = f"QUERY TOO EXPENSIVE ({self.reason}): {self.detail}."
+        if self.flags:
+            text += " Plan issues: " + "; ".join(self.flags) + "."
+        return text + (
+            " Rewrite the query to be cheaper: join every table on a key, filter with WHERE, "
+            "aggregate in SQL instead of returning raw rows, and prefer the summary tables."
+        )
+
+    def as_dict(self):
+        return {
+            "reason": self.reason,
+            "detail": self.detail,
+            "flags": self.flags,
+            "estimated_rows": self.estimated_rows,
+            "elapsed": self.elapsed,
+        }
+
+
+class QueryCost:
+    """Rough row-visit estimate and plan flags for one query."""
+
+    def __init__(self, estimated_rows, flags, plan):
+        self.estimated_rows = estimated_rows
+        self.flags = flags
+        self.plan = plan
+
+
+def estimate_cost(conn, query, table_rows):
+    """
+    Estimates how many rows `query` visits from its EXPLAIN QUERY PLAN.
+
+    Loops under the same parent are nested joins, so their sizes multiply: a
+    SCAN costs the table's row count, an index SEARCH about 1 row per lookup
+    for a key and a tenth of the table otherwise. Correlated subqueries run once
+    per outer row; other subqueries once. `table_rows` maps table name to row
+    count. This only has to tell a filtered lookup from a cross join.
+    """
+    plan = conn.execute("EXPLAIN QUERY PLAN " + query.strip().rstrip(";")).fetchall()
+    refs = table_references(tokenize(query))
+    children = {}
+    for node_id, parent, _, detail in plan:
+        children.setdefault(parent, []).append((node_id, detail))
+
+    flags = []
+
+    def rows_of(name):
+        return table_rows.get(refs.get(name.lower(), name.lower()), 1)
+
+    def cost(parent):
+        loop = None
+        scans = []
+        extra = 0
+        for node_id, detail in children.get(parent, []):
+            match = _LOOP_RE.match(detail)
+            if match:
+                kind, name, rest = match.groups()
+                rows = rows_of(name)
+                table = refs.get(name.lower(), name.lower())
+                if "AUTOMATIC" in rest:
+                    # SQLite builds a throwaway index first, then probes it
+                    extra += rows
+                    n = 1
+                elif kind == "SEARCH":
+                    n = 1 if ("=?)" in rest and "AND" not in rest) or "PRIMARY KEY" in rest else max(1, rows // 10)
+                else:
+                    n = rows
+                    scans.append(table)
+                    flag = f"full scan of {table} (~{rows:,} rows)"
+                    if rows >= FULL_SCAN_FLAG_ROWS and flag not in flags:
+                        flags.append(flag)
+                loop = (loop or 1) * n
+            elif detail.startswith("CORRELATED"):
+                extra += (loop or 1) * cost(node_id)
+            else:
+                extra += cost(node_id)
+        if len(scans) > 1:
+            flags.append("cartesian product / unindexed join: " + " x ".join(scans))
+        return (loop or 0) + extra
+
+    estimated = cost(0)
+    return QueryCost(estimated, flags, [row[3] for row in plan])
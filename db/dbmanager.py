@@ -1,20 +1,38 @@
 import sqlite3
-import random
-from datetime import datetime, timedelta
 import os
+import time
 
 from rich.console import Console
 from rich.prompt import Confirm
 from rich.table import Table
 
+from db.cost import DEFAULT_MAX_COST, DEFAULT_TIMEOUT, QueryTooExpensive, estimate_cost
+from db.pool import ConnectionPool
+from db.result_cache import ResultCache
+from db.result_store import ResultStore
+from db.results import QueryResult
+from db.schema_cache import SchemaCache
+from db.summaries import install_summaries
+from db.sqltext import canonicalize
+
 console = Console()
 
 
 class DatabaseManager:
-    def __init__(self, db_path="investments.db"):
+    def __init__(self, db_path="investments.db", pool_size=None, pool_timeout=None):
         self.db_path = db_path
-
-    def check_db_health(self):
+        # Long-lived read-only connections shared by every reader in the process
+        self.pool = ConnectionPool(db_path, max_size=pool_size, timeout=pool_timeout)
+        # Schema text only changes with DDL, so it is read once per schema_version
+        self.schema_cache = SchemaCache(self)
+        # Results are only valid for the data version they were read at
+        self.result_cache = ResultCache()
+        # Out-of-band results referenced by handle from the agent state
+        self.results = ResultStore()
+        # (data_version, {table: approx rows}) for the cost estimate
+        self._table_rows = (None, {})
+
+    def check_db_health(self, seed_rows=None):
         """Checks DB status and asks for recreation if it exists."""
         if os.path.exists(self.db_path):
             console.print(f"[bold green]📂 Database found at:[/bold green] {self.db_path}")
@@ -24,14 +42,18 @@ class DatabaseManager:
 
             if recreate:
                 console.print("[bold red]🗑️ Deleting existing database...[/bold red]")
+                self.pool.close()
+                self.schema_cache.invalidate()
+                self.result_cache.clear()
                 os.remove(self.db_path)
-                self.initialize_db()
+                self.initialize_db(seed_rows)
                 self.display_stats()
             else:
+                self.ensure_summaries()
                 self.display_stats()
         else:
             console.print("[yellow]⚠️ Database not found. Initializing fresh...[/yellow]")
-            self.initialize_db()
+            self.initialize_db(seed_rows)
             self.display_stats()
 
     def display_stats(self):
@@ -40,7 +62,7 @@ class DatabaseManager:
         stats_table.add_column("Table Name", style="cyan")
         stats_table.add_column("Row Count", style="magenta")
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
             tables = [row[0] for row in cursor.fetchall()]
@@ -52,7 +74,10 @@ class DatabaseManager:
 
         console.print(stats_table)
 
-    def initialize_db(self):
+    def initialize_db(self, n_transactions=None):
+        n_rows = n_transactions if n_transactions is not None else int(os.getenv("SEED_TRANSACTIONS", "50"))
+        if n_rows < 0:
+            raise ValueError(f"Cannot seed a negative number of transactions ({n_rows})")
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.executescript('''
@@ -180,7 +205,6 @@ class DatabaseManager:
 
         # Extract ticker -> sector mapping from raw_instruments
         ticker_to_sector = {t: sector for (t, name, sector, asset_class) in raw_instruments}
-        tickers = list(ticker_to_sector.keys())
 
         # Sector-based price ranges (min, max)
         sector_price_ranges = {
@@ -192,89 +216,163 @@ class DatabaseManager:
             'Space': (5, 80),
         }
 
-        def random_date(start_date: str, end_date: str) -> str:
-            """
-            Returns a random date string between start_date and end_date (inclusive).
-            Format: YYYY-MM-DD
-            """
-            start = datetime.strptime(start_date, "%Y-%m-%d")
-            end = datetime.strptime(end_date, "%Y-%m-%d")
-            delta_days = (end - start).days
-            return (start + timedelta(days=random.randint(0, delta_days))).strftime("%Y-%m-%d")
-
-        # Seed 50 random transactions
-        for _ in range(50):
-            t = random.choice(tickers)
-            sector = ticker_to_sector.get(t, 'Technology')
-
-            # Pick realistic price range for the sector
-            low, high = sector_price_ranges.get(sector, (50, 500))
-            way = random.choices(['BUY', 'SELL'], weights=[70, 30])[0]
-            qty = random.randint(1, 50)
-            price = round(random.uniform(low, high), 2)
-            to_be_added_to_holding = random.randint(1, 50)
-            cursor.execute(
-                "INSERT INTO transactions (ticker, side, qty, price, date, asset_class) VALUES (?,?,?,?,?,?)",
-                (
-                    t,
-                    way,
-                    qty,
-                    price,
-                    random_date("2024-01-01", "2024-12-31"),
-                    'Equity'
-                )
-            )
-            # ignore this if, remove and re-indent.
-            if 0 == 0:
-                cursor.execute("SELECT qty, avg_cost FROM holdings WHERE ticker = ?", (t,))
-                row = cursor.fetchone()
-
-                current_qty = row[0] if row else 0.0
-                current_avg = row[1] if row else 0.0
-
-                if way == "BUY":
-                    new_qty = current_qty + qty
-                    # Weighted average cost
-                    new_avg = ((current_qty * current_avg) + (qty * price)) / new_qty
-                    cursor.execute(
-                        "INSERT INTO holdings (ticker, qty, avg_cost) VALUES (?,?,?) "
-                        "ON CONFLICT(ticker) DO UPDATE SET qty = excluded.qty, avg_cost = excluded.avg_cost",
-                        (t, new_qty, round(new_avg, 2))
-                    )
-
-                else:  # SELL
-                    new_qty = current_qty - qty
-
-                    if new_qty <= 0:
-                        # Position closed (or oversold) -> reset holding
-                        cursor.execute(
-                            "INSERT INTO holdings (ticker, qty, avg_cost) VALUES (?,?,?) "
-                            "ON CONFLICT(ticker) DO UPDATE SET qty = excluded.qty, avg_cost = excluded.avg_cost",
-                            (t, 0.0, 0.0)
-                        )
-                    else:
-                        # Avg cost unchanged on sell
-                        cursor.execute(
-                            "UPDATE holdings SET qty = ? WHERE ticker = ?",
-                            (new_qty, t)
-                        )
-        conn.commit()
+        # Seed random transactions in bulk: NumPy batches, one transaction,
+        # holdings folded in memory and written once
+        # NumPy is only needed here, not on every start
+        from db.seed import seed_transactions
+        rows_per_sec = seed_transactions(conn, ticker_to_sector, sector_price_ranges, n_rows)
+        console.print(f"[dim]🌱 Seeded {n_rows:,} transactions ({rows_per_sec:,.0f} rows/sec)[/dim]")
+        # Triggers are installed after the bulk load, which is backfilled in one pass
+        elapsed = install_summaries(conn)
+        if elapsed is not None:
+            console.print(f"[dim]📐 Built summary tables in {elapsed:.2f}s[/dim]")
+        conn.close()
+        # Readers may hold pages of the old file; start them fresh
+        self.pool.close()
+        self.schema_cache.invalidate()
+        self.result_cache.clear()
+
+    def ensure_summaries(self):
+        """Installs (and backfills) the trigger-maintained summary tables on databases created before them."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            elapsed = install_summaries(conn)
+        finally:
+            conn.close()
+        if elapsed is not None:
+            console.print(f"[dim]📐 Built summary tables in {elapsed:.2f}s[/dim]")
 
     def get_schema(self):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT sql FROM sqlite_master WHERE type='table';")
-            return "\n".join([row[0] for row in cursor.fetchall()])
+        return self.schema_cache.snapshot().text
 
-    def execute_query(self, query):
-        with sqlite3.connect(self.db_path) as conn:
-            # This line is the secret sauce:
-            # It allows us to access rows like dictionaries (by column name)
-            conn.row_factory = sqlite3.Row
+    def schema_snapshot(self):
+        """Cached schema plus anything rendered from it; see SchemaSnapshot.render."""
+        return self.schema_cache.snapshot()
 
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
+    def _read_schema(self, conn):
+        cursor = conn.cursor()
+        # Internal bookkeeping tables (prefixed with "_") are not for the LLM
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name NOT LIKE '\\_%' ESCAPE '\\';")
+        return "\n".join([row[0] for row in cursor.fetchall()])
+
+    def data_version(self):
+        """
+        Cheap token that changes whenever a write is committed to the database.
+
+        Read with PRAGMA data_version through the pool (see
+        ConnectionPool.data_version). The file change counter in the header
+        is not reliable in WAL mode, and after a checkpoint truncates the WAL
+        the file can look exactly as it did before the write.
+        """
+        return self.pool.data_version()
+
+    def execute_query(self, query):
+        """Unbounded convenience wrapper returning every row as a dict."""
+        inf = float("inf")
+        return self.execute_query_stream(query, max_rows=inf, max_bytes=inf, row_cap=inf).records()
+
+    def execute_query_stream(self, query, max_rows=None, max_bytes=None, timeout=None, max_cost=None, row_cap=None,
+                             canonical=None):
+        """
+        Runs a query with fetchmany and returns a bounded QueryResult.
+
+        Only the first `max_rows` rows / `max_bytes` are kept; the rest are
+        streamed past to count them and to fold them into column stats, up to
+        `row_cap` rows. Raises QueryTooExpensive when the plan is estimated to
+        visit more than `max_cost` rows, or when running and streaming take
+        longer than `timeout` seconds. `canonical` skips re-canonicalizing a
+        query the guardrail already normalized. A result served from the
+        result cache has `from_cache` set.
+        """
+        timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        max_cost = DEFAULT_MAX_COST if max_cost is None else max_cost
+        version = self.data_version()
+        result_key = (canonical or canonicalize(query), version, max_rows, max_bytes)
+        cached = self.result_cache.get(result_key)
+
+        with self.pool.connection() as conn:
+            if cached is not None:
+                # A copy per call, so `from_cache` tells this caller (and only
+                # this one) that the query did not run
+                if query == cached.query:
+                    return cached.result.with_columns(cached.result.columns, from_cache=True)
+                columns = self._column_names(conn, query, cached.result.columns)
+                return cached.result.with_columns(columns, from_cache=True)
+
+            cost = estimate_cost(conn, query, self.table_rows(conn, version))
+            if cost.estimated_rows > max_cost:
+                raise QueryTooExpensive(
+                    "estimated_cost",
+                    f"the plan visits about {cost.estimated_rows:,.0f} rows (budget {max_cost:,.0f})",
+                    cost.flags,
+                    estimated_rows=cost.estimated_rows,
+                )
 
-            # Convert the sqlite3.Row objects into standard Python dicts
-            return [dict(row) for row in rows]
+            # The progress handler runs every few thousand VM steps, both while
+            # the statement starts and while fetchmany pulls rows; returning
+            # True interrupts the statement
+            started = time.perf_counter()
+            deadline = started + timeout
+            conn.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                result = QueryResult.from_cursor(cursor, max_rows=max_rows, max_bytes=max_bytes, row_cap=row_cap)
+            except sqlite3.OperationalError as e:
+                if "interrupted" not in str(e):
+                    raise
+                raise QueryTooExpensive(
+                    "timeout",
+                    f"the query was stopped after {timeout:g}s",
+                    cost.flags,
+                    estimated_rows=cost.estimated_rows,
+                    elapsed=time.perf_counter() - started,
+                ) from None
+            finally:
+                conn.set_progress_handler(None, 0)
+
+        self.result_cache.put(result_key, query, result)
+        return result
+
+    def estimate_cost(self, query):
+        """EXPLAIN QUERY PLAN dry run: compiles `query` (bad SQL raises sqlite3.Error) and estimates its cost."""
+        with self.pool.connection() as conn:
+            return estimate_cost(conn, query, self.table_rows(conn))
+
+    def table_rows(self, conn, version=None):
+        """Approximate row count per table (MAX(rowid), no scan), cached per data version."""
+        version = version or self.data_version()
+        cached_version, rows = self._table_rows
+        if cached_version == version:
+            return rows
+        rows = {}
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()
+        for (name,) in tables:
+            try:
+                rows[name.lower()] = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{name}"').fetchone()[0]
+            except sqlite3.Error:
+                # WITHOUT ROWID tables have no rowid; count them instead
+                rows[name.lower()] = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+        self._table_rows = (version, rows)
+        return rows
+
+    def _column_names(self, conn, query, fallback):
+        # Unaliased expressions are named after their source text, so a
+        # differently spelled hit may need its own names. LIMIT 0 only prepares.
+        try:
+            cursor = conn.execute(f"SELECT * FROM ({query.strip().rstrip(';')}) LIMIT 0")
+            return [d[0] for d in cursor.description]
+        except sqlite3.Error:
+            return fallback
+
+    def pool_stats(self):
+        """Hit/miss/wait counters of the read connection pool."""
+        return self.pool.stats()
+
+    def schema_cache_stats(self):
+        """Hit/version-check/schema-read counters of the schema cache."""
+        return self.schema_cache.stats()
+
+    def result_cache_stats(self):
+        """Hit/miss/eviction counters and byte usage of the query-result cache."""
+        return self.result_cache.stats()
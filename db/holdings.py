@@ -0,0 +1,76 @@
+class HoldingsAccumulator:
+    """
+    Folds a stream of transactions into per-ticker positions in memory, with
+    the same rules the per-row seeding loop used:
+
+    - BUY: weighted average cost, rounded to cents after every buy
+    - SELL: quantity goes down, average cost is unchanged
+    - a SELL that closes (or oversells) the position resets it to (0, 0), and
+      so does a zero-quantity BUY on a flat position
+
+    Start it from the current `holdings` rows for an incremental update, feed
+    it batches in transaction order, then `write()` the touched tickers with
+    one executemany instead of a read-modify-write per transaction.
+    """
+
+    def __init__(self, initial=None):
+        # ticker -> [qty, avg_cost]
+        self.positions = {t: [q, a] for t, (q, a) in (initial or {}).items()}
+        self.touched = set()
+
+    @classmethod
+    def from_db(cls, cursor, tickers=None):
+        if tickers is None:
+            cursor.execute("SELECT ticker, qty, avg_cost FROM holdings")
+            rows = cursor.fetchall()
+        else:
+            tickers = list(tickers)
+            rows = []
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(tickers), 500):
+                chunk = tickers[i:i + 500]
+                cursor.execute(
+                    f"SELECT ticker, qty, avg_cost FROM holdings WHERE ticker IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                rows.extend(cursor.fetchall())
+        return cls({t: (q, a) for t, q, a in rows})
+
+    def apply(self, tickers, sides, qtys, prices):
+        """Applies parallel sequences of transactions, in order."""
+        positions = self.positions
+        touched = self.touched
+        for t, side, qty, price in zip(tickers, sides, qtys, prices):
+            position = positions.get(t)
+            if position is None:
+                position = positions[t] = [0.0, 0.0]
+            touched.add(t)
+
+            current_qty, current_avg = position
+            if side == "BUY":
+                new_qty = current_qty + qty
+                if new_qty <= 0:
+                    # Zero-quantity buy on a flat position: nothing to average
+                    position[0] = 0.0
+                    position[1] = 0.0
+                    continue
+                # Weighted average cost
+                position[0] = new_qty
+                position[1] = round(((current_qty * current_avg) + (qty * price)) / new_qty, 2)
+            else:  # SELL
+                new_qty = current_qty - qty
+                if new_qty <= 0:
+                    # Position closed (or oversold) -> reset holding
+                    position[0] = 0.0
+                    position[1] = 0.0
+                else:
+                    position[0] = new_qty
+
+    def write(self, cursor):
+        """Upserts every ticker touched since the accumulator was created."""
+        cursor.executemany(
+            "INSERT INTO holdings (ticker, qty, avg_cost) VALUES (?,?,?) "
+            "ON CONFLICT(ticker) DO UPDATE SET qty = excluded.qty, avg_cost = excluded.avg_cost",
+            [(t, float(self.positions[t][0]), float(self.positions[t][1])) for t in self.touched]
+        )
+        return len(self.touched)
@@ -0,0 +1,272 @@
+import csv
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from rich.console import Console
+
+from db.holdings import HoldingsAccumulator
+from db.summaries import install_summaries
+
+console = Console()
+
+# Broker exports name the same field many ways; first match wins. "amount"
+# is deliberately not a qty alias: most exports use it for the cash value
+# (pass columns={"qty": "Amount"} / --column qty=Amount when it is a share count)
+COLUMN_ALIASES = {
+    "ticker": ("ticker", "symbol", "instrument", "security"),
+    "side": ("side", "action", "buy_sell", "direction", "type"),
+    "qty": ("qty", "quantity", "shares", "units"),
+    "price": ("price", "trade_price", "exec_price", "fill_price"),
+    "date": ("date", "trade_date", "executed_at", "timestamp", "time"),
+    "asset_class": ("asset_class", "asset_type", "class"),
+    "name": ("name", "description", "security_name"),
+    "sector": ("sector", "industry"),
+}
+
+SIDE_ALIASES = {
+    "BUY": "BUY", "B": "BUY", "BOT": "BUY", "BOUGHT": "BUY", "BUY TO OPEN": "BUY",
+    "SELL": "SELL", "S": "SELL", "SLD": "SELL", "SOLD": "SELL", "SELL TO CLOSE": "SELL",
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%d-%b-%Y", "%d %b %Y", "%Y%m%d")
+
+CHECKPOINT_DDL = '''
+    CREATE TABLE IF NOT EXISTS _import_checkpoints (
+        source_key TEXT PRIMARY KEY,
+        path TEXT,
+        rows_done INTEGER,
+        rows_rejected INTEGER,
+        updated_at TEXT
+    )
+'''
+
+
+class RowRejected(ValueError):
+    pass
+
+
+def normalize_side(value):
+    side = SIDE_ALIASES.get(str(value).strip().upper())
+    if side is None:
+        raise RowRejected(f"unknown side {value!r}")
+    return side
+
+
+def normalize_date(value):
+    if hasattr(value, "strftime"):  # datetime/date/Timestamp from Parquet
+        return value.strftime("%Y-%m-%d")
+    return _parse_date_text(str(value).strip())
+
+
+@lru_cache(maxsize=65536)
+def _parse_date_text(text):
+    # Ledgers repeat the same few thousand dates, so parsing is memoized
+    # ISO timestamps: keep the date part
+    if len(text) > 10 and text[4] == "-" and text[10] in "T ":
+        text = text[:10]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise RowRejected(f"unparseable date {text!r}")
+
+
+def normalize_ticker(value):
+    ticker = str(value or "").strip().upper()
+    if not ticker or len(ticker) > 12:
+        raise RowRejected(f"bad ticker {value!r}")
+    return ticker
+
+
+def _number(value, field):
+    try:
+        number = float(str(value).replace(",", "").strip())
+    except ValueError:
+        raise RowRejected(f"bad {field} {value!r}")
+    if number < 0 or number != number:
+        raise RowRejected(f"bad {field} {value!r}")
+    return number
+
+
+def _quantity(value):
+    # A zero-share trade has no price to average in; it is a bad row, not a trade
+    qty = _number(value, "qty")
+    if qty == 0:
+        raise RowRejected(f"bad qty {value!r}")
+    return qty
+
+
+def _column_key(name):
+    # "Trade Date", "trade-date" and "trade_date" are the same column
+    return name.strip().lower().replace(" ", "_").replace("-", "_")
+
+
+class TradeImporter:
+    """
+    Streams a broker export (CSV or Parquet) into `transactions`/`instruments`
+    and keeps `holdings` up to date, one bounded chunk at a time.
+
+    Each chunk is one transaction that also advances a checkpoint row in
+    `_import_checkpoints`, so an interrupted import resumes exactly after
+    the last committed chunk. A file is identified by path, size and mtime;
+    a modified file starts over. `columns` maps fields to file columns
+    explicitly ({"qty": "Amount"}) and takes precedence over COLUMN_ALIASES.
+    """
+
+    def __init__(self, db_path="investments.db", chunk_size=None, columns=None):
+        self.db_path = db_path
+        self.chunk_size = chunk_size or int(os.getenv("IMPORT_CHUNK_SIZE", "50000"))
+        self.columns = columns or {}
+
+    def _source_key(self, path):
+        st = os.stat(path)
+        raw = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+    def _iter_records(self, path, fmt):
+        if fmt == "parquet":
+            # Optional dependency, only needed for Parquet files
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=self.chunk_size):
+                yield from batch.to_pylist()
+        else:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                yield from csv.DictReader(f)
+
+    def _resolve_columns(self, record):
+        lowered = {_column_key(k): k for k in record if k}
+        mapping = {}
+        for field, column in self.columns.items():
+            if field not in COLUMN_ALIASES:
+                raise ValueError(f"Unknown import field {field!r} (expected one of: {', '.join(COLUMN_ALIASES)})")
+            if _column_key(column) not in lowered:
+                raise ValueError(f"Import file has no column {column!r} for {field}")
+            mapping[field] = lowered[_column_key(column)]
+        for field, aliases in COLUMN_ALIASES.items():
+            if field in mapping:
+                continue
+            for alias in aliases:
+                if alias in lowered:
+                    mapping[field] = lowered[alias]
+                    break
+        missing = [f for f in ("ticker", "side", "qty", "price", "date") if f not in mapping]
+        if missing:
+            raise ValueError(f"Import file is missing required columns: {', '.join(missing)}")
+        return mapping
+
+    def _normalize(self, record, cols):
+        asset_class = record.get(cols["asset_class"]) if "asset_class" in cols else None
+        return (
+            normalize_ticker(record[cols["ticker"]]),
+            normalize_side(record[cols["side"]]),
+            _quantity(record[cols["qty"]]),
+            _number(record[cols["price"]], "price"),
+            normalize_date(record[cols["date"]]),
+            str(asset_class).strip() if asset_class else "Equity",
+            record.get(cols["name"]) if "name" in cols else None,
+            record.get(cols["sector"]) if "sector" in cols else None,
+        )
+
+    def _write_chunk(self, conn, key, path, rows, rows_done, rows_rejected):
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        cursor.executemany(
+            "INSERT OR IGNORE INTO instruments (ticker, name, sector, asset_class) VALUES (?,?,?,?)",
+            {r[0]: (r[0], r[6], r[7], r[5]) for r in rows}.values()
+        )
+        cursor.executemany(
+            "INSERT INTO transactions (ticker, side, qty, price, date, asset_class) VALUES (?,?,?,?,?,?)",
+            (r[:6] for r in rows)
+        )
+        # Incremental holdings: load only the tickers this chunk touches
+        tickers = [r[0] for r in rows]
+        holdings = HoldingsAccumulator.from_db(cursor, set(tickers))
+        holdings.apply(tickers, [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows])
+        holdings.write(cursor)
+        cursor.execute(
+            "INSERT INTO _import_checkpoints (source_key, path, rows_done, rows_rejected, updated_at) "
+            "VALUES (?,?,?,?,datetime('now')) "
+            "ON CONFLICT(source_key) DO UPDATE SET rows_done = excluded.rows_done, "
+            "rows_rejected = excluded.rows_rejected, updated_at = excluded.updated_at",
+            (key, os.path.abspath(path), rows_done, rows_rejected)
+        )
+        conn.commit()
+
+    def import_file(self, path, fmt=None):
+        """Imports `path`, resuming from its checkpoint. Returns throughput stats."""
+        fmt = fmt or ("parquet" if path.lower().endswith((".parquet", ".pq")) else "csv")
+        key = self._source_key(path)
+
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(CHECKPOINT_DDL)
+        # Summary tables follow the import through their triggers
+        install_summaries(conn)
+        row = conn.execute(
+            "SELECT rows_done, rows_rejected FROM _import_checkpoints WHERE source_key = ?", (key,)
+        ).fetchone()
+        skip, rejected = row if row else (0, 0)
+        if skip:
+            console.print(f"[yellow]↩️  Resuming import of {path} after {skip:,} rows[/yellow]")
+
+        started = time.perf_counter()
+        seen = imported = 0
+        cols = None
+        chunk = []
+        errors_shown = 0
+        try:
+            for record in self._iter_records(path, fmt):
+                seen += 1
+                if seen <= skip:
+                    continue
+                if cols is None:
+                    cols = self._resolve_columns(record)
+                try:
+                    chunk.append(self._normalize(record, cols))
+                except (RowRejected, KeyError, TypeError) as e:
+                    rejected += 1
+                    if errors_shown < 10:
+                        console.print(f"[dim red]Row {seen:,} rejected: {e}[/dim red]")
+                        errors_shown += 1
+
+                if len(chunk) >= self.chunk_size:
+                    self._write_chunk(conn, key, path, chunk, seen, rejected)
+                    imported += len(chunk)
+                    chunk = []
+                    rate = imported / (time.perf_counter() - started)
+                    console.print(f"[dim]📥 {seen:,} rows read, {imported:,} imported ({rate:,.0f} rows/sec)[/dim]")
+
+            if chunk or seen > skip:
+                self._write_chunk(conn, key, path, chunk, seen, rejected)
+                imported += len(chunk)
+        finally:
+            conn.close()
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "rows_read": max(seen - skip, 0),
+            "rows_imported": imported,
+            "rows_rejected": rejected,
+            "resumed_from": skip,
+            "seconds": round(elapsed, 2),
+            "rows_per_sec": round(imported / elapsed) if elapsed > 0 else 0,
+        }
+        console.print(
+            f"[bold green]✅ Imported {imported:,} transactions from {path}[/bold green] "
+            f"[dim]({stats['rows_per_sec']:,} rows/sec, {rejected:,} rejected)[/dim]"
+        )
+        return stats
+
+
+if __name__ == "__main__":
+    # python -m db.importer trades.csv [investments.db]
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m db.importer FILE [DB]")
+    TradeImporter(*sys.argv[2:3]).import_file(sys.argv[1])
@@ -0,0 +1,322 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+
+from rich.console import Console
+from rich.table import Table
+
+from db.sqltext import WORD, OP, tokenize, canonicalize, table_references
+
+console = Console()
+
+# "SCAN t" / "SCAN transactions" - a full pass over a table with no usable index
+# ("SCAN x USING [COVERING] INDEX" walks an index and is not what we are after)
+_SCAN_RE = re.compile(r"^SCAN (\w+)(?: AS (\w+))?$")
+
+_EQUALITY_OPS = {"=", "==", "in", "is"}
+_RANGE_OPS = {"<", ">", "<=", ">=", "between"}
+
+
+class QueryLog:
+    """
+    Persistent log of the SQL that made it through guardrail and human review,
+    aggregated by canonical text: how often each query ran and how long the
+    database took. This is the workload the IndexAdvisor tunes for.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("QUERY_LOG_DB", "query_log.db")
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS query_log (
+                    canonical TEXT PRIMARY KEY,
+                    sql TEXT,
+                    runs INTEGER,
+                    total_ms REAL,
+                    last_seen REAL
+                )
+            ''')
+            self._conn.commit()
+        return self._conn
+
+    def record(self, sql, elapsed_ms, canonical=None):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO query_log (canonical, sql, runs, total_ms, last_seen) VALUES (?,?,1,?,?) "
+                "ON CONFLICT(canonical) DO UPDATE SET sql = excluded.sql, runs = runs + 1, "
+                "total_ms = total_ms + excluded.total_ms, last_seen = excluded.last_seen",
+                (canonical or canonicalize(sql), sql, elapsed_ms, time.time())
+            )
+            conn.commit()
+
+    def workload(self, limit=200):
+        """Most frequently run queries first, as (sql, runs, total_ms)."""
+        with self._lock:
+            return self._connection().execute(
+                "SELECT sql, runs, total_ms FROM query_log ORDER BY runs DESC, total_ms DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+
+def predicate_columns(tokens):
+    """
+    Column references used in WHERE/ON/HAVING comparisons and in ORDER BY /
+    GROUP BY, as (qualifier or None, column, role) with role "eq", "range" or
+    "order".
+    """
+    found = []
+    clause = None
+    n = len(tokens)
+    for i, (kind, text) in enumerate(tokens):
+        word = text.lower() if kind == WORD else None
+        if word in ("where", "on", "having"):
+            clause = "filter"
+            continue
+        if word in ("order", "group"):
+            clause = "order"
+            continue
+        if word in ("limit", "select", "union", "from", "join"):
+            clause = None
+            continue
+        if kind != WORD or clause is None:
+            continue
+        # Skip the qualifier half of "t.col"; the column half picks it up
+        if i + 1 < n and tokens[i + 1][1] == ".":
+            continue
+        qualifier = tokens[i - 2][1].lower() if i >= 2 and tokens[i - 1][1] == "." else None
+        start = i - 2 if qualifier else i
+
+        if clause == "order":
+            if word not in ("by", "asc", "desc", "nulls", "first", "last", "collate"):
+                found.append((qualifier, word, "order"))
+            continue
+
+        after = tokens[i + 1] if i + 1 < n else (None, None)
+        before = tokens[start - 1] if start >= 1 else (None, None)
+        for neighbour_kind, neighbour in (after, before):
+            op = neighbour.lower() if neighbour and neighbour_kind in (OP, WORD) else None
+            if op in _EQUALITY_OPS:
+                found.append((qualifier, word, "eq"))
+                break
+            if op in _RANGE_OPS:
+                found.append((qualifier, word, "range"))
+                break
+    return found
+
+
+class IndexAdvisor:
+    """
+    Proposes secondary indexes from the logged query workload.
+
+    Every logged query goes through EXPLAIN QUERY PLAN; each table it fully
+    scans gets a candidate index made of the columns the query filters on
+    (equality columns first, then one range column) or, failing that, sorts
+    by. Candidates are weighted by how often their queries ran, and ones
+    already covered by an existing index prefix are dropped.
+
+    `run()` measures the affected queries before and after creating the
+    proposed indexes inside a transaction, then rolls it back, unless
+    `apply=True` in which case the indexes are kept.
+    """
+
+    def __init__(self, db_manager, query_log=None, max_columns=3, repeat=3):
+        self.db = db_manager
+        self.query_log = query_log or QueryLog()
+        self.max_columns = max_columns
+        self.repeat = repeat
+        self._columns = {}
+        self._indexes = {}
+
+    def _table_columns(self, conn, table):
+        if table not in self._columns:
+            self._columns[table] = [row[1].lower() for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        return self._columns[table]
+
+    def _index_prefixes(self, conn, table):
+        if table not in self._indexes:
+            prefixes = []
+            for index in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+                cols = [row[2].lower() for row in conn.execute(f'PRAGMA index_info("{index[1]}")') if row[2]]
+                prefixes.append(tuple(cols))
+            self._indexes[table] = prefixes
+        return self._indexes[table]
+
+    @staticmethod
+    def plan(conn, sql):
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql.strip().rstrip(";"))]
+
+    def candidates(self, conn, sql):
+        """Full scans in the query's plan and the index that would avoid each: [(table, columns)]."""
+        tokens = tokenize(sql)
+        refs = table_references(tokens)
+        scanned = {}
+        for detail in self.plan(conn, sql):
+            match = _SCAN_RE.match(detail)
+            if match:
+                name = (match.group(2) or match.group(1)).lower()
+                scanned[name] = refs.get(name, match.group(1).lower())
+
+        wanted = {table: {"eq": [], "range": [], "order": []} for table in set(scanned.values())}
+        for qualifier, column, role in predicate_columns(tokens):
+            if qualifier:
+                table = refs.get(qualifier)
+                tables = [table] if table in wanted else []
+            else:
+                tables = [t for t in wanted if column in self._table_columns(conn, t)]
+            # An unqualified column that several scanned tables have is ambiguous; skip it
+            if len(tables) == 1 and column in self._table_columns(conn, tables[0]):
+                roles = wanted[tables[0]][role]
+                if column not in roles:
+                    roles.append(column)
+
+        proposals = []
+        for table, roles in wanted.items():
+            columns = list(roles["eq"])
+            columns += [c for c in roles["range"] if c not in columns][:1]
+            if not columns:
+                columns = list(roles["order"])
+            columns = tuple(columns[:self.max_columns])
+            if not columns:
+                continue
+            if any(prefix[:len(columns)] == columns for prefix in self._index_prefixes(conn, table)):
+                continue
+            proposals.append((table, columns))
+        return proposals, sorted(set(scanned.values()))
+
+    def analyze(self, conn, workload):
+        """Aggregates scans and index candidates over (sql, runs, total_ms) rows."""
+        scans = Counter()
+        proposals = Counter()
+        affected = {}
+        for sql, runs, _ in workload:
+            try:
+                candidates, scanned = self.candidates(conn, sql)
+            except sqlite3.Error:
+                # Logged against an older schema; nothing to tune for
+                continue
+            for table in scanned:
+                scans[table] += runs
+            for candidate in candidates:
+                proposals[candidate] += runs
+                affected.setdefault(candidate, []).append(sql)
+
+        # (ticker) is served by (ticker, date): fold prefixes into the longer index
+        for table, columns in sorted(proposals, key=lambda c: len(c[1])):
+            wider = next((
+                c for c in proposals
+                if c[0] == table and len(c[1]) > len(columns) and c[1][:len(columns)] == columns
+            ), None)
+            if wider:
+                proposals[wider] += proposals.pop((table, columns))
+                affected[wider] += affected.pop((table, columns))
+        return scans, proposals, affected
+
+    def _time_query(self, conn, sql):
+        best = float("inf")
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            conn.execute(sql).fetchall()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    def run(self, apply=False, top=5, max_queries=20):
+        """
+        Proposes up to `top` indexes and measures their effect. Returns a report
+        with the scan counts, each proposal's DDL, and per query the plan and
+        best-of-`repeat` latency before and after.
+        """
+        workload = self.query_log.workload()
+        conn = sqlite3.connect(self.db.db_path, isolation_level=None)
+        try:
+            scans, proposals, affected = self.analyze(conn, workload)
+            chosen = [candidate for candidate, _ in proposals.most_common(top)]
+            ddl = [
+                f'CREATE INDEX IF NOT EXISTS "idx_{table}_{"_".join(columns)}" ON "{table}" ({", ".join(columns)})'
+                for table, columns in chosen
+            ]
+
+            queries = []
+            for candidate in chosen:
+                queries += [q for q in affected[candidate] if q not in queries]
+            queries = queries[:max_queries]
+
+            measurements = [
+                {"sql": sql, "plan_before": self.plan(conn, sql), "ms_before": self._time_query(conn, sql)}
+                for sql in queries
+            ]
+
+            if ddl:
+                conn.execute("BEGIN")
+                for statement in ddl:
+                    conn.execute(statement)
+                conn.execute("ANALYZE")
+                for m in measurements:
+                    m["plan_after"] = self.plan(conn, m["sql"])
+                    m["ms_after"] = self._time_query(conn, m["sql"])
+                conn.execute("COMMIT" if apply else "ROLLBACK")
+        finally:
+            conn.close()
+
+        return {
+            "queries_analyzed": len(workload),
+            "scans": dict(scans.most_common()),
+            "proposals": [
+                {"table": table, "columns": list(columns), "weight": proposals[(table, columns)], "ddl": statement}
+                for (table, columns), statement in zip(chosen, ddl)
+            ],
+            "measurements": measurements,
+            "applied": bool(apply and ddl),
+        }
+
+
+def print_report(report):
+    console.print(f"[bold]🔎 Analyzed {report['queries_analyzed']} logged queries[/bold]")
+
+    scans = Table(title="Full table scans (weighted by runs)")
+    scans.add_column("Table", style="cyan")
+    scans.add_column("Scans", style="magenta")
+    for table, count in report["scans"].items():
+        scans.add_row(table, str(count))
+    console.print(scans)
+
+    if not report["proposals"]:
+        console.print("[green]No index would remove a full scan from the logged workload.[/green]")
+        return
+
+    for proposal in report["proposals"]:
+        console.print(f"[yellow]{proposal['ddl']};[/yellow] [dim](weight {proposal['weight']})[/dim]")
+
+    latency = Table(title="Plan and latency before/after")
+    latency.add_column("Query", style="cyan", max_width=60)
+    latency.add_column("Plan before")
+    latency.add_column("Plan after")
+    latency.add_column("ms before", style="magenta")
+    latency.add_column("ms after", style="green")
+    for m in report["measurements"]:
+        latency.add_row(
+            m["sql"], "\n".join(m["plan_before"]), "\n".join(m.get("plan_after", [])),
+            f"{m['ms_before']:.2f}", f"{m['ms_after']:.2f}" if "ms_after" in m else "-",
+        )
+    console.print(latency)
+
+    if report["applied"]:
+        console.print("[bold green]✅ Indexes created.[/bold green]")
+    else:
+        console.print("[dim]Dry run: indexes were created in a transaction for measurement and rolled back. "
+                      "Re-run with --apply-indexes to keep them.[/dim]")
+
+
+if __name__ == "__main__":
+    # python -m db.index_advisor [--apply]
+    from db.dbmanager import DatabaseManager
+    print_report(IndexAdvisor(DatabaseManager()).run(apply="--apply" in sys.argv))
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection frees up within the configured timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived, read-only SQLite connections.
+
+    Connections are opened lazily with `mode=ro` through a URI, and the
+    pragmas (mmap_size, cache_size) are applied exactly once per connection.
+    A thread that already holds a connection gets the same one back on nested
+    calls, so a single request never needs more than one slot.
+    """
+
+    def __init__(self, db_path, max_size=None, timeout=None, mmap_size=None, cache_size=None):
+        self.db_path = db_path
+        self.max_size = max_size or int(os.getenv("DB_POOL_SIZE", "8"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("DB_POOL_TIMEOUT", "5"))
+        # 256 MB of memory-mapped I/O and a 64 MB page cache (negative = KiB)
+        self.mmap_size = mmap_size if mmap_size is not None else int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+        self.cache_size = cache_size if cache_size is not None else int(os.getenv("DB_CACHE_SIZE", "-65536"))
+
+        self._idle = []
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._wal_checked = False
+        self._generation = 0
+        # PRAGMA data_version last seen per connection, and the pool-wide version
+        self._seen_versions = {}
+        self._data_version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    def _ensure_wal(self):
+        # journal_mode is persistent in the file, but a read-only connection
+        # cannot change it, so we flip it once through a short-lived writer.
+        # mode=rw: a missing database is an error here, not a new empty file.
+        with self._cond:
+            if self._wal_checked:
+                return
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=rw"
+            with closing(sqlite3.connect(uri, uri=True)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+            self._wal_checked = True
+
+    def _open(self):
+        self._ensure_wal()
+        uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _checkout(self):
+        with self._cond:
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            if self._opened >= self.max_size:
+                self.waits += 1
+                available = self._cond.wait_for(
+                    lambda: self._idle or self._opened < self.max_size, timeout=self.timeout
+                )
+                if not available:
+                    raise PoolTimeoutError(
+                        f"No SQLite connection available after {self.timeout}s (pool size {self.max_size})"
+                    )
+                if self._idle:
+                    self.hits += 1
+                    return self._idle.pop()
+            # Reserve the slot now, open outside the lock
+            self._opened += 1
+            self.misses += 1
+
+        try:
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, conn, generation):
+        with self._cond:
+            if generation != self._generation:
+                # The pool was reset while this connection was busy
+                self._seen_versions.pop(conn, None)
+                conn.close()
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Yields a pooled read-only connection for the current thread."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        generation = self._generation
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            if conn.in_transaction:
+                conn.rollback()
+            self._checkin(conn, generation)
+
+    def data_version(self):
+        """
+        Token that changes whenever another connection or process commits.
+
+        PRAGMA data_version is only comparable on the connection that read
+        it, so each connection remembers what it saw last. The first check
+        after a commit is always on a connection whose last value predates it
+        (or on one that was never checked), and any such change bumps the
+        pool-wide counter. Connections that see the same commit later bump
+        it again, which only costs a few extra cache misses.
+        """
+        with self.connection() as conn:
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            with self._cond:
+                if self._seen_versions.get(conn) != version:
+                    self._seen_versions[conn] = version
+                    self._data_version += 1
+                return self._data_version
+
+    def close(self):
+        """Closes idle connections; busy ones are closed when they come back."""
+        with self._cond:
+            for conn in self._idle:
+                self._seen_versions.pop(conn, None)
+                conn.close()
+            self._opened -= len(self._idle)
+            self._idle = []
+            self._generation += 1
+            self._wal_checked = False
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._opened,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+            }
@@ -0,0 +1,76 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class CachedResult:
+    def __init__(self, query, result):
+        # `query` is the raw text that produced the result's column names;
+        # another spelling of the same canonical SQL may name unaliased
+        # expressions differently
+        self.query = query
+        self.result = result
+        self.nbytes = result.nbytes + 64 * len(result.columns) + 256
+
+
+class ResultCache:
+    """
+    Process-wide LRU cache of query results, bounded by total bytes.
+
+    Keys are (canonical SQL, database data version), so any committed write
+    to the database makes every older entry unreachable; those age out of the
+    LRU naturally. Single results larger than `max_entry_bytes` are never
+    cached so one huge scan cannot flush everything else.
+    """
+
+    def __init__(self, max_bytes=None, max_entry_bytes=None):
+        self.max_bytes = max_bytes or int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.max_entry_bytes = max_entry_bytes or self.max_bytes // 4
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, query, result):
+        entry = CachedResult(query, result)
+        if entry.nbytes > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,46 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class ResultStore:
+    """
+    Out-of-band home for QueryResult objects referenced from the agent state.
+
+    Nodes put a result here and pass only the handle through AgentState, so
+    the rows are never serialized into the checkpointer and downstream nodes
+    (visualization, analysis) read the columnar arrays in place. The store is
+    an LRU bounded by bytes; a handle that has been evicted (or that came from
+    a previous process) simply resolves to None and callers fall back to the
+    JSON rendering kept in the state.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or int(os.getenv("RESULT_STORE_MAX_BYTES", str(128 * 1024 * 1024)))
+        self._results = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, result):
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._results[handle] = result
+            self._bytes += result.nbytes
+            while self._bytes > self.max_bytes and len(self._results) > 1:
+                _, evicted = self._results.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return handle
+
+    def get(self, handle):
+        if not handle:
+            return None
+        with self._lock:
+            result = self._results.get(handle)
+            if result is not None:
+                self._results.move_to_end(handle)
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {"results": len(self._results), "bytes": self._bytes, "max_bytes": self.max_bytes}
@@ -0,0 +1,233 @@
+import json
+import os
+
+DEFAULT_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "500"))
+DEFAULT_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", str(64 * 1024)))
+FETCH_BATCH_SIZE = int(os.getenv("QUERY_FETCH_BATCH", "1000"))
+# Hard stop for streaming past the kept rows; a cross join can produce billions
+DEFAULT_ROW_CAP = int(os.getenv("QUERY_ROW_CAP", "1000000"))
+
+
+def row_size(row):
+    """Approximate size of a row once rendered as compact JSON, in bytes."""
+    size = 2
+    for value in row:
+        if isinstance(value, (str, bytes)):
+            size += len(value) + 3
+        else:
+            size += 12
+    return size
+
+
+def unique_columns(names):
+    """
+    Column names made unique in order ("ticker", "ticker" -> "ticker", "ticker_1"),
+    so a join selecting the same name twice keeps both columns in every
+    name-keyed view (stats, columnar arrays, DataFrames, records).
+    """
+    seen = set()
+    columns = []
+    for name in names:
+        column = name
+        n = 0
+        while column in seen:
+            n += 1
+            column = f"{name}_{n}"
+        seen.add(column)
+        columns.append(column)
+    return columns
+
+
+class ColumnStats:
+    """Running min/max/mean of the numeric values seen in one column."""
+
+    def __init__(self):
+        self.count = 0
+        self.nulls = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value is None:
+            self.nulls += 1
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def as_dict(self):
+        if not self.count:
+            return {"nulls": self.nulls}
+        return {
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.total / self.count, 4),
+            "nulls": self.nulls,
+        }
+
+
+class QueryResult:
+    """
+    A bounded query result.
+
+    Holds at most `max_rows` rows / `max_bytes` of row data, while `row_count`
+    and `stats` describe every row the query produced, so a truncated result
+    still tells the analyst how big and how spread out the full answer was.
+    If the scan hit the row cap, `complete` is False and both only cover the
+    rows read up to the cap.
+    """
+
+    def __init__(self, columns, rows, row_count, truncated, stats, nbytes, limits, complete=True):
+        self.columns = columns
+        self.rows = rows
+        self.row_count = row_count
+        self.truncated = truncated
+        self.stats = stats
+        self.nbytes = nbytes
+        self.limits = limits
+        self.complete = complete
+        # Set on the per-call copy ResultCache hits hand out, never on the cached object
+        self.from_cache = False
+        self._columnar = None
+
+    @classmethod
+    def from_cursor(cls, cursor, max_rows=None, max_bytes=None, batch_size=None, row_cap=None):
+        """
+        Streams a cursor with fetchmany, keeping memory bounded by the limits.
+        Stops reading altogether after `row_cap` rows.
+        """
+        max_rows = DEFAULT_MAX_ROWS if max_rows is None else max_rows
+        max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        row_cap = DEFAULT_ROW_CAP if row_cap is None else row_cap
+        batch_size = batch_size or FETCH_BATCH_SIZE
+
+        columns = unique_columns(d[0] for d in cursor.description or [])
+        stats = [ColumnStats() for _ in columns]
+        rows = []
+        nbytes = 0
+        row_count = 0
+        truncated = False
+        complete = True
+
+        while True:
+            if row_count >= row_cap:
+                complete = False
+                truncated = True
+                break
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                row_count += 1
+                for column_stats, value in zip(stats, row):
+                    column_stats.add(value)
+                if truncated:
+                    continue
+                size = row_size(row)
+                if len(rows) >= max_rows or nbytes + size > max_bytes:
+                    truncated = True
+                    continue
+                rows.append(row)
+                nbytes += size
+
+        return cls(
+            columns,
+            rows,
+            row_count,
+            truncated,
+            {c: s.as_dict() for c, s in zip(columns, stats)},
+            nbytes,
+            (max_rows, max_bytes),
+            complete,
+        )
+
+    def with_columns(self, columns, from_cache=False):
+        """
+        Same data under different column names (e.g. another spelling of the
+        query). The rows are shared, not copied.
+        """
+        columns = unique_columns(columns)
+        stats = {new: self.stats[old] for old, new in zip(self.columns, columns)}
+        result = QueryResult(
+            columns, self.rows, self.row_count, self.truncated, stats, self.nbytes, self.limits, self.complete
+        )
+        result.from_cache = from_cache
+        if columns == self.columns:
+            result._columnar = self._columnar
+        return result
+
+    def records(self):
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def columnar(self):
+        """
+        The kept rows as {column: numpy array}, built once and memoized.
+
+        Numeric columns become int64/float64 arrays (NULLs as NaN), everything
+        else an object array. pandas and Arrow can wrap these without copying.
+        """
+        if self._columnar is None:
+            import numpy as np
+
+            arrays = {}
+            values_by_column = list(zip(*self.rows)) if self.rows else [()] * len(self.columns)
+            for column, values in zip(self.columns, values_by_column):
+                kinds = {type(v) for v in values if v is not None}
+                if kinds and kinds <= {int, float} and (float in kinds or None in values):
+                    arrays[column] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+                elif kinds == {int}:
+                    arrays[column] = np.array(values, dtype=np.int64)
+                else:
+                    arrays[column] = np.array(values, dtype=object)
+            self._columnar = arrays
+        return self._columnar
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(self.columnar(), columns=self.columns, copy=False)
+
+    def to_arrow(self):
+        # Optional: only needed by consumers that want an Arrow table
+        import pyarrow as pa
+        return pa.table(self.columnar())
+
+    def to_json(self):
+        """
+        Compact JSON of the kept rows in pandas' "split" layout
+        ({"columns": [...], "data": [[...], ...]}), so column names are not
+        repeated on every row.
+        """
+        return json.dumps(
+            {"columns": self.columns, "data": [list(row) for row in self.rows]},
+            separators=(",", ":"),
+            default=str,
+        )
+
+    def summary(self):
+        """One-paragraph description of the full result, including a truncation marker."""
+        if not self.complete:
+            text = (
+                f"[TRUNCATED] Showing {len(self.rows):,} rows; reading stopped after "
+                f"{self.row_count:,} rows (row cap), so the full result is larger."
+            )
+        elif self.truncated:
+            max_rows, max_bytes = self.limits
+            text = (
+                f"[TRUNCATED] Showing {len(self.rows):,} of {self.row_count:,} rows "
+                f"(limits: {max_rows:,} rows / {max_bytes // 1024:,} KB)."
+            )
+        else:
+            text = f"Returned {self.row_count:,} rows."
+
+        numeric = [
+            f"{column}: min={s['min']}, max={s['max']}, mean={s['mean']}"
+            for column, s in self.stats.items() if "mean" in s
+        ]
+        if numeric:
+            scope = "all rows" if self.complete else f"the first {self.row_count:,} rows"
+            text += f" Column stats over {scope}: " + "; ".join(numeric) + "."
+        return text
@@ -0,0 +1,95 @@
+import os
+import threading
+
+
+class SchemaSnapshot:
+    """
+    Immutable view of the schema at one `PRAGMA schema_version`.
+
+    Anything expensive derived from the schema text (e.g. a rendered prompt)
+    can be memoized on the snapshot with `render()`, so it lives exactly as
+    long as the DDL it was built from.
+    """
+
+    def __init__(self, version, text):
+        self.version = version
+        self.text = text
+        self._rendered = {}
+        # Reentrant: a builder may render other keys of the same snapshot
+        self._lock = threading.RLock()
+
+    def render(self, key, builder):
+        with self._lock:
+            if key not in self._rendered:
+                self._rendered[key] = builder(self)
+            return self._rendered[key]
+
+
+class SchemaCache:
+    """
+    Caches the schema text of a DatabaseManager and refreshes it only when the
+    DDL changes.
+
+    Steady state costs two `os.stat` calls: if neither the database file nor
+    its WAL changed since the last look, the snapshot is served as-is. When
+    they did change, `PRAGMA schema_version` (a header read, not a
+    sqlite_master scan) decides whether the schema really needs re-reading.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._snapshot = None
+        self._file_sig = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.version_checks = 0
+        self.schema_reads = 0
+
+    def _file_signature(self):
+        path = self.db_manager.db_path
+        st = os.stat(path)
+        try:
+            wal = os.stat(path + "-wal")
+            wal_sig = (wal.st_size, wal.st_mtime_ns)
+        except FileNotFoundError:
+            wal_sig = None
+        return st.st_ino, st.st_mtime_ns, st.st_size, wal_sig
+
+    def snapshot(self):
+        file_sig = self._file_signature()
+        with self._lock:
+            if self._snapshot is not None and file_sig == self._file_sig:
+                self.hits += 1
+                return self._snapshot
+
+            if self._file_sig is not None and file_sig[0] != self._file_sig[0]:
+                # The file was replaced (wipe & recreate): pooled readers point at the old inode
+                self.db_manager.pool.close()
+
+            with self.db_manager.pool.connection() as conn:
+                self.version_checks += 1
+                schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+                version = (file_sig[0], schema_version)
+
+                if self._snapshot is None or self._snapshot.version != version:
+                    self.schema_reads += 1
+                    self._snapshot = SchemaSnapshot(version, self.db_manager._read_schema(conn))
+                else:
+                    self.hits += 1
+
+            self._file_sig = file_sig
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._file_sig = None
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "version_checks": self.version_checks,
+            "schema_reads": self.schema_reads,
+            "version": self._snapshot.version if self._snapshot else None,
+        }
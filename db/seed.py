@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+
+from db.holdings import HoldingsAccumulator
+
+SEED_START_DATE = "2024-01-01"
+SEED_END_DATE = "2024-12-31"
+
+# Pragmas for a one-off bulk load: the data is synthetic and can be regenerated,
+# so durability is traded for throughput while it runs
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",
+)
+
+
+def generate_batch(rng, tickers, lows, highs, size):
+    """
+    One batch of random transactions as parallel arrays: ticker, side, qty,
+    price and date, drawn with the same distributions the per-row seeder used
+    (70/30 BUY/SELL, qty 1-50, sector price range, any day of 2024).
+    """
+    idx = rng.integers(0, len(tickers), size)
+    sides = np.where(rng.random(size) < 0.7, "BUY", "SELL")
+    qtys = rng.integers(1, 51, size)
+    prices = np.round(lows[idx] + rng.random(size) * (highs[idx] - lows[idx]), 2)
+
+    start = np.datetime64(SEED_START_DATE)
+    days = (np.datetime64(SEED_END_DATE) - start).astype(int)
+    dates = (start + rng.integers(0, days + 1, size)).astype(str)
+    return tickers[idx], sides, qtys, prices, dates
+
+
+def seed_transactions(conn, ticker_to_sector, sector_price_ranges, n_rows, batch_size=100_000, seed=None):
+    """
+    Bulk-generates `n_rows` transactions in NumPy batches, inserts them with
+    executemany inside a single transaction, and folds holdings in memory so
+    they are written once at the end. Returns the number of rows per second.
+    """
+    rng = np.random.default_rng(seed)
+    tickers = np.array(list(ticker_to_sector))
+    ranges = [sector_price_ranges.get(ticker_to_sector[t], (50, 500)) for t in tickers]
+    lows = np.array([low for low, _ in ranges], dtype=np.float64)
+    highs = np.array([high for _, high in ranges], dtype=np.float64)
+
+    if conn.in_transaction:
+        conn.commit()
+    for pragma in BULK_LOAD_PRAGMAS:
+        conn.execute(pragma)
+
+    holdings = HoldingsAccumulator()
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    remaining = n_rows
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        t, sides, qtys, prices, dates = generate_batch(rng, tickers, lows, highs, size)
+        t, sides, qtys, prices, dates = t.tolist(), sides.tolist(), qtys.tolist(), prices.tolist(), dates.tolist()
+
+        cursor.executemany(
+            "INSERT INTO transactions (ticker, side, qty, price, date, asset_class) VALUES (?,?,?,?,?,'Equity')",
+            zip(t, sides, qtys, prices, dates)
+        )
+        holdings.apply(t, sides, qtys, prices)
+        remaining -= size
+
+    holdings.write(cursor)
+    conn.commit()
+    conn.execute("PRAGMA synchronous=FULL")
+
+    elapsed = time.perf_counter() - started
+    return n_rows / elapsed if elapsed > 0 else float("inf")
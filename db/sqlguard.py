@@ -0,0 +1,214 @@
+import re
+
+from db.sqltext import NUMBER, STRING, WORD, QUOTED_IDENT, ident as _ident, tokenize, canonicalize, table_references
+
+# Anything that writes, changes the schema, touches other databases or
+# changes connection state. As words only: "updated_at" or 'DROP' in a
+# string literal are different tokens and never match.
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "replace", "upsert", "merge", "drop", "alter", "create", "attach",
+    "detach", "pragma", "vacuum", "reindex", "analyze", "begin", "commit", "rollback", "savepoint",
+    "release", "load_extension",
+}
+# Read-only table-valued functions that may appear where a table does
+TABLE_FUNCTIONS = {"json_each", "json_tree"}
+IMPLICIT_COLUMNS = {"rowid", "oid", "_rowid_"}
+# Columns of json_each / json_tree rows
+TABLE_FUNCTION_COLUMNS = {"key", "value", "type", "atom", "id", "parent", "fullkey", "path", "json", "root"}
+# SQLite keywords plus the collation names; any other bare word that is not a
+# function call must be a column or an alias (a CAST type follows AS, so it is one)
+SQL_WORDS = {
+    "abort", "action", "add", "after", "all", "alter", "always", "analyze", "and", "as", "asc", "attach",
+    "autoincrement", "before", "begin", "between", "by", "cascade", "case", "cast", "check", "collate",
+    "column", "commit", "conflict", "constraint", "create", "cross", "current", "current_date",
+    "current_time", "current_timestamp", "database", "default", "deferrable", "deferred", "delete", "desc",
+    "detach", "distinct", "do", "drop", "each", "else", "end", "escape", "except", "exclude", "exclusive",
+    "exists", "explain", "fail", "filter", "first", "following", "for", "foreign", "from", "full",
+    "generated", "glob", "group", "groups", "having", "if", "ignore", "immediate", "in", "index", "indexed",
+    "initially", "inner", "insert", "instead", "intersect", "into", "is", "isnull", "join", "key", "last",
+    "left", "like", "limit", "match", "materialized", "natural", "no", "not", "nothing", "notnull", "null",
+    "nulls", "of", "offset", "on", "or", "order", "others", "outer", "over", "partition", "plan", "pragma",
+    "preceding", "primary", "query", "raise", "range", "recursive", "references", "regexp", "reindex",
+    "release", "rename", "replace", "restrict", "returning", "right", "rollback", "row", "rows", "savepoint",
+    "select", "set", "table", "temp", "temporary", "then", "ties", "to", "transaction", "trigger", "true",
+    "false", "unbounded", "union", "unique", "update", "using", "vacuum", "values", "view", "virtual", "when",
+    "where", "window", "with", "without", "nocase", "binary", "rtrim",
+}
+# Tokens after which a bare word names the expression before it ("SUM(qty) total")
+_EXPRESSION_ENDS = {NUMBER, STRING, QUOTED_IDENT}
+_CONSTRAINT_WORDS = {"constraint", "primary", "foreign", "unique", "check"}
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*(.*?)\s*```\s*$", re.DOTALL)
+
+
+class GuardrailViolation(ValueError):
+    pass
+
+
+def schema_columns(ddl_text):
+    """{table: {columns}} parsed from CREATE TABLE statements, without touching the database."""
+    tables = {}
+    tokens = tokenize(ddl_text)
+    i = 0
+    while i < len(tokens):
+        if tokens[i][1].lower() == "create" and i + 1 < len(tokens) and tokens[i + 1][1].lower() == "table":
+            i += 2
+            while i < len(tokens) and tokens[i][1].lower() in ("if", "not", "exists"):
+                i += 1
+            if i >= len(tokens):
+                break
+            name = _ident(*tokens[i])
+            i += 1
+            if i >= len(tokens) or tokens[i][1] != "(":
+                continue
+            columns = set()
+            depth = 0
+            start_of_item = True
+            while i < len(tokens):
+                kind, text = tokens[i]
+                if text == "(":
+                    depth += 1
+                elif text == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                elif text == "," and depth == 1:
+                    start_of_item = True
+                    i += 1
+                    continue
+                elif start_of_item and depth == 1:
+                    if kind in (WORD, QUOTED_IDENT) and text.lower() not in _CONSTRAINT_WORDS:
+                        columns.add(_ident(kind, text))
+                    start_of_item = False
+                i += 1
+            tables[name] = columns
+        i += 1
+    return tables
+
+
+def _cte_names(tokens, lowered):
+    names = set()
+    for i, word in enumerate(lowered):
+        # "name AS (" ...
+        if word == "as" and i and lowered[i + 1:i + 2] == ["("]:
+            names.add(_ident(*tokens[i - 1]))
+        # ... and "WITH [RECURSIVE] name(cols) AS ("
+        elif word in ("with", "recursive", ",") and lowered[i + 2:i + 3] == ["("]:
+            if tokens[i + 1][0] in (WORD, QUOTED_IDENT):
+                names.add(_ident(*tokens[i + 1]))
+    return names
+
+
+def _defined_names(tokens, lowered):
+    """Names the query itself defines: column aliases (with or without AS) and CTE column lists."""
+    names = set()
+    for i in range(1, len(tokens)):
+        kind, text = tokens[i]
+        if kind not in (WORD, QUOTED_IDENT) or lowered[i] in SQL_WORDS:
+            continue
+        prev_kind, prev = tokens[i - 1]
+        if lowered[i - 1] == "as" or prev == ")" or prev_kind in _EXPRESSION_ENDS or (
+            prev_kind == WORD and lowered[i - 1] not in SQL_WORDS and lowered[i - 2:i - 1] != ["."]
+            and lowered[i + 1:i + 2] != ["("]
+        ):
+            names.add(_ident(kind, text))
+    # WITH name(a, b) AS (...)
+    for i, word in enumerate(lowered):
+        if word in ("with", "recursive", ",") and lowered[i + 2:i + 3] == ["("] and tokens[i + 1][0] in (WORD, QUOTED_IDENT):
+            j = i + 3
+            while j < len(tokens) and tokens[j][1] != ")":
+                if tokens[j][0] in (WORD, QUOTED_IDENT):
+                    names.add(_ident(*tokens[j]))
+                j += 1
+    return names
+
+
+class SQLGuard:
+    """
+    Token-based read-only validator for generated SQL.
+
+    Accepts exactly one SELECT (optionally with CTEs) that uses no forbidden
+    keyword and only reads tables and columns that exist in the schema it
+    was built from; a bare column may also be an alias the query defines.
+    `check()` returns the canonical text of the query (see
+    db.sqltext.canonicalize), which downstream caches key on.
+
+    Built once per schema version (see SchemaSnapshot.render), so a check is a
+    tokenizer pass plus set lookups.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(schema_columns(snapshot.text))
+
+    @staticmethod
+    def clean(sql):
+        """Strips markdown code fences and surrounding whitespace/semicolons."""
+        match = _FENCE_RE.match(sql)
+        if match:
+            sql = match.group(1)
+        return sql.strip().rstrip(";").strip()
+
+    def check(self, sql):
+        tokens = tokenize(sql)
+        while tokens and tokens[-1][1] == ";":
+            tokens.pop()
+        if not tokens:
+            raise GuardrailViolation("empty query")
+        lowered = [text.lower() for _, text in tokens]
+        if ";" in lowered:
+            raise GuardrailViolation("only a single statement is allowed")
+
+        if lowered[0] not in ("select", "with"):
+            raise GuardrailViolation(f"{lowered[0].upper()} statements are not allowed; only SELECT")
+
+        if not FORBIDDEN_KEYWORDS.isdisjoint(lowered):
+            for i, (kind, text) in enumerate(tokens):
+                if kind == WORD and lowered[i] in FORBIDDEN_KEYWORDS:
+                    # replace(x, 'a', 'b') is a string function, not REPLACE INTO
+                    if lowered[i] == "replace" and lowered[i + 1:i + 2] == ["("]:
+                        continue
+                    raise GuardrailViolation(f"{text.upper()} is not allowed in a read-only query")
+
+        # Quoted and schema-qualified names included: anything that is not a
+        # known table, CTE or allowed table function is refused
+        refs = table_references(tokens)
+        unknown = set(refs.values()) - self.tables.keys() - TABLE_FUNCTIONS
+        if unknown:
+            unknown -= _cte_names(tokens, lowered)
+            if unknown:
+                raise GuardrailViolation(f"unknown table {sorted(unknown)[0]}")
+
+        for i in range(2, len(tokens)):
+            if lowered[i - 1] != "." or tokens[i][0] not in (WORD, QUOTED_IDENT):
+                continue
+            qualifier = _ident(*tokens[i - 2])
+            table = refs.get(qualifier, qualifier if qualifier in self.tables else None)
+            column = _ident(*tokens[i])
+            if table in self.tables and column not in self.tables[table] and column not in IMPLICIT_COLUMNS:
+                raise GuardrailViolation(f"unknown column {qualifier}.{column}")
+
+        # Unqualified columns must belong to one of the tables the query reads
+        columns = set(IMPLICIT_COLUMNS)
+        for table in set(refs.values()):
+            columns |= self.tables.get(table, TABLE_FUNCTION_COLUMNS if table in TABLE_FUNCTIONS else set())
+        known = columns | refs.keys() | _cte_names(tokens, lowered)
+        defined = None
+        for i, (kind, text) in enumerate(tokens):
+            if kind not in (WORD, QUOTED_IDENT):
+                continue
+            name = _ident(kind, text)
+            if (lowered[i] in SQL_WORDS and kind == WORD) or name in known:
+                continue
+            # Function names, qualifiers and qualified columns (checked above)
+            if lowered[i + 1:i + 2] in (["("], ["."]) or lowered[i - 1:i] == ["."]:
+                continue
+            if defined is None:
+                defined = _defined_names(tokens, lowered)
+            if name not in defined:
+                raise GuardrailViolation(f"unknown column {name}")
+
+        return canonicalize(sql, tokens)
@@ -0,0 +1,154 @@
+import re
+
+# Token kinds produced by tokenize()
+WORD, NUMBER, STRING, QUOTED_IDENT, PARAM, OP, PUNCT = (
+    "word", "number", "string", "quoted_ident", "param", "op", "punct"
+)
+
+_TOKEN_RE = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*.*?(?:\*/|\Z))
+    | (?P<string>'(?:[^']|'')*'?)
+    | (?P<quoted_ident>"(?:[^"]|"")*"?|`(?:[^`]|``)*`?|\[[^\]]*\]?)
+    | (?P<blob>[xX]'[0-9a-fA-F]*')
+    | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<param>[?][0-9]*|[:@$][A-Za-z_][A-Za-z0-9_]*)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<op>\|\||<<|>>|<=|>=|==|!=|<>|->>|->|[-+*/%<>=~&|])
+    | (?P<punct>[(),;.])
+    | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+def tokenize(sql):
+    """
+    Splits SQLite text into (kind, text) tokens, dropping whitespace and comments.
+
+    String literals and quoted identifiers are kept verbatim, so keywords that
+    appear inside them (e.g. 'DROP' in a ticker name) never look like keywords.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("ws", "line_comment", "block_comment"):
+            continue
+        text = match.group()
+        if kind == "blob":
+            kind = STRING
+        elif kind == "other":
+            kind = OP
+        tokens.append((kind, text))
+    return tokens
+
+
+# Words that end a FROM/JOIN table reference (so they are never taken as an alias)
+_CLAUSE_WORDS = {
+    "where", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "on", "using",
+    "group", "order", "having", "limit", "union", "intersect", "except", "window", "as", "indexed", "not",
+}
+# Words that end a FROM clause at its own nesting level
+_FROM_END_WORDS = {"where", "group", "order", "having", "limit", "union", "intersect", "except", "window", "select"}
+
+
+def ident(kind, text):
+    """Lowercased name of a WORD or QUOTED_IDENT token, with "x", [x] and `x` unquoted."""
+    if kind == QUOTED_IDENT:
+        quote = text[0]
+        return text[1:-1].replace(quote * 2, quote).lower() if quote in "\"`" else text[1:-1].lower()
+    return text.lower()
+
+
+def _from_item(tokens, i, refs):
+    # One FROM item at tokens[i]: a [schema.]table [AS] alias, a table
+    # function, or "(" for a subquery (left to the caller's scan)
+    names = (WORD, QUOTED_IDENT)
+    if i >= len(tokens) or tokens[i][1] == "(":
+        return i
+    if tokens[i][0] not in names:
+        # Not something a table can be named by: kept as is, so an
+        # allow-list check refuses it rather than missing it
+        refs[tokens[i][1].lower()] = tokens[i][1].lower()
+        return i + 1
+    table = ident(*tokens[i])
+    i += 1
+    if i + 1 < len(tokens) and tokens[i][1] == "." and tokens[i + 1][0] in names:
+        schema, table = table, ident(*tokens[i + 1])
+        if schema != "main":
+            table = f"{schema}.{table}"
+        i += 2
+    refs[table] = table
+    if i < len(tokens) and tokens[i][1].lower() == "as":
+        i += 1
+    if i < len(tokens) and (
+        tokens[i][0] == QUOTED_IDENT or (tokens[i][0] == WORD and tokens[i][1].lower() not in _CLAUSE_WORDS)
+    ):
+        refs[ident(*tokens[i])] = table
+        i += 1
+    return i
+
+
+def table_references(tokens):
+    """
+    Maps every name a table can be referred to by (table name or alias) to the table.
+
+    Every FROM item counts: the ones after FROM and JOIN, and the ones after
+    a comma at the FROM clause's own nesting level, also when they follow a
+    subquery or an ON condition. Quoted names count like bare ones, and
+    `schema.table` is kept qualified unless the schema is "main", so an
+    allow-list check sees "temp.x" as unknown rather than missing it.
+    """
+    refs = {}
+    # One flag per parenthesis level: are we inside that level's FROM clause?
+    in_from = [False]
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        lowered = text.lower()
+        if text == "(":
+            in_from.append(False)
+        elif text == ")":
+            if len(in_from) > 1:
+                in_from.pop()
+        elif kind == WORD and lowered in ("from", "join"):
+            in_from[-1] = True
+            i = _from_item(tokens, i + 1, refs)
+            continue
+        elif text == "," and in_from[-1]:
+            i = _from_item(tokens, i + 1, refs)
+            continue
+        elif kind == WORD and lowered in _FROM_END_WORDS:
+            in_from[-1] = False
+        i += 1
+    return refs
+
+
+def _canonical_number(text):
+    if text[:2].lower() == "0x":
+        return str(int(text, 16))
+    if re.fullmatch(r"\d+", text):
+        return str(int(text))
+    return repr(float(text))
+
+
+def canonicalize(sql, tokens=None):
+    """
+    Canonical form of a query for cache keys.
+
+    Whitespace and comments are dropped, keywords and unquoted identifiers are
+    lowercased (SQLite treats both case-insensitively), numeric literals are
+    normalized (`05`, `5`, `0x5` all become `5`) and trailing semicolons are
+    removed. String literals and quoted identifiers are left byte-for-byte.
+    Pass `tokens` when the query has already been tokenized.
+    """
+    parts = []
+    for kind, text in (tokens if tokens is not None else tokenize(sql)):
+        if kind == WORD:
+            parts.append(text.lower())
+        elif kind == NUMBER:
+            parts.append(_canonical_number(text))
+        else:
+            parts.append(text)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
@@ -0,0 +1,170 @@
+import sqlite3
+import time
+
+# Materialized analytics over `transactions`. The comments are part of the DDL
+# on purpose: sqlite_master keeps them, so they reach the LLM with the schema.
+SUMMARY_DDL = '''
+    CREATE TABLE IF NOT EXISTS positions (
+        ticker TEXT PRIMARY KEY,
+        qty REAL,             -- shares currently held
+        avg_cost REAL,        -- weighted average cost of the open position
+        last_price REAL,      -- price of the latest trade; unrealized P&L = qty * (last_price - avg_cost)
+        realized_pnl REAL,    -- sum over SELLs of sold qty * (sell price - avg_cost at the time)
+        trades INTEGER,
+        last_trade_date TEXT
+    );
+    CREATE TABLE IF NOT EXISTS sector_exposure_daily (
+        -- daily flows per sector; cumulative exposure is
+        -- SUM(buy_value - sell_value) OVER (PARTITION BY sector ORDER BY date)
+        date TEXT,
+        sector TEXT,
+        buy_value REAL,       -- sum of qty * price bought that day
+        sell_value REAL,      -- sum of qty * price sold that day
+        net_qty REAL,         -- shares bought minus shares sold that day
+        trades INTEGER,
+        PRIMARY KEY (date, sector)
+    );
+    CREATE INDEX IF NOT EXISTS idx_sector_exposure_daily_sector ON sector_exposure_daily (sector, date);
+'''
+
+# Same rules as HoldingsAccumulator (weighted average on BUY, reset when a SELL
+# closes the position). SET expressions all see the row as it was before the
+# UPDATE, so realized P&L uses the pre-trade qty and average cost. Shared by the
+# live trigger and the backfill replay so both round exactly the same way.
+POSITIONS_UPDATE = '''
+        INSERT OR IGNORE INTO positions (ticker, qty, avg_cost, last_price, realized_pnl, trades)
+        VALUES (NEW.ticker, 0, 0, NEW.price, 0, 0);
+        UPDATE positions SET
+            realized_pnl = realized_pnl + CASE WHEN NEW.side = 'SELL'
+                THEN MIN(NEW.qty, qty) * (NEW.price - avg_cost) ELSE 0 END,
+            avg_cost = CASE
+                WHEN NEW.side = 'BUY' AND qty + NEW.qty <= 0 THEN 0
+                WHEN NEW.side = 'BUY' THEN ROUND((qty * avg_cost + NEW.qty * NEW.price) / (qty + NEW.qty), 2)
+                WHEN qty - NEW.qty <= 0 THEN 0
+                ELSE avg_cost END,
+            qty = CASE
+                WHEN NEW.side = 'BUY' THEN qty + NEW.qty
+                WHEN qty - NEW.qty <= 0 THEN 0
+                ELSE qty - NEW.qty END,
+            last_price = NEW.price,
+            trades = trades + 1,
+            last_trade_date = MAX(COALESCE(last_trade_date, NEW.date), NEW.date)
+        WHERE ticker = NEW.ticker;
+'''
+
+SUMMARY_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_positions AFTER INSERT ON transactions
+    BEGIN''' + POSITIONS_UPDATE + '''    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_sector_exposure AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO sector_exposure_daily (date, sector, buy_value, sell_value, net_qty, trades)
+        VALUES (
+            NEW.date,
+            COALESCE((SELECT sector FROM instruments WHERE ticker = NEW.ticker), 'Unknown'),
+            CASE WHEN NEW.side = 'BUY' THEN NEW.qty * NEW.price ELSE 0 END,
+            CASE WHEN NEW.side = 'SELL' THEN NEW.qty * NEW.price ELSE 0 END,
+            CASE WHEN NEW.side = 'BUY' THEN NEW.qty ELSE -NEW.qty END,
+            1
+        )
+        ON CONFLICT (date, sector) DO UPDATE SET
+            buy_value = buy_value + excluded.buy_value,
+            sell_value = sell_value + excluded.sell_value,
+            net_qty = net_qty + excluded.net_qty,
+            trades = trades + 1;
+    END;
+'''
+
+# The summaries are folded from inserts only (average cost depends on the order
+# of trades), so the ledger is append-only: a correction is a new, offsetting
+# trade. Editing history by hand needs these dropped and rebuild_summaries().
+APPEND_ONLY_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_append_only_update BEFORE UPDATE ON transactions
+    BEGIN
+        SELECT RAISE(ABORT, 'transactions is append-only; record an offsetting trade instead');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_append_only_delete BEFORE DELETE ON transactions
+    BEGIN
+        SELECT RAISE(ABORT, 'transactions is append-only; record an offsetting trade instead');
+    END;
+'''
+
+
+def _statements(script):
+    # Splits on statement boundaries as SQLite sees them (trigger bodies and
+    # comments contain ';' too)
+    buffer = ""
+    for piece in script.split(";"):
+        buffer += piece + ";"
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip(" \n;"):
+                yield buffer
+            buffer = ""
+
+
+def rebuild_summaries(conn):
+    """Recomputes every summary table from `transactions` (backfill / repair)."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM positions")
+    # Replay through a temp view whose INSTEAD OF trigger runs the live
+    # trigger's statements, so a rebuild matches incremental maintenance
+    cursor.execute("CREATE TEMP VIEW _positions_replay AS SELECT ticker, side, qty, price, date FROM main.transactions")
+    cursor.execute(
+        "CREATE TEMP TRIGGER _positions_replay_insert INSTEAD OF INSERT ON _positions_replay BEGIN"
+        + POSITIONS_UPDATE + "END"
+    )
+    cursor.execute(
+        "INSERT INTO _positions_replay (ticker, side, qty, price, date) "
+        "SELECT ticker, side, qty, price, date FROM transactions ORDER BY id"
+    )
+    cursor.execute("DROP TRIGGER _positions_replay_insert")
+    cursor.execute("DROP VIEW _positions_replay")
+    cursor.execute("DELETE FROM sector_exposure_daily")
+    cursor.execute('''
+        INSERT INTO sector_exposure_daily (date, sector, buy_value, sell_value, net_qty, trades)
+        SELECT t.date, COALESCE(i.sector, 'Unknown'),
+               SUM(CASE WHEN t.side = 'BUY' THEN t.qty * t.price ELSE 0 END),
+               SUM(CASE WHEN t.side = 'SELL' THEN t.qty * t.price ELSE 0 END),
+               SUM(CASE WHEN t.side = 'BUY' THEN t.qty ELSE -t.qty END),
+               COUNT(*)
+        FROM transactions t LEFT JOIN instruments i ON i.ticker = t.ticker
+        GROUP BY t.date, COALESCE(i.sector, 'Unknown')
+    ''')
+
+
+def summaries_installed(conn):
+    """Whether the summary tables exist; a plain read, fine on a read-only connection."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='positions'").fetchone() is not None
+
+
+def install_summaries(conn):
+    """
+    Creates the summary tables and the triggers that keep them current.
+    Idempotent; when the tables are new they are backfilled from the existing
+    transactions in the same transaction. Also makes `transactions`
+    append-only (see APPEND_ONLY_TRIGGERS). Returns the backfill time in
+    seconds, or None if the summaries were already installed.
+    """
+    installed = {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE name IN ('positions', 'trg_transactions_append_only_delete')"
+    )}
+    if "positions" in installed:
+        # Summaries from before the ledger was made append-only
+        if "trg_transactions_append_only_delete" not in installed:
+            for statement in _statements(APPEND_ONLY_TRIGGERS):
+                conn.execute(statement)
+            conn.commit()
+        return None
+
+    if conn.in_transaction:
+        conn.commit()
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    # executescript would commit; run the DDL statement by statement instead
+    for statement in _statements(SUMMARY_DDL + SUMMARY_TRIGGERS + APPEND_ONLY_TRIGGERS):
+        cursor.execute(statement)
+    rebuild_summaries(conn)
+    conn.commit()
+    return time.perf_counter() - started
@@ -1,26 +1,147 @@
-import sys
+import argparse
+import os
 import subprocess
+import threading
 from dotenv import load_dotenv
-from db.dbmanager import DatabaseManager
-from agent.graph import generate_visual_graph
-from ui.terminal import run_cli
 
-def main():
+# Everything heavy (langgraph, the LLM clients, pandas, matplotlib) is imported
+# where it is used, so the terminal prompt does not wait for it
+
+# What the background build ran into, reported once the DB prompt is answered
+_warm_up = {}
+
+def warm_up_graph(build=True):
+    """
+    Builds the graph in the background while the DB check runs and the user
+    types, and draws graph_flow.png when it is missing. Prints nothing: the
+    DB prompt may be on screen. report_warm_up() shows what went wrong.
+    With build=False (the Streamlit UI builds its own graph in its own
+    process) only the Streamlit diagram is drawn.
+    """
+    from agent.graph import GRAPH_FILENAME, draw_graph_image, get_app
+    if build:
+        try:
+            get_app()
+        except Exception as e:
+            _warm_up["build_error"] = e
+            return
+    # The diagram only changes with the code; drawing it is a round trip to mermaid.ink
+    if not os.path.exists(GRAPH_FILENAME):
+        try:
+            draw_graph_image(GRAPH_FILENAME, human_review=build)
+            _warm_up["drawn"] = GRAPH_FILENAME
+        except Exception as e:
+            _warm_up["image_error"] = e
+
+def report_warm_up():
+    """Prints what the background build has finished with so far; a build still running reports through run_cli."""
+    if "build_error" in _warm_up:
+        print(f"⚠️ Building the agent graph failed: {_warm_up['build_error']} (retried on the first question)")
+    if "image_error" in _warm_up:
+        print(f"⚠️ Could not generate graph image: {_warm_up['image_error']}")
+    if "drawn" in _warm_up:
+        print(f"📈 First run detected: Workflow visual saved to '{_warm_up['drawn']}'")
+    _warm_up.clear()
+
+def _column_mapping(text):
+    # --column qty=Amount
+    field, sep, column = text.partition("=")
+    if not sep or not field.strip() or not column.strip():
+        raise argparse.ArgumentTypeError(f"expected FIELD=COLUMN, got {text!r}")
+    return field.strip().lower(), column.strip()
+
+def _row_count(text):
+    # --seed-rows 1000000 (also 1_000_000); argparse turns the error into a usage message
+    try:
+        rows = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a whole number of rows, got {text!r}")
+    if rows < 0:
+        raise argparse.ArgumentTypeError(f"row count cannot be negative, got {rows}")
+    return rows
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Agentic Investment Analyst")
+    parser.add_argument("--ui", action="store_true", help="launch the Streamlit UI instead of the terminal app")
+    parser.add_argument("--profile-startup", action="store_true", help="import-time breakdown of a cold start")
+    parser.add_argument("--seed-rows", type=_row_count, metavar="N",
+                        help="synthetic transactions for a fresh database (load testing)")
+
+    imports = parser.add_argument_group("import")
+    imports.add_argument("--import", dest="import_path", metavar="FILE", help="bulk import a broker export (CSV or Parquet)")
+    imports.add_argument("--column", dest="columns", action="append", type=_column_mapping, default=[],
+                         metavar="FIELD=COLUMN", help="map an import field to a file column, e.g. qty=Amount (repeatable)")
+
+    maintenance = parser.add_argument_group("maintenance")
+    maintenance.add_argument("--advise-indexes", action="store_true", help="index advice from the approved-query log")
+    maintenance.add_argument("--apply-indexes", action="store_true", help="create the advised indexes")
+    maintenance.add_argument("--checkpoint-usage", action="store_true", help="checkpoint storage per thread")
+    maintenance.add_argument("--compact-checkpoints", action="store_true", help="prune, strip and fully vacuum agent_memory.db")
+    maintenance.add_argument("--decompress-checkpoints", action="store_true", help="rewrite checkpoints in the plain SqliteSaver format")
+    return parser.parse_args(argv)
+
+def main(argv=None):
 
     load_dotenv()
+    args = parse_args(argv)
+
+    # Import-time breakdown of a cold start: python main.py --profile-startup
+    if args.profile_startup:
+        from ui.startup_profile import profile_startup
+        profile_startup()
+        return
+
+    from db.dbmanager import DatabaseManager
+
+    # Bulk import of a broker export: python main.py --import trades.csv [--column qty=Amount]
+    if args.import_path:
+        from db.importer import TradeImporter
+        db = DatabaseManager()
+        TradeImporter(db.db_path, columns=dict(args.columns)).import_file(args.import_path)
+        db.display_stats()
+        return
+
+    # Index advice from the approved-query log: python main.py --advise-indexes [--apply-indexes]
+    if args.advise_indexes or args.apply_indexes:
+        from db.index_advisor import IndexAdvisor, print_report
+        print_report(IndexAdvisor(DatabaseManager()).run(apply=args.apply_indexes))
+        return
+
+    # Back to the plain SqliteSaver format: python main.py --decompress-checkpoints
+    if args.decompress_checkpoints:
+        from agent.checkpoints import CheckpointCompactor
+        print(f"Rewrote {CheckpointCompactor.from_path().downgrade()} checkpoint rows in the plain format")
+        return
+
+    # Checkpoint storage per thread: python main.py --checkpoint-usage [--compact-checkpoints]
+    if args.checkpoint_usage or args.compact_checkpoints:
+        from agent.checkpoints import CheckpointCompactor, print_usage
+        compactor = CheckpointCompactor.from_path()
+        if args.compact_checkpoints:
+            # The one-off full VACUUM (switch to incremental auto-vacuum) only happens here
+            print(compactor.compact(full_vacuum=True))
+        print_usage(compactor)
+        return
+
+    # 2. Check for UI flag: python main.py --ui
+    ui_mode = args.ui
+    # The terminal app picks the graph up on the first question; for the
+    # Streamlit UI this only draws graph_flow.png when it is missing
+    threading.Thread(target=warm_up_graph, args=(not ui_mode,), name="graph-warmup", daemon=True).start()
+
     # 1. Shared setup logic
-    generate_visual_graph()
     db = DatabaseManager()
-    db.check_db_health()
+    # Optional: python main.py --seed-rows 1000000 (load testing with a big synthetic ledger)
+    db.check_db_health(args.seed_rows)
+    report_warm_up()
 
-    # 2. Check for UI flag: python main.py --ui
-    if "--ui" in sys.argv:
+    if ui_mode:
         print("🚀 Launching Streamlit UI...")
         subprocess.run(["streamlit", "run", "ui/app_ui.py"])
     else:
-        # Default to your existing terminal app
-        from agent.graph import app # Import here to avoid circular dependencies
-        run_cli(app)
+        # Default to your existing terminal app; it picks up the graph on the first question
+        from ui.terminal import run_cli
+        run_cli()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
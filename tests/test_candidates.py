@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+
+from agent.candidates import agenerate_candidates, candidate_variants, generate_candidates
+from agent.models import registry
+
+PROMPT = ChatPromptTemplate.from_messages([("human", "{question}")])
+INPUTS = {"question": "biggest holdings"}
+COSTS = {"SELECT cheap": 10, "SELECT dear": 1000}
+
+
+def _validate(sql):
+    if sql not in COSTS:
+        return sql, "", "Security check failed", None
+    return sql, sql.lower(), "", COSTS[sql]
+
+
+@pytest.fixture
+def models():
+    registry.register("sql", FakeListChatModel(responses=["SELECT dear"]))
+    registry.register("sql_alt", FakeListChatModel(responses=["SELECT cheap"]))
+    registry.register("sql_bad", FakeListChatModel(responses=["DROP TABLE holdings"]))
+    yield
+    registry.reset()
+
+
+def test_variants_cycle_roles_and_temperatures():
+    assert candidate_variants(4) == [("sql", 0.0), ("sql", 0.4), ("sql", 0.8), ("sql", 0.0)]
+
+
+def test_cheapest_valid_candidate_wins(models):
+    best, report = generate_candidates(PROMPT, INPUTS, _validate,
+                                       variants=[("sql", 0), ("sql_alt", 0), ("sql_bad", 0)], pick="cheapest")
+    assert best.sql == "SELECT cheap"
+    assert "3 evaluated, 2 valid" in report
+
+
+def test_invalid_candidates_fall_through_to_the_retry_path(models):
+    best, _ = generate_candidates(PROMPT, INPUTS, _validate, variants=[("sql_bad", 0)], pick="first")
+    assert not best.valid
+    assert best.error == "Security check failed"
+
+
+def test_async_first_valid_candidate(models):
+    best, _ = asyncio.run(agenerate_candidates(PROMPT, INPUTS, _validate,
+                                               variants=[("sql_bad", 0), ("sql_alt", 0)], pick="first"))
+    assert best.sql == "SELECT cheap"
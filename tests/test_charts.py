@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from agent.charts import ChartCache, FallbackCodeCache, chart_key, infer_spec, render_chart
+
+
+@pytest.mark.parametrize("frame, kind, x, y, series", [
+    (pd.DataFrame({"sector": ["Tech", "Energy"], "allocation": [0.7, 0.3]}), "pie", "sector", ["allocation"], None),
+    (pd.DataFrame({"ticker": ["AAPL", "MSFT"], "pnl": [10.0, -4.0]}), "bar", "ticker", ["pnl"], None),
+    (pd.DataFrame({"ticker": [f"T{i}" for i in range(10)], "qty": range(10)}), "barh", "ticker", ["qty"], None),
+    (pd.DataFrame({"ticker": ["AAPL", "MSFT"], "buys": [1, 2], "sells": [3, 4]}), "grouped_bar", "ticker", ["buys", "sells"], None),
+    (pd.DataFrame({"date": ["2024-01-01", "2024-01-02"], "value": [1.0, 2.0]}), "timeseries", "date", ["value"], None),
+    (pd.DataFrame({"year": [2023, 2023, 2024], "ticker": ["A", "B", "A"], "trades": [1, 2, 3]}),
+     "timeseries", "year", ["trades"], "ticker"),
+    (pd.DataFrame({"qty": [1, 2, 3], "price": [5.0, 4.0, 6.0]}), "line", "qty", ["price"], None),
+])
+def test_infer_spec_picks_a_template(frame, kind, x, y, series):
+    _, spec = infer_spec(frame)
+    assert (spec.kind, spec.x, spec.y, spec.series) == (kind, x, y, series)
+    assert render_chart(frame, spec).startswith(b"\x89PNG")
+
+
+def test_no_template_without_a_measure():
+    assert infer_spec(pd.DataFrame({"ticker": ["AAPL"], "name": ["Apple"]}))[1] is None
+    assert infer_spec(pd.DataFrame({"ticker": []})) == (None, None)
+
+
+def test_same_shape_shares_a_spec_but_not_a_chart_key():
+    a = pd.DataFrame({"ticker": ["AAPL", "MSFT"], "pnl": [10.0, -4.0]})
+    b = pd.DataFrame({"ticker": ["AAPL", "MSFT"], "pnl": [11.0, -4.0]})
+    (shape_a, spec_a), (shape_b, spec_b) = infer_spec(a), infer_spec(b)
+    assert shape_a == shape_b and spec_a is spec_b
+    assert chart_key(a, repr(spec_a)) != chart_key(b, repr(spec_b))
+
+
+def test_fallback_code_is_only_reused_for_the_same_question():
+    cache = FallbackCodeCache(max_entries=2)
+    shape, _ = infer_spec(pd.DataFrame({"ticker": ["AAPL"], "name": ["Apple"]}))
+    cache.put("pie of my holdings", shape, "ax.pie(...)")
+    assert cache.get("pie of my holdings", shape) == "ax.pie(...)"
+    assert cache.get("trend of my holdings", shape) is None
+
+    cache.put("q2", shape, "code 2")
+    cache.put("q3", shape, "code 3")
+    assert cache.get("pie of my holdings", shape) is None
+
+
+def test_chart_cache_evicts_least_recently_used_by_size():
+    cache = ChartCache(max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.get("a")
+    cache.put("c", b"12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+import agent.checkpoint_serde as checkpoint_serde
+from agent.checkpoint_serde import CompressedSerializer, referenced_digests
+
+BIG = "row,value\n" + "\n".join(f"{i},{i * 3.5}" for i in range(2000))
+
+
+@pytest.fixture
+def serde(tmp_path):
+    return CompressedSerializer(blob_path=str(tmp_path / "blobs.db"))
+
+
+def _age_blobs(serde, seconds):
+    serde._connection().execute("UPDATE blobs SET created_at = created_at - ?", (seconds,))
+
+
+def test_small_payloads_stay_in_the_inner_format(serde):
+    typ, data = serde.dumps_typed({"a": 1})
+    assert "+" not in typ
+    assert serde.loads_typed((typ, data)) == {"a": 1}
+
+
+def test_round_trip_with_blobs_and_messages(serde):
+    value = {"db_results": BIG, "messages": [HumanMessage(content="hi"), AIMessage(content=BIG)], "n": 3}
+    typ, data = serde.dumps_typed(value)
+    assert typ.endswith(".cas")
+    # Both copies of BIG share one blob
+    assert len(referenced_digests(data)) == 1
+    assert len(data) < len(BIG) // 10
+    loaded = serde.loads_typed((typ, data))
+    assert loaded["db_results"] == BIG
+    assert loaded["messages"][1].content == BIG
+    assert loaded["n"] == 3
+
+
+def test_reads_rows_written_without_it(serde):
+    plain = JsonPlusSerializer().dumps_typed({"db_results": BIG})
+    assert serde.loads_typed(plain) == {"db_results": BIG}
+
+
+def test_garbage_collection_spares_referenced_and_recent_blobs(tmp_path, serde):
+    saver_db = sqlite3.connect(tmp_path / "memory.db")
+    saver_db.execute("CREATE TABLE checkpoints (type TEXT, checkpoint BLOB)")
+    saver_db.execute("CREATE TABLE writes (type TEXT, value BLOB)")
+    kept = serde.dumps_typed({"x": BIG})
+    serde.dumps_typed({"x": BIG + "dropped"})
+    saver_db.execute("INSERT INTO checkpoints VALUES (?, ?)", kept)
+
+    # Within the grace period nothing goes
+    assert serde.collect_garbage(saver_db)[0] == 0
+    _age_blobs(serde, checkpoint_serde.BLOB_GC_GRACE_SECONDS + 1)
+    assert serde.collect_garbage(saver_db)[0] == 1
+    assert serde.loads_typed(kept) == {"x": BIG}
+
+
+def test_blob_collected_elsewhere_is_written_again(tmp_path):
+    # A long-running process and a compactor in another process, same blob file
+    writer = CompressedSerializer(blob_path=str(tmp_path / "blobs.db"))
+    compactor = CompressedSerializer(blob_path=str(tmp_path / "blobs.db"))
+    empty = sqlite3.connect(":memory:")
+    empty.execute("CREATE TABLE checkpoints (type TEXT, checkpoint BLOB)")
+    empty.execute("CREATE TABLE writes (type TEXT, value BLOB)")
+
+    writer.dumps_typed({"x": BIG})
+    _age_blobs(writer, checkpoint_serde.BLOB_GC_GRACE_SECONDS + 1)
+    assert compactor.collect_garbage(empty)[0] == 1
+
+    payload = writer.dumps_typed({"x": BIG})
+    assert CompressedSerializer(blob_path=str(tmp_path / "blobs.db")).loads_typed(payload) == {"x": BIG}
+
+
+def test_reuse_refreshes_the_grace_period(tmp_path, serde):
+    empty = sqlite3.connect(":memory:")
+    empty.execute("CREATE TABLE checkpoints (type TEXT, checkpoint BLOB)")
+    empty.execute("CREATE TABLE writes (type TEXT, value BLOB)")
+    serde.dumps_typed({"x": BIG})
+    _age_blobs(serde, checkpoint_serde.BLOB_GC_GRACE_SECONDS + 1)
+    # Referenced again by a checkpoint that is not committed yet
+    serde.dumps_typed({"x": BIG})
+    assert serde.collect_garbage(empty)[0] == 0
+
+
+def test_downgrade_makes_the_file_readable_by_a_plain_saver(tmp_path):
+    path = tmp_path / "memory.db"
+    serde = CompressedSerializer(blob_path=str(tmp_path / "blobs.db"))
+    saver = SqliteSaver(sqlite3.connect(path, check_same_thread=False), serde=serde)
+    config = {"configurable": {"thread_id": "t", "checkpoint_ns": ""}}
+    checkpoint = {
+        "v": 1, "id": "1f0", "ts": "2026-01-01T00:00:00+00:00",
+        "channel_values": {"db_results": BIG}, "channel_versions": {}, "versions_seen": {},
+    }
+    saver.put(config, checkpoint, {}, {})
+
+    with saver.cursor() as cur:
+        assert serde.downgrade(cur) == 1
+    plain = SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+    assert plain.get_tuple(config).checkpoint["channel_values"]["db_results"] == BIG
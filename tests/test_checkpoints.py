@@ -0,0 +1,45 @@
+import sqlite3
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from agent.checkpoint_serde import CompressedSerializer
+from agent.checkpoints import CheckpointCompactor
+
+
+def _compactor(tmp_path, **kwargs):
+    saver = SqliteSaver(
+        sqlite3.connect(str(tmp_path / "memory.db"), check_same_thread=False),
+        serde=CompressedSerializer(blob_path=str(tmp_path / "blobs.db")),
+    )
+    return CheckpointCompactor(saver, **kwargs)
+
+
+def _auto_vacuum(compactor):
+    with compactor._cursor() as cur:
+        return cur.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def test_routine_compaction_never_runs_a_full_vacuum(tmp_path):
+    compactor = _compactor(tmp_path)
+    compactor.compact()
+    assert _auto_vacuum(compactor) == 0
+
+    compactor.compact(full_vacuum=True)
+    assert _auto_vacuum(compactor) == 2
+
+
+def test_maybe_compact_runs_in_the_background_once_per_interval(tmp_path, capsys):
+    compactor = _compactor(tmp_path, interval=3600)
+    thread = compactor.maybe_compact()
+    thread.join()
+    assert _auto_vacuum(compactor) == 0
+
+    # Not due again; the finished run's report is printed by this call
+    assert compactor.maybe_compact() is None
+    assert "Checkpoints compacted" in capsys.readouterr().out
+
+
+def test_maybe_compact_can_run_inline(tmp_path):
+    compactor = _compactor(tmp_path, interval=0)
+    report = compactor.maybe_compact(background=False)
+    assert report["deleted_checkpoints"] == 0
@@ -0,0 +1,49 @@
+import sqlite3
+
+import pytest
+
+from db.cost import QueryTooExpensive, estimate_cost
+from db.dbmanager import DatabaseManager
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "investments.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE instruments (ticker TEXT PRIMARY KEY, sector TEXT)")
+        conn.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY, ticker TEXT, qty REAL)")
+        conn.executemany("INSERT INTO instruments VALUES (?, 'Tech')", [(f"T{i}",) for i in range(100)])
+        conn.executemany("INSERT INTO transactions (ticker, qty) VALUES (?, 1)", [(f"T{i % 100}",) for i in range(20000)])
+    return path
+
+
+ROWS = {"instruments": 100, "transactions": 20000}
+
+
+def test_cross_join_is_flagged_and_multiplied(db_path):
+    with sqlite3.connect(db_path) as conn:
+        cost = estimate_cost(conn, "SELECT * FROM transactions a, transactions b", ROWS)
+
+    assert cost.estimated_rows >= 20000 * 20000
+    assert any(flag.startswith("cartesian product") for flag in cost.flags)
+    assert "full scan of transactions (~20,000 rows)" in cost.flags
+
+
+def test_keyed_join_is_not_flagged(db_path):
+    with sqlite3.connect(db_path) as conn:
+        cost = estimate_cost(
+            conn, "SELECT t.qty, i.sector FROM transactions t JOIN instruments i ON i.ticker = t.ticker", ROWS
+        )
+
+    assert cost.estimated_rows < 20000 * 100
+    assert not any(flag.startswith("cartesian product") for flag in cost.flags)
+
+
+def test_expensive_queries_are_refused_before_running(db_path):
+    db = DatabaseManager(db_path)
+    with pytest.raises(QueryTooExpensive) as refused:
+        db.execute_query_stream("SELECT COUNT(*) FROM transactions a, transactions b", max_cost=1_000_000)
+
+    assert refused.value.reason == "estimated_cost"
+    assert "cartesian product" in str(refused.value)
+    assert db.execute_query_stream("SELECT COUNT(*) AS n FROM transactions", max_cost=1_000_000).rows == [(20000,)]
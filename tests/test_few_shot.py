@@ -0,0 +1,90 @@
+from agent.few_shot import FewShotIndex
+from agent.sql_cache import SQLCache
+
+
+def _cache(tmp_path, **kwargs):
+    return SQLCache(path=str(tmp_path / "sql_cache.db"), **kwargs)
+
+
+def test_search_ranks_by_shared_terms():
+    index = FewShotIndex()
+    index.add("total dividends per ticker", "SELECT ticker, SUM(amount) FROM dividends GROUP BY ticker")
+    index.add("open positions by sector", "SELECT sector, SUM(qty) FROM holdings GROUP BY sector")
+
+    top = index.search("dividends per ticker in 2024", k=1)
+    assert [q for q, _, _ in top] == ["total dividends per ticker"]
+    assert index.search("completely unrelated words") == []
+
+
+def test_remove_drops_the_pair_and_its_postings():
+    index = FewShotIndex()
+    index.add("total dividends per ticker", "SELECT 1")
+    index.add("dividends this year", "SELECT 2")
+
+    assert index.remove("Total dividends per ticker?")
+    assert not index.remove("total dividends per ticker")
+    assert [sql for _, sql, _ in index.search("dividends")] == ["SELECT 2"]
+    assert "ticker" not in index.postings
+    stats = index.stats()
+    assert stats["pairs"] == 1
+    assert stats["postings"] == sum(len(p) for p in index.postings.values())
+    assert stats["text_bytes"] == len("dividends this year") + len("SELECT 2")
+
+
+def test_reapproval_replaces_the_pair():
+    index = FewShotIndex()
+    index.add("dividends per ticker", "SELECT old")
+    index.add("Dividends per ticker?", "SELECT new")
+
+    assert index.stats()["pairs"] == 1
+    assert [sql for _, sql, _ in index.search("dividends per ticker")] == ["SELECT new"]
+
+
+def test_search_skips_pairs_from_another_schema():
+    index = FewShotIndex()
+    index.add("dividends per ticker", "SELECT old schema", "fp-old")
+    index.add("dividends per ticker this year", "SELECT new schema", "fp-new")
+
+    assert [sql for _, sql, _ in index.search("dividends per ticker", schema_fp="fp-new")] == ["SELECT new schema"]
+    assert len(index.search("dividends per ticker")) == 2
+
+
+def test_oldest_pairs_go_past_max_pairs():
+    index = FewShotIndex(max_pairs=2)
+    for i in range(3):
+        index.add(f"question number {i}", f"SELECT {i}")
+
+    assert index.stats()["pairs"] == 2
+    assert sorted(sql for _, sql, _ in index.search("question number")) == ["SELECT 1", "SELECT 2"]
+
+
+def test_bootstraps_from_the_sql_cache_with_fingerprints(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("k1", "dividends per ticker", "SELECT 1", "fp-a", 10.0)
+    cache.put("k2", "dividends per sector", "SELECT 2", "fp-b", 10.0)
+
+    index = FewShotIndex(cache)
+    assert [sql for _, sql, _ in index.search("dividends", schema_fp="fp-a")] == ["SELECT 1"]
+
+
+def test_sql_cache_invalidate_returns_the_question(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("k1", "dividends per ticker", "SELECT 1", "fp", 10.0)
+
+    assert cache.get("k1") == "SELECT 1"
+    assert cache.invalidate("k1") == "dividends per ticker"
+    assert cache.get("k1") is None
+    assert cache.invalidate("k1") is None
+    assert cache.approved_pairs() == []
+
+
+def test_sql_cache_expires_and_evicts(tmp_path):
+    cache = _cache(tmp_path, max_entries=2, ttl_seconds=0)
+    cache.put("k1", "q1", "SELECT 1", "fp", 1.0)
+    assert cache.get("k1") is None
+
+    cache = SQLCache(path=str(tmp_path / "lru.db"), max_entries=2)
+    for i in range(3):
+        cache.put(f"k{i}", f"q{i}", f"SELECT {i}", "fp", 1.0)
+    assert cache.get("k0") is None
+    assert cache.get("k2") == "SELECT 2"
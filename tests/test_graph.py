@@ -0,0 +1,61 @@
+import asyncio
+import sqlite3
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+import agent.nodes as nodes
+from agent.concurrency import astream_turn
+from agent.graph import build_workflow
+from agent.streamlit.graph import build_async_app
+from agent.few_shot import FewShotIndex
+from agent.models import registry
+from agent.sql_cache import SQLCache
+from db.dbmanager import DatabaseManager
+from db.index_advisor import QueryLog
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "investments.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE prices (ticker TEXT, close REAL)")
+        conn.execute("INSERT INTO prices VALUES ('AAPL', 1.0)")
+    sql_cache = SQLCache(path=str(tmp_path / "sql_cache.db"))
+    monkeypatch.setattr(nodes, "db_manager", DatabaseManager(db_path))
+    monkeypatch.setattr(nodes, "sql_cache", sql_cache)
+    monkeypatch.setattr(nodes, "few_shot", FewShotIndex(sql_cache))
+    monkeypatch.setattr(nodes, "query_log", QueryLog(str(tmp_path / "query_log.db")))
+    registry.register("sql", FakeListChatModel(responses=["SELECT ticker, close FROM prices"]))
+    registry.register("analysis", FakeListChatModel(responses=["AAPL closed at 1."]))
+    yield tmp_path
+    registry.reset()
+
+
+def test_async_graph_runs_a_turn_and_closes_its_connection(stores):
+    config = {"configurable": {"thread_id": "t1"}}
+
+    async def turn():
+        async with build_async_app(str(stores / "memory.db")) as app:
+            state_input = {"messages": [HumanMessage(content="What did AAPL close at?")], "error": "", "attempts": 0}
+            first = [event async for event in astream_turn(app, state_input, config)]
+            # Interrupted before execute_query, as the Streamlit UI expects
+            assert (await app.aget_state(config)).next == ("execute_query",)
+            rest = [event async for event in astream_turn(app, None, config)]
+            state = (await app.aget_state(config)).values
+            return first, rest, state, app.checkpointer.conn
+
+    first, rest, state, conn = asyncio.run(turn())
+    assert [node for event in first for node in event] == ["summarize", "generate_sql", "guardrail", "__interrupt__"]
+    assert [node for event in rest for node in event] == ["execute_query", "analysis"]
+    assert state["analysis"] == "AAPL closed at 1."
+    assert state["sql_query"] == "SELECT ticker, close FROM prices"
+    with pytest.raises(ValueError):
+        asyncio.run(conn.execute("SELECT 1"))
+
+
+def test_terminal_and_streamlit_graphs_share_one_topology():
+    terminal = set(build_workflow(nodes.SYNC_NODES).compile().get_graph().nodes)
+    streamlit = set(build_workflow(nodes.SYNC_NODES, human_review=False).compile().get_graph().nodes)
+    assert terminal - streamlit == {"human_review"}
@@ -0,0 +1,127 @@
+import sqlite3
+
+import pytest
+
+from db.holdings import HoldingsAccumulator
+from db.importer import TradeImporter
+from db.summaries import install_summaries
+
+SCHEMA = '''
+    CREATE TABLE instruments (ticker TEXT PRIMARY KEY, name TEXT, sector TEXT, asset_class TEXT);
+    CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT, side TEXT, qty REAL, price REAL, date TEXT, asset_class TEXT);
+    CREATE TABLE holdings (ticker TEXT PRIMARY KEY, qty REAL, avg_cost REAL);
+'''
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "investments.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(SCHEMA)
+    return path
+
+
+def _csv(tmp_path, text, name="trades.csv"):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def _rows(db_path, sql):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_imports_with_aliases_and_normalizes_rows(tmp_path, db_path):
+    path = _csv(tmp_path, (
+        "Symbol,Action,Shares,Fill Price,Trade Date\n"
+        "aapl,BOT,10,100,2024-01-02\n"
+        "AAPL,S,4,120,01/05/2024\n"
+        "MSFT,HOLD,1,1,2024-01-02\n"
+        "MSFT,BUY,1,1,not a date\n"
+    ))
+    stats = TradeImporter(db_path).import_file(path)
+
+    assert stats["rows_imported"] == 2
+    assert stats["rows_rejected"] == 2
+    assert _rows(db_path, "SELECT ticker, side, qty, date FROM transactions ORDER BY id") == [
+        ("AAPL", "BUY", 10.0, "2024-01-02"),
+        ("AAPL", "SELL", 4.0, "2024-01-05"),
+    ]
+    assert _rows(db_path, "SELECT ticker, qty FROM holdings") == [("AAPL", 6.0)]
+
+
+def test_amount_is_not_taken_as_quantity(tmp_path, db_path):
+    path = _csv(tmp_path, "ticker,side,amount,price,date\nAAPL,BUY,1000,100,2024-01-02\n")
+    with pytest.raises(ValueError, match="qty"):
+        TradeImporter(db_path).import_file(path)
+
+    TradeImporter(db_path, columns={"qty": "Amount"}).import_file(path)
+    assert _rows(db_path, "SELECT qty FROM transactions") == [(1000.0,)]
+
+
+def test_explicit_columns_must_exist(tmp_path, db_path):
+    path = _csv(tmp_path, "ticker,side,qty,price,date\nAAPL,BUY,1,100,2024-01-02\n")
+    with pytest.raises(ValueError, match="no column"):
+        TradeImporter(db_path, columns={"qty": "units_held"}).import_file(path)
+    with pytest.raises(ValueError, match="Unknown import field"):
+        TradeImporter(db_path, columns={"quantity": "qty"}).import_file(path)
+
+
+def test_resumes_after_the_last_committed_chunk(tmp_path, db_path):
+    lines = "".join(f"T{i},BUY,1,10,2024-01-02\n" for i in range(5))
+    path = _csv(tmp_path, "ticker,side,qty,price,date\n" + lines)
+    with sqlite3.connect(db_path) as conn:
+        # An earlier run that committed the first two rows
+        conn.execute("CREATE TABLE _import_checkpoints (source_key TEXT PRIMARY KEY, path TEXT, rows_done INTEGER, "
+                     "rows_rejected INTEGER, updated_at TEXT)")
+        conn.execute("INSERT INTO _import_checkpoints VALUES (?, ?, 2, 0, '')",
+                     (TradeImporter(db_path)._source_key(path), path))
+
+    stats = TradeImporter(db_path, chunk_size=2).import_file(path)
+    assert stats["resumed_from"] == 2
+    assert [t for (t,) in _rows(db_path, "SELECT ticker FROM transactions ORDER BY id")] == ["T2", "T3", "T4"]
+
+
+def test_zero_quantity_rows_are_rejected(tmp_path, db_path):
+    path = _csv(tmp_path, "ticker,side,qty,price,date\nAAPL,BUY,0,100,2024-01-02\nAAPL,BUY,-1,100,2024-01-02\n")
+    stats = TradeImporter(db_path).import_file(path)
+
+    assert stats["rows_rejected"] == 2
+    assert _rows(db_path, "SELECT COUNT(*) FROM transactions") == [(0,)]
+
+
+def test_zero_quantity_buy_on_a_flat_position_stays_flat():
+    holdings = HoldingsAccumulator()
+    holdings.apply(["AAPL"], ["BUY"], [0.0], [100.0])
+    assert holdings.positions["AAPL"] == [0.0, 0.0]
+
+    holdings.apply(["AAPL", "AAPL"], ["BUY", "BUY"], [2.0, 0.0], [10.0, 50.0])
+    assert holdings.positions["AAPL"] == [2.0, 10.0]
+
+
+def test_summary_trigger_keeps_avg_cost_on_a_zero_quantity_buy(db_path):
+    with sqlite3.connect(db_path) as conn:
+        install_summaries(conn)
+        conn.execute("INSERT INTO transactions (ticker, side, qty, price, date) VALUES ('AAPL', 'BUY', 0, 100, '2024-01-02')")
+        assert conn.execute("SELECT qty, avg_cost FROM positions").fetchall() == [(0.0, 0.0)]
+
+
+def test_ledger_is_append_only_once_summaries_are_installed(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO transactions (ticker, side, qty, price, date) VALUES ('AAPL', 'BUY', 1, 100, '2024-01-02')")
+        install_summaries(conn)
+        for sql in ("UPDATE transactions SET qty = 2", "DELETE FROM transactions"):
+            with pytest.raises(sqlite3.IntegrityError, match="append-only"):
+                conn.execute(sql)
+        assert conn.execute("SELECT qty FROM positions").fetchall() == [(1.0,)]
+
+
+def test_append_only_triggers_reach_existing_summaries(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO transactions (ticker, side, qty, price, date) VALUES ('AAPL', 'BUY', 1, 100, '2024-01-02')")
+        install_summaries(conn)
+        conn.execute("DROP TRIGGER trg_transactions_append_only_delete")
+        assert install_summaries(conn) is None
+        with pytest.raises(sqlite3.IntegrityError, match="append-only"):
+            conn.execute("DELETE FROM transactions")
@@ -0,0 +1,115 @@
+import pytest
+
+from main import parse_args
+
+
+def test_flags_parse():
+    args = parse_args(["--import", "trades.csv", "--column", "qty=Amount", "--column", "Date = Trade Day"])
+    assert args.import_path == "trades.csv"
+    assert args.columns == [("qty", "Amount"), ("date", "Trade Day")]
+    assert parse_args(["--seed-rows", "1_000_000"]).seed_rows == 1_000_000
+    assert parse_args([]).seed_rows is None
+
+
+@pytest.mark.parametrize("argv", [
+    ["--import"],
+    ["--seed-rows"],
+    ["--seed-rows", "lots"],
+    ["--seed-rows", "-5"],
+    ["--column", "qty"],
+])
+def test_bad_flags_exit_with_usage(argv, capsys):
+    with pytest.raises(SystemExit) as exc:
+        parse_args(argv)
+    assert exc.value.code == 2
+    assert "usage:" in capsys.readouterr().err
+
+
+def test_warm_up_keeps_build_errors_for_after_the_prompt(monkeypatch, capsys):
+    import agent.graph
+    import main
+
+    def broken():
+        raise RuntimeError("no API key")
+
+    monkeypatch.setattr(agent.graph, "get_app", broken)
+    main.warm_up_graph()
+    assert capsys.readouterr().out == ""
+
+    main.report_warm_up()
+    assert "Building the agent graph failed: no API key" in capsys.readouterr().out
+    main.report_warm_up()
+    assert capsys.readouterr().out == ""
+
+
+def test_warm_up_draws_a_missing_diagram_quietly(tmp_path, monkeypatch, capsys):
+    import agent.graph
+    import main
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(agent.graph, "get_app", lambda: None)
+    monkeypatch.setattr(agent.graph, "draw_graph_image", lambda path, human_review: open(path, "wb").write(b"png"))
+    main.warm_up_graph()
+    assert capsys.readouterr().out == ""
+    assert (tmp_path / agent.graph.GRAPH_FILENAME).read_bytes() == b"png"
+
+    main.report_warm_up()
+    assert "Workflow visual saved" in capsys.readouterr().out
+
+
+def test_import_times_reports_a_failure_without_stderr(monkeypatch):
+    import subprocess
+
+    from ui import startup_profile
+
+    monkeypatch.setattr(subprocess, "run", lambda *args, **kwargs: subprocess.CompletedProcess(args, 3, "", ""))
+    with pytest.raises(RuntimeError, match="status 3"):
+        startup_profile.import_times("import main")
+
+
+def test_ui_warm_up_only_draws_the_streamlit_diagram(tmp_path, monkeypatch):
+    import agent.graph
+    import main
+
+    def never(*args):
+        raise AssertionError("the --ui path must not build the CLI graph")
+
+    drawn = []
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(agent.graph, "get_app", never)
+    monkeypatch.setattr(agent.graph, "draw_graph_image", lambda path, human_review: drawn.append(human_review))
+    main.warm_up_graph(build=False)
+    assert drawn == [False]
+    assert "build_error" not in main._warm_up
+    main._warm_up.clear()
+
+
+def test_diagram_is_drawn_without_a_checkpointer(tmp_path, monkeypatch):
+    import agent.graph
+    from langchain_core.runnables.graph import Graph
+
+    monkeypatch.chdir(tmp_path)
+    nodes_seen = []
+    monkeypatch.setattr(Graph, "draw_mermaid_png", lambda self, **kwargs: nodes_seen.extend(self.nodes) or b"png")
+    agent.graph.draw_graph_image("diagram.png", human_review=False)
+
+    assert (tmp_path / "diagram.png").read_bytes() == b"png"
+    assert "execute_query" in nodes_seen and "human_review" not in nodes_seen
+    assert not (tmp_path / agent.graph.CHECKPOINT_DB).exists()
+
+
+def test_startup_profile_does_not_install_summaries(tmp_path, monkeypatch):
+    import sqlite3
+
+    import agent.graph
+    from ui import startup_profile
+
+    monkeypatch.chdir(tmp_path)
+    with sqlite3.connect("investments.db") as conn:
+        conn.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY, ticker TEXT)")
+    monkeypatch.setattr(startup_profile, "import_times", lambda statement: (0.0, {}))
+    monkeypatch.setattr(agent.graph, "get_app", lambda: None)
+    startup_profile.profile_startup()
+
+    with sqlite3.connect("investments.db") as conn:
+        assert conn.execute("SELECT name FROM sqlite_master").fetchall() == [("transactions",)]
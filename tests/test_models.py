@@ -0,0 +1,78 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agent.concurrency import llm_slot
+from agent.models import ModelRegistry
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /chat/completions endpoint, with keep-alive."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        reply = {
+            "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "SELECT 1"}}],
+            "usage": {"prompt_tokens": 7, "completion_tokens": 3, "total_tokens": 10},
+        }
+        data = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    yield server
+    server.shutdown()
+
+
+def test_sync_calls_reuse_one_model_and_connection(stub_server):
+    registry = ModelRegistry()
+    model = registry.get("sql")
+    assert registry.get("sql") is model
+    assert model.invoke("q").content == "SELECT 1"
+    model.invoke("q")
+    stats = registry.connection_stats.as_dict()
+    assert stats["requests"] == 2
+    assert stats["new_connections"] == 1
+
+
+def test_async_calls_work_across_event_loops(stub_server):
+    registry = ModelRegistry()
+
+    async def ask():
+        async with llm_slot():
+            return (await registry.get("sql").ainvoke("q")).content
+
+    # A second asyncio.run() is a new loop (a Streamlit rerun, another test)
+    assert asyncio.run(ask()) == "SELECT 1"
+    assert asyncio.run(ask()) == "SELECT 1"
+
+
+def test_registered_model_is_used_in_and_outside_loops():
+    registry = ModelRegistry()
+    fake = object()
+    registry.register("sql", fake)
+
+    async def inside():
+        return registry.get("sql")
+
+    assert registry.get("sql") is fake
+    assert asyncio.run(inside()) is fake
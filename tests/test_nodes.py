@@ -0,0 +1,123 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+from langchain_core.messages import HumanMessage
+
+import agent.nodes as nodes
+from agent.charts import ChartCache
+from agent.few_shot import FewShotIndex
+from agent.sql_cache import SQLCache
+from db.dbmanager import DatabaseManager
+from db.index_advisor import QueryLog
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "investments.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE prices (ticker TEXT, close REAL)")
+        conn.execute("INSERT INTO prices VALUES ('AAPL', 1.0)")
+    sql_cache = SQLCache(path=str(tmp_path / "sql_cache.db"))
+    monkeypatch.setattr(nodes, "db_manager", DatabaseManager(db_path))
+    monkeypatch.setattr(nodes, "sql_cache", sql_cache)
+    monkeypatch.setattr(nodes, "few_shot", FewShotIndex(sql_cache))
+    monkeypatch.setattr(nodes, "query_log", QueryLog(str(tmp_path / "query_log.db")))
+    return nodes
+
+
+def _state(**kwargs):
+    state = {
+        "messages": [HumanMessage(content="How many prices?")],
+        "sql_query": "SELECT COUNT(*) AS n FROM prices",
+        "sql_canonical": "",
+        "sql_cache_key": "key",
+        "sql_cache_hit": False,
+        "error": "",
+        "attempts": 0,
+    }
+    state.update(kwargs)
+    return state
+
+
+def test_result_cache_hits_are_not_logged(stores):
+    first = stores.execute_query_node(_state())
+    second = stores.execute_query_node(_state())
+    assert first["db_results"] == second["db_results"]
+    assert stores.db_manager.result_cache.hits == 1
+    assert [runs for _, runs, _ in stores.query_log.workload()] == [1]
+
+
+def test_a_concurrent_hit_does_not_hide_a_miss(stores, monkeypatch):
+    stores.db_manager.execute_query_stream("SELECT close FROM prices")
+    run = stores.db_manager.execute_query_stream
+
+    def with_another_session_hitting(query, **kwargs):
+        result = run(query, **kwargs)
+        run("SELECT close FROM prices")
+        return result
+
+    monkeypatch.setattr(stores.db_manager, "execute_query_stream", with_another_session_hitting)
+    stores.execute_query_node(_state())
+    assert [runs for _, runs, _ in stores.query_log.workload()] == [1]
+
+
+def test_approved_sql_is_cached_and_offered_as_an_example(stores):
+    stores.execute_query_node(_state())
+    assert stores.sql_cache.get("key") == "SELECT COUNT(*) AS n FROM prices"
+    assert [q for q, _, _ in stores.few_shot.search("how many prices")] == ["how many prices"]
+
+
+def test_failed_cached_sql_leaves_both_caches(stores):
+    stores.execute_query_node(_state())
+    update = stores.execute_query_node(_state(sql_query="SELECT nope FROM prices", sql_cache_hit=True))
+    assert update["attempts"] == 1
+    assert stores.sql_cache.get("key") is None
+    assert stores.few_shot.search("how many prices") == []
+
+
+def test_rejection_invalidates_a_cached_hit(stores):
+    stores.execute_query_node(_state())
+    update = stores.rejection_update(_state(sql_cache_hit=True), "use the holdings table")
+    assert update["error"] == "User rejected the query. Feedback: use the holdings table"
+    assert update["sql_cache_hit"] is False
+    assert stores.sql_cache.get("key") is None
+    assert stores.few_shot.search("how many prices") == []
+
+
+def test_chart_inference_errors_fall_back_to_the_llm(monkeypatch):
+    frame = object()
+    monkeypatch.setattr(nodes, "load_result_frame", lambda state: frame)
+
+    def broken(df):
+        raise AttributeError("odd frame")
+
+    monkeypatch.setattr(nodes, "infer_spec", broken)
+    assert nodes._template_chart(_state()) == (frame, None, None)
+
+
+def test_summary_table_hint_only_when_the_tables_exist(stores):
+    def system_prompt():
+        snapshot = stores.db_manager.schema_snapshot()
+        return snapshot.render("sql_prompt", nodes.build_sql_prompt).messages[0].content
+
+    assert "sector_exposure_daily" not in system_prompt()
+    with sqlite3.connect(stores.db_manager.db_path) as conn:
+        conn.execute("CREATE TABLE positions (ticker TEXT)")
+        conn.execute("CREATE TABLE sector_exposure_daily (sector TEXT)")
+    assert "sector_exposure_daily" in system_prompt()
+
+
+def test_same_result_is_charted_once(monkeypatch):
+    frame = pd.DataFrame({"ticker": ["AAPL", "MSFT"], "pnl": [10.0, -4.0]})
+    monkeypatch.setattr(nodes, "load_result_frame", lambda state: frame)
+    monkeypatch.setattr(nodes, "chart_cache", ChartCache())
+    renders = []
+    monkeypatch.setattr(nodes, "render_chart", lambda df, spec: renders.append(spec.kind) or b"png")
+
+    _, _, first = nodes._template_chart(_state(analysis="PnL by ticker."))
+    _, _, second = nodes._template_chart(_state(analysis="PnL by ticker."))
+
+    assert renders == ["bar"]
+    assert nodes.chart_cache.stats()["hits"] == 1
+    assert first == second and nodes.chart_cache.get(first["chart_key"]) == b"png"
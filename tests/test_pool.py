@@ -0,0 +1,109 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db.dbmanager import DatabaseManager
+from db.pool import ConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "investments.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE prices (ticker TEXT, close REAL)")
+        conn.execute("INSERT INTO prices VALUES ('AAPL', 1.0)")
+    return path
+
+
+def _write(path, sql):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(sql)
+    conn.close()
+
+
+def test_connections_are_read_only_and_reused(db_path):
+    pool = ConnectionPool(db_path, max_size=2)
+    with pool.connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM prices")
+        # Nested use on one thread gets the same connection
+        with pool.connection() as nested:
+            assert nested is conn
+    with pool.connection():
+        pass
+    assert pool.stats()["misses"] == 1
+    assert pool.stats()["hits"] == 1
+
+
+def test_checkout_times_out_when_the_pool_is_exhausted(db_path):
+    pool = ConnectionPool(db_path, max_size=1, timeout=0.05)
+    holding, release = threading.Event(), threading.Event()
+
+    def hold():
+        with pool.connection():
+            holding.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    holding.wait()
+    try:
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection():
+                pass
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_data_version_changes_on_commits_from_other_connections(db_path):
+    pool = ConnectionPool(db_path)
+    first = pool.data_version()
+    assert pool.data_version() == first
+
+    _write(db_path, "INSERT INTO prices VALUES ('MSFT', 2.0)")
+    assert pool.data_version() != first
+
+
+def test_result_cache_sees_writes_after_a_wal_checkpoint(db_path):
+    db = DatabaseManager(db_path)
+    query = "SELECT COUNT(*) AS n FROM prices"
+    assert db.execute_query(query) == [{"n": 1}]
+
+    # With the WAL checkpointed and truncated, the file looks as before the write
+    _write(db_path, "INSERT INTO prices VALUES ('MSFT', 2.0)")
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+    assert db.execute_query(query) == [{"n": 2}]
+    assert db.result_cache.hits == 0
+    assert db.execute_query(query) == [{"n": 2}]
+    assert db.result_cache.hits == 1
+
+
+def test_from_cache_is_set_per_call(db_path):
+    db = DatabaseManager(db_path)
+    query = "SELECT COUNT(*) AS n FROM prices"
+    first = db.execute_query_stream(query)
+    second = db.execute_query_stream(query)
+    third = db.execute_query_stream("select count(*) as n from prices")
+
+    assert not first.from_cache
+    assert second.from_cache and third.from_cache
+    # Hits are copies; the cached result itself is never flagged
+    assert second is not first and second.rows is first.rows
+    assert not first.from_cache
+
+
+def test_missing_database_fails_instead_of_being_created(tmp_path):
+    path = tmp_path / "missing.db"
+    pool = ConnectionPool(str(path))
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.connection():
+            pass
+    assert not path.exists()
+    assert pool.stats()["size"] == 0
@@ -0,0 +1,48 @@
+import sqlite3
+
+from db.result_cache import CachedResult, ResultCache
+from db.results import QueryResult
+
+
+def _result(rows):
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.execute("SELECT * FROM (SELECT 1 AS n, 'x' AS s) " + " ".join(["UNION ALL SELECT 1, 'x'"] * (rows - 1)))
+    return QueryResult.from_cursor(cursor)
+
+
+def test_hits_need_the_same_data_version():
+    cache = ResultCache(max_bytes=1 << 20)
+    result = _result(3)
+    cache.put(("select n", 1), "SELECT n", result)
+
+    assert cache.get(("select n", 1)).result is result
+    assert cache.get(("select n", 2)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_by_bytes():
+    one = _result(50)
+    cache = ResultCache(max_bytes=int(CachedResult("a", one).nbytes * 2.5), max_entry_bytes=1 << 20)
+    cache.put("a", "a", one)
+    cache.put("b", "b", _result(50))
+    cache.get("a")
+    cache.put("c", "c", _result(50))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oversized_results_are_not_cached():
+    cache = ResultCache(max_bytes=1 << 20, max_entry_bytes=10)
+    cache.put("a", "a", _result(5))
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_clear_drops_everything():
+    cache = ResultCache(max_bytes=1 << 20)
+    cache.put("a", "a", _result(1))
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
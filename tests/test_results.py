@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+from agent.charts import infer_spec
+from db.result_store import ResultStore
+from db.results import QueryResult, unique_columns
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (ticker TEXT, qty REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [("AAPL", 1.0), ("MSFT", 2.0), ("NVDA", None)])
+    yield conn
+    conn.close()
+
+
+def _result(conn, sql, **kwargs):
+    return QueryResult.from_cursor(conn.execute(sql), **kwargs)
+
+
+def test_unique_columns_suffixes_repeats():
+    assert unique_columns(["ticker", "ticker", "ticker_1", "qty"]) == ["ticker", "ticker_1", "ticker_1_1", "qty"]
+
+
+def test_duplicate_column_names_are_kept_apart(conn):
+    result = _result(conn, "SELECT a.ticker, b.ticker, a.qty FROM t a JOIN t b ON b.ticker > a.ticker")
+
+    assert result.columns == ["ticker", "ticker_1", "qty"]
+    assert list(result.stats) == result.columns
+    assert list(result.columnar()) == result.columns
+    frame = result.to_frame()
+    assert list(frame.columns) == result.columns
+    infer_spec(frame)  # raised on the duplicated name
+
+    renamed = result.with_columns(["x", "x", "qty"])
+    assert renamed.columns == ["x", "x_1", "qty"]
+    assert renamed.stats["qty"] == result.stats["qty"]
+
+
+def test_stats_cover_rows_past_the_kept_ones(conn):
+    result = _result(conn, "SELECT ticker, qty FROM t", max_rows=1)
+
+    assert result.truncated and result.complete
+    assert result.rows == [("AAPL", 1.0)]
+    assert result.row_count == 3
+    assert result.stats["qty"] == {"min": 1.0, "max": 2.0, "mean": 1.5, "nulls": 1}
+    assert result.summary().startswith("[TRUNCATED] Showing 1 of 3 rows")
+
+
+def test_row_cap_stops_reading(conn):
+    result = _result(conn, "SELECT ticker FROM t", row_cap=2, batch_size=1)
+
+    assert not result.complete
+    assert result.row_count == 2
+    assert "row cap" in result.summary()
+
+
+def test_columnar_types(conn):
+    arrays = _result(conn, "SELECT ticker, qty, 1 AS one FROM t").columnar()
+
+    assert arrays["ticker"].dtype == object
+    assert arrays["qty"].dtype.kind == "f"
+    assert arrays["one"].dtype.kind == "i"
+
+
+def test_result_store_evicts_least_recently_used(conn):
+    result = _result(conn, "SELECT ticker, qty FROM t")
+    store = ResultStore(max_bytes=result.nbytes * 2)
+    first = store.put(result)
+    second = store.put(result)
+    assert store.get(first) is result  # now the most recent
+
+    store.put(result)
+    assert store.get(second) is None
+    assert store.get(first) is result
+    assert store.get(None) is None
+    assert store.stats()["results"] == 2
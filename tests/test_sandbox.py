@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from agent.sandbox import ChartSandboxPool, SandboxError
+
+DRAW = "plt.bar(df['ticker'], df['qty'])"
+FRAME = pd.DataFrame({"ticker": ["AAPL", "MSFT"], "qty": [3, 5]})
+
+
+@pytest.fixture
+def pool():
+    pool = ChartSandboxPool(workers=1, cpu_seconds=5, wall_seconds=2)
+    yield pool
+    pool.close()
+
+
+def test_renders_png(pool):
+    assert pool.render(DRAW, FRAME).startswith(b"\x89PNG")
+
+
+def test_errors_in_the_code_keep_the_worker(pool):
+    with pytest.raises(SandboxError) as exc:
+        pool.render("raise ValueError('bad column')", FRAME)
+    assert exc.value.reason == "error"
+    worker = pool._workers[0]
+    pool.render(DRAW, FRAME)
+    assert pool._workers == [worker]
+
+
+def test_overrunning_worker_is_replaced(pool):
+    with pytest.raises(SandboxError) as exc:
+        pool.render("import time\nwhile True: time.sleep(0.1)", FRAME)
+    assert exc.value.reason == "timeout"
+    assert len(pool._workers) == 1
+    assert pool.render(DRAW, FRAME).startswith(b"\x89PNG")
+
+
+def test_unexpected_failures_become_sandbox_errors(pool):
+    # Lambdas do not pickle, so sending the job fails in this process
+    unpicklable = pd.DataFrame({"fn": [lambda: None]})
+    with pytest.raises(SandboxError) as exc:
+        pool.render(DRAW, unpicklable)
+    assert exc.value.reason == "error"
+    assert pool.render(DRAW, FRAME).startswith(b"\x89PNG")
+
+
+def test_dead_worker_is_not_requeued_when_its_replacement_fails(pool, monkeypatch):
+    pool.start()
+    dead = pool._workers[0]
+
+    def no_spawn():
+        raise OSError("fork failed")
+
+    monkeypatch.setattr(pool, "_spawn", no_spawn)
+    with pytest.raises(SandboxError):
+        pool.render("import time\nwhile True: time.sleep(0.1)", FRAME)
+    assert pool._workers == [] and pool._idle.empty()
+    assert not dead.process.is_alive()
+
+    monkeypatch.undo()
+    assert pool.render(DRAW, FRAME).startswith(b"\x89PNG")
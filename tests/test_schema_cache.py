@@ -0,0 +1,46 @@
+import sqlite3
+
+import pytest
+
+from db.dbmanager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "investments.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE prices (ticker TEXT, close REAL)")
+    return DatabaseManager(path)
+
+
+def _execute(path, sql):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(sql)
+    conn.close()
+
+
+def test_snapshot_is_reused_until_the_schema_changes(db):
+    first = db.schema_snapshot()
+    assert db.schema_snapshot() is first
+
+    # A data write changes the files but not the schema
+    _execute(db.db_path, "INSERT INTO prices VALUES ('AAPL', 1.0)")
+    assert db.schema_snapshot() is first
+    assert db.schema_cache.stats()["schema_reads"] == 1
+
+    _execute(db.db_path, "CREATE TABLE dividends (ticker TEXT, amount REAL)")
+    second = db.schema_snapshot()
+    assert second is not first
+    assert "dividends" in second.text and "dividends" not in first.text
+
+
+def test_rendered_values_live_as_long_as_their_snapshot(db):
+    builds = []
+    render = lambda snapshot: builds.append(snapshot.version) or len(builds)
+
+    assert db.schema_snapshot().render("prompt", render) == 1
+    assert db.schema_snapshot().render("prompt", render) == 1
+    _execute(db.db_path, "CREATE INDEX idx_prices_ticker ON prices (ticker)")
+    assert db.schema_snapshot().render("prompt", render) == 2
@@ -0,0 +1,103 @@
+import pytest
+
+from db.sqlguard import GuardrailViolation, SQLGuard, schema_columns
+
+DDL = """
+CREATE TABLE instruments (ticker TEXT PRIMARY KEY, name TEXT, sector TEXT, asset_class TEXT);
+CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT, side TEXT, qty REAL, price REAL, date TEXT, asset_class TEXT);
+"""
+
+
+@pytest.fixture
+def guard():
+    return SQLGuard(schema_columns(DDL))
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM transactions",
+    "SELECT * FROM main.transactions",
+    'SELECT * FROM "transactions"',
+    "SELECT * FROM [transactions] t WHERE t.qty > 0",
+    "SELECT t.ticker FROM transactions AS \"t\"",
+    "SELECT i.sector, SUM(t.qty) FROM transactions t JOIN instruments i ON i.ticker = t.ticker GROUP BY i.sector",
+    "WITH big AS (SELECT * FROM transactions WHERE qty > 100) SELECT * FROM big",
+    "SELECT replace(name, 'a', 'b') FROM instruments",
+    "SELECT 'DROP TABLE x' AS s FROM instruments",
+    "SELECT * FROM (SELECT ticker FROM transactions) AS a, instruments i WHERE i.ticker = a.ticker",
+    "SELECT ticker, SUM(qty * price) AS notional FROM transactions GROUP BY ticker ORDER BY notional DESC LIMIT 5",
+    "SELECT ticker, COUNT(*) trades FROM transactions WHERE date >= date('now', '-30 days') GROUP BY ticker HAVING trades > 2",
+    "SELECT strftime('%Y', date) AS year, SUM(CASE WHEN side = 'BUY' THEN qty ELSE -qty END) FROM transactions GROUP BY year",
+    "SELECT CAST(qty AS INTEGER), ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC) AS rn FROM transactions",
+    "WITH totals(tk, total) AS (SELECT ticker, SUM(qty) FROM transactions GROUP BY ticker) SELECT tk, total FROM totals",
+    "SELECT name FROM instruments WHERE sector IS NOT NULL AND name LIKE '%Inc%' COLLATE NOCASE",
+    "SELECT value FROM json_each('[1, 2]')",
+    "SELECT ticker FROM instruments WHERE EXISTS (SELECT 1 FROM transactions t WHERE t.ticker = instruments.ticker)",
+    "SELECT a.ticker FROM transactions a JOIN instruments b USING (ticker), instruments c WHERE c.ticker = a.ticker",
+])
+def test_allows_reads_of_known_tables(guard, sql):
+    assert guard.check(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM sqlite_master",
+    'SELECT * FROM "sqlite_master"',
+    "SELECT * FROM [sqlite_master]",
+    "SELECT * FROM `sqlite_master`",
+    'SELECT * FROM "_import_checkpoints"',
+    "SELECT * FROM temp.transactions",
+    'SELECT * FROM "main"."sqlite_master"',
+    "SELECT * FROM transactions t JOIN \"sqlite_master\" m ON 1 = 1",
+    "SELECT * FROM transactions, [sqlite_master]",
+    "SELECT * FROM (SELECT 1) AS a, sqlite_master",
+    "SELECT * FROM transactions t JOIN (SELECT 1) x ON 1, sqlite_master",
+    "SELECT * FROM (SELECT 1) a JOIN (SELECT 2) b ON 1 = 1, (SELECT 3) c, sqlite_master m",
+    "SELECT (SELECT COUNT(*) FROM (SELECT 1), sqlite_master) FROM transactions",
+    "SELECT * FROM 1",
+])
+def test_rejects_unknown_tables_however_they_are_quoted(guard, sql):
+    with pytest.raises(GuardrailViolation, match="unknown table"):
+        guard.check(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM transactions",
+    "SELECT * FROM transactions; DROP TABLE transactions",
+    "WITH x AS (SELECT 1) INSERT INTO transactions SELECT * FROM x",
+    "PRAGMA table_info(transactions)",
+])
+def test_rejects_writes_and_multiple_statements(guard, sql):
+    with pytest.raises(GuardrailViolation):
+        guard.check(sql)
+
+
+def test_rejects_unknown_qualified_column(guard):
+    with pytest.raises(GuardrailViolation, match="unknown column t.quantity"):
+        guard.check("SELECT t.quantity FROM transactions t")
+
+
+def test_canonical_text_ignores_case_and_whitespace(guard):
+    assert guard.check("select  *\nFROM Transactions") == guard.check("SELECT * FROM transactions;")
+
+
+def test_clean_strips_fences():
+    assert SQLGuard.clean("```sql\nSELECT 1;\n```") == "SELECT 1"
+
+
+@pytest.mark.parametrize("sql, column", [
+    ("SELECT quantity FROM transactions", "quantity"),
+    ("SELECT ticker FROM transactions WHERE sector = 'Tech'", "sector"),
+    ('SELECT "amount" FROM transactions', "amount"),
+    ("SELECT name FROM (SELECT ticker FROM transactions)", "name"),
+])
+def test_rejects_unknown_unqualified_columns(guard, sql, column):
+    with pytest.raises(GuardrailViolation, match=f"unknown column {column}"):
+        guard.check(sql)
+
+
+@pytest.mark.parametrize("ddl", [
+    "CREATE TABLE",
+    "CREATE TABLE IF NOT",
+    "CREATE TABLE t (a TEXT, b",
+])
+def test_schema_columns_tolerates_truncated_ddl(ddl):
+    schema_columns(ddl)
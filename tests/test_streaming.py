@@ -0,0 +1,54 @@
+from typing import Annotated, List, TypedDict
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import BaseMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph, add_messages
+
+from agent.streaming import TurnTimer, stream_turn
+
+
+class _State(TypedDict):
+    messages: Annotated[List[BaseMessage], add_messages]
+    analysis: str
+
+
+def _app():
+    sql_model = FakeListChatModel(responses=["SELECT 1"])
+    analysis_model = FakeListChatModel(responses=["Up 5% this year"])
+    summary_model = FakeListChatModel(responses=["not streamed"])
+
+    def summarize(state):
+        summary_model.invoke(state["messages"])
+        return {}
+
+    def generate_sql(state):
+        return {"messages": [sql_model.invoke(state["messages"])]}
+
+    def analysis(state):
+        return {"analysis": analysis_model.invoke(state["messages"]).content}
+
+    graph = StateGraph(_State)
+    for name, node in (("summarize", summarize), ("generate_sql", generate_sql), ("analysis", analysis)):
+        graph.add_node(name, node)
+    graph.add_edge(START, "summarize")
+    graph.add_edge("summarize", "generate_sql")
+    graph.add_edge("generate_sql", "analysis")
+    graph.add_edge("analysis", END)
+    return graph.compile()
+
+
+def test_tokens_arrive_in_order_before_their_node_update():
+    timer = TurnTimer()
+    events = list(stream_turn(_app(), {"messages": [HumanMessage(content="How did AAPL do?")]}, {}, timer))
+
+    tokens = [(node, text) for kind, node, text in events if kind == "token"]
+    assert {node for node, _ in tokens} == {"generate_sql", "analysis"}
+    assert "".join(text for node, text in tokens if node == "generate_sql") == "SELECT 1"
+    assert "".join(text for node, text in tokens if node == "analysis") == "Up 5% this year"
+
+    order = [(kind, node) for kind, node, _ in events]
+    last_sql_token = max(i for i, e in enumerate(order) if e == ("token", "generate_sql"))
+    first_analysis_token = order.index(("token", "analysis"))
+    assert last_sql_token < order.index(("update", "generate_sql")) < first_analysis_token
+    assert max(i for i, e in enumerate(order) if e == ("token", "analysis")) < order.index(("update", "analysis"))
+    assert list(timer.first_token) == ["generate_sql", "analysis"]
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage
+
+from agent.models import registry
+from agent.summarizer import SUMMARY_ID, SUMMARY_PREFIX, RollingSummarizer, count_tokens
+
+
+class CountingModel(FakeListChatModel):
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+
+@pytest.fixture
+def model():
+    model = CountingModel(responses=["they asked about AAPL"])
+    registry.register("summary", model)
+    yield model
+    registry.reset()
+
+
+def _history(n, words=50):
+    messages = []
+    for i in range(n):
+        cls = HumanMessage if i % 2 == 0 else AIMessage
+        messages.append(cls(content=" ".join(["word"] * words), id=f"m{i}"))
+    return messages
+
+
+def test_under_the_budget_nothing_is_summarized(model):
+    messages = _history(4)
+    summarizer = RollingSummarizer(token_budget=count_tokens(messages))
+
+    assert summarizer.update(messages, "t1") == {}
+    assert model.calls == 0
+
+
+def test_past_the_hard_limit_the_summary_is_folded_in(model):
+    messages = _history(6)
+    summarizer = RollingSummarizer(token_budget=count_tokens(messages) - 1, hard_limit=1, keep_recent=2)
+
+    update = summarizer.update(messages, "t1")["messages"]
+    assert isinstance(update[0], RemoveMessage)
+    assert isinstance(update[1], SystemMessage) and update[1].id == SUMMARY_ID
+    assert update[1].content == SUMMARY_PREFIX + "they asked about AAPL"
+    assert [m.id for m in update[2:]] == ["m4", "m5"]
+    assert model.calls == 1
+
+
+def test_a_running_summary_does_not_hold_up_the_turn(model, monkeypatch):
+    release = threading.Event()
+    summarize = RollingSummarizer._summarize
+    monkeypatch.setattr(RollingSummarizer, "_summarize", lambda self, *a: release.wait() and summarize(self, *a))
+    messages = _history(6)
+    summarizer = RollingSummarizer(token_budget=1, hard_limit=10 ** 9)
+
+    assert summarizer.update(messages, "t1") == {}
+    release.set()
+    summarizer._jobs["t1"].result()
+    # The finished summary is swapped in on the next turn
+    assert summarizer.update(messages, "t1")["messages"][1].id == SUMMARY_ID
+    assert model.calls == 1
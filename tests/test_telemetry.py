@@ -0,0 +1,104 @@
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from agent.telemetry import Telemetry, record_cache_hit, record_db
+
+
+class UsageModel(FakeListChatModel):
+    """Fake chat model that reports token usage like ChatOpenAI does."""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._call(messages, stop, run_manager, **kwargs)
+        message = AIMessage(content=text, usage_metadata={"input_tokens": 1_000_000, "output_tokens": 234_567, "total_tokens": 1_234_567})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _config(thread_id="t1"):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_spans_record_tokens_db_and_cache_hits():
+    telemetry = Telemetry(jsonl_path="")
+    model = UsageModel(responses=["SELECT 1"])
+
+    def generate_sql(state):
+        model.invoke("question")
+        return {}
+
+    def execute_query(state):
+        record_db(12.5, 1_234_567)
+        record_cache_hit("result")
+        return {}
+
+    nodes = telemetry.instrument_nodes({"summarize": lambda state: {}, "generate_sql": generate_sql, "execute_query": execute_query})
+    for name in ("summarize", "generate_sql", "execute_query"):
+        nodes[name]({"attempts": 0}, _config())
+
+    spans = telemetry.turn("t1")
+    assert [s.node for s in spans] == ["summarize", "generate_sql", "execute_query"]
+    assert (spans[1].llm_calls, spans[1].prompt_tokens, spans[1].completion_tokens) == (1, 1_000_000, 234_567)
+    assert (spans[2].db_ms, spans[2].rows, spans[2].cache_hits) == (12.5, 1_234_567, ["result"])
+
+
+def test_turns_start_at_the_entry_node():
+    telemetry = Telemetry(jsonl_path="")
+    nodes = telemetry.instrument_nodes({"summarize": lambda state: {}, "analysis": lambda state: {}})
+    for _ in range(2):
+        nodes["summarize"]({}, _config())
+        nodes["analysis"]({}, _config())
+    assert [s.turn for s in telemetry.turn("t1")] == [2, 2]
+    assert len(telemetry.turn("t1", turn=1)) == 2
+
+
+def test_config_is_passed_only_to_nodes_that_take_it():
+    telemetry = Telemetry(jsonl_path="")
+    seen = []
+    node = telemetry.instrument("summarize", lambda state, config: seen.append(config["configurable"]["thread_id"]))
+    node({}, _config("abc"))
+    assert seen == ["abc"]
+
+
+def test_async_nodes_and_errors():
+    telemetry = Telemetry(jsonl_path="")
+
+    async def analysis(state):
+        raise ValueError("boom")
+
+    node = telemetry.instrument("analysis", analysis)
+    assert asyncio.iscoroutinefunction(node)
+    try:
+        asyncio.run(node({}, _config()))
+    except ValueError:
+        pass
+    assert telemetry.turn("t1")[0].status == "error"
+    assert 'agent_node_runs_total{node="analysis",status="error"} 1' in telemetry.exposition()
+
+
+def test_exposition_keeps_large_counters_exact():
+    telemetry = Telemetry(jsonl_path="")
+    node = telemetry.instrument("execute_query", lambda state: record_db(1500.0, 1_234_567))
+    node({}, _config())
+    text = telemetry.exposition()
+    assert 'agent_db_rows_total{node="execute_query"} 1234567' in text
+    assert 'agent_db_seconds_total{node="execute_query"} 1.5' in text
+    assert "e+" not in text
+    assert 'agent_node_duration_seconds_bucket{node="execute_query",le="+Inf"} 1' in text
+
+
+def test_openmetrics_names_counter_families_without_total():
+    telemetry = Telemetry(jsonl_path="")
+    telemetry.instrument("guardrail", lambda state: {})({}, _config())
+    text = telemetry.exposition(openmetrics=True)
+    assert "# TYPE agent_node_runs counter" in text
+    assert 'agent_node_runs_total{node="guardrail",status="ok"} 1' in text
+    assert text.endswith("# EOF\n")
+
+
+def test_jsonl_export(tmp_path):
+    telemetry = Telemetry(jsonl_path=str(tmp_path / "live.jsonl"))
+    telemetry.instrument("guardrail", lambda state: {})({}, _config())
+    assert telemetry.write_jsonl(tmp_path / "all.jsonl") == 1
+    assert (tmp_path / "live.jsonl").read_text() == (tmp_path / "all.jsonl").read_text()
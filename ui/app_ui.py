@@ -7,6 +7,9 @@ from langchain_core.messages import HumanMessage, AIMessage
 # 1. SETUP PATHS
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from agent.streamlit.graph import app
+from agent.charts import chart_cache
+from agent.streaming import stream_turn, TurnTimer
+from agent.checkpoints import CheckpointCompactor
 
 # 2. SESSION STATE INITIALIZATION
 if "thread_id" not in st.session_state:
@@ -16,6 +19,12 @@ if "messages_ui" not in st.session_state:
 
 config = {"configurable": {"thread_id": st.session_state.thread_id}}
 
+
+@st.cache_resource
+def get_compactor():
+    # One per server process: every session shares the checkpointer and agent_memory.db
+    return CheckpointCompactor(app.checkpointer)
+
 # 3. PAGE CONFIG
 st.set_page_config(page_title="Investment Analyst", page_icon="💹", layout="wide")
 st.title("💹 Agentic Investment Analyst")
@@ -40,6 +49,11 @@ for msg in st.session_state.messages_ui:
         st.markdown(msg["content"])
         if "sql" in msg:
             st.code(msg["sql"], language="sql")
+        if msg.get("chart_key"):
+            # Served from the in-memory chart cache; an evicted chart is just not shown again
+            png = chart_cache.get(msg["chart_key"])
+            if png:
+                st.image(png)
 
 # 6. DYNAMIC LOGIC GATE: Review Mode vs. Input Mode
 snapshot = app.get_state(config)
@@ -50,27 +64,47 @@ if snapshot.next:
         st.warning("🤖 **Review Required:** The agent has prepared a query.")
         proposed_sql = snapshot.values.get("sql_query", "No SQL found.")
         st.code(proposed_sql, language="sql")
+        if snapshot.values.get("error"):
+            # Refused by the guardrail: approving sends it back for a rewrite
+            st.error(snapshot.values["error"])
 
         col1, col2 = st.columns(2)
         with col1:
             if st.button("✅ Approve & Execute", use_container_width=True, type="primary"):
                 with st.status("🚀 Running Query...", expanded=True) as status:
-                    for event in app.stream(None, config=config):
-                        for node_name, output in event.items():
-                            status.write(f"✔️ Finished: {node_name}")
-                            if node_name == "analysis" and "analysis" in output:
-                                analysis_text = output["analysis"]
-                                st.session_state.messages_ui.append({"role": "assistant", "content": analysis_text})
+                    timer = TurnTimer()
+                    analysis_box, analysis_text = st.empty(), ""
+                    for kind, node_name, output in stream_turn(app, None, config, timer):
+                        if kind == "token":
+                            # Write the analysis as the tokens arrive
+                            if node_name == "analysis":
+                                analysis_text += output
+                                analysis_box.markdown(analysis_text + "▌")
+                            continue
+                        status.write(f"✔️ Finished: {node_name}")
+                        if node_name == "analysis" and output and "analysis" in output:
+                            analysis_text = output["analysis"]
+                            analysis_box.markdown(analysis_text)
+                            st.session_state.messages_ui.append({"role": "assistant", "content": analysis_text})
+                        if node_name == "visualization" and output and output.get("chart_key"):
+                            st.session_state.messages_ui[-1]["chart_key"] = output["chart_key"]
+                    if timer.first_token:
+                        status.write(f"⏱️ Time to first token: {timer.report()}")
+                # The turn is over; retention for agent_memory.db runs in the background
+                get_compactor().maybe_compact()
                 st.rerun()
 
         with col2:
             feedback = st.text_input("Feedback / Fix instructions:", key="fb_input")
             if st.button("❌ Reject & Edit", use_container_width=True):
-                # Update state with feedback and resume to let the agent rewrite
-                fb_msg = f"Rejected. Feedback: {feedback if feedback else 'Rewrite this query.'}"
-                app.update_state(config, {"messages": [HumanMessage(content=fb_msg)]})
-                # Resume execution to move past the breakpoint
-                for event in app.stream(None, config=config):
+                from agent.nodes import rejection_update
+
+                # Skip execute_query: the update is applied as the summarize node, so the
+                # graph resumes at generate_sql and the rejected SQL is neither run nor cached
+                update = rejection_update(snapshot.values, feedback or "Rewrite this query.")
+                app.update_state(config, update, as_node="summarize")
+                # Runs up to the breakpoint before the rewritten query
+                for _ in stream_turn(app, None, config):
                     pass
                 st.rerun()
 
@@ -85,25 +119,45 @@ else:
         # Start streaming the Agent
         with st.chat_message("assistant"):
             with st.status("Analyst working...", expanded=True) as status:
-                input_state = {"messages": [HumanMessage(content=prompt)]}
+                input_state = {"messages": [HumanMessage(content=prompt)], "error": "", "attempts": 0}
                 current_sql = ""
-
-                for event in app.stream(input_state, config=config):
-                    for node_name, output in event.items():
-                        status.write(f"✔️ {node_name} finished")
-                        if output and isinstance(output, dict):
-                            if "sql_query" in output:
-                                current_sql = output["sql_query"]
-                                status.code(current_sql, language="sql")
-                            if "analysis" in output:
-                                analysis_text = output["analysis"]
-                                st.markdown(analysis_text)
-                                st.session_state.messages_ui.append({
-                                    "role": "assistant",
-                                    "content": analysis_text,
-                                    "sql": current_sql
-                                })
+                timer = TurnTimer()
+                sql_box, streamed_sql = status.empty(), ""
+                analysis_box, analysis_text = st.empty(), ""
+
+                for kind, node_name, output in stream_turn(app, input_state, config, timer):
+                    if kind == "token":
+                        # Tokens are written as they arrive: SQL into the status box,
+                        # the analysis into the chat message
+                        if node_name == "generate_sql":
+                            streamed_sql += output
+                            sql_box.code(streamed_sql, language="sql")
+                        else:
+                            analysis_text += output
+                            analysis_box.markdown(analysis_text + "▌")
+                        continue
+
+                    status.write(f"✔️ {node_name} finished")
+                    if output and isinstance(output, dict):
+                        if "sql_query" in output:
+                            current_sql = output["sql_query"]
+                            sql_box.code(current_sql, language="sql")
+                        if "analysis" in output:
+                            analysis_text = output["analysis"]
+                            analysis_box.markdown(analysis_text)
+                            st.session_state.messages_ui.append({
+                                "role": "assistant",
+                                "content": analysis_text,
+                                "sql": current_sql
+                            })
+                        png = chart_cache.get(output["chart_key"]) if output.get("chart_key") else None
+                        if png:
+                            st.session_state.messages_ui[-1]["chart_key"] = output["chart_key"]
+                            st.image(png)
+                if timer.first_token:
+                    status.write(f"⏱️ Time to first token: {timer.report()}")
 
             # Check if we hit an interrupt during the stream
             if app.get_state(config).next:
-                st.rerun()
\ No newline at end of file
+                st.rerun()
+            get_compactor().maybe_compact()
\ No newline at end of file
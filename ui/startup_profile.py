@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# What the terminal app imports before the prompt, and what the background build adds
+PROMPT_IMPORTS = "import main, db.dbmanager, ui.terminal"
+GRAPH_IMPORTS = "import agent.graph; agent.graph.get_app()"
+
+
+def import_times(statement):
+    """
+    Runs `statement` in a fresh interpreter under `-X importtime` and returns
+    (wall seconds, {top-level package: self microseconds}).
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"{statement!r} exited with status {result.returncode}")
+
+    per_package = defaultdict(int)
+    for line in result.stderr.splitlines():
+        # "import time:       412 |       1290 |   langgraph.graph"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        per_package[name.strip().split(".")[0]] += int(self_us)
+    return wall, per_package
+
+
+def _phase(label, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    console.print(f"[dim]⏱️  {label}: {elapsed * 1000:.0f}ms[/dim]")
+    return elapsed
+
+
+def profile_startup(top=15):
+    """Prints where a cold start spends its time: until the prompt, and in the background graph build."""
+    console.print("[bold cyan]🚦 Profiling startup (fresh interpreters)...[/bold cyan]")
+    prompt_wall, prompt_packages = import_times(PROMPT_IMPORTS)
+    graph_wall, graph_packages = import_times(f"{PROMPT_IMPORTS}; {GRAPH_IMPORTS}")
+
+    table = Table(title=f"📦 Import time by package (top {top})", show_header=True, header_style="bold cyan")
+    table.add_column("Package")
+    table.add_column("Before prompt (ms)", justify="right")
+    table.add_column("Background build (ms)", justify="right")
+    extra = {name: us - prompt_packages.get(name, 0) for name, us in graph_packages.items()}
+    for name in sorted(graph_packages, key=graph_packages.get, reverse=True)[:top]:
+        table.add_row(name, f"{prompt_packages.get(name, 0) / 1000:.1f}", f"{max(extra[name], 0) / 1000:.1f}")
+    table.add_row(
+        "[bold]total[/bold]",
+        f"[bold]{sum(prompt_packages.values()) / 1000:.0f}[/bold]",
+        f"[bold]{sum(max(v, 0) for v in extra.values()) / 1000:.0f}[/bold]",
+    )
+    console.print(table)
+    console.print(f"[dim]Interpreter + prompt imports: {prompt_wall * 1000:.0f}ms wall; "
+                  f"with the graph built: {graph_wall * 1000:.0f}ms[/dim]")
+
+    # The same steps in this process, in the order main() runs them; the
+    # health check is timed on its "keep the database" path, without the
+    # question, and only reads: profiling never installs the summary tables
+    from db.dbmanager import DatabaseManager
+    from db.summaries import summaries_installed
+    db = DatabaseManager()
+    if os.path.exists(db.db_path):
+        with db.pool.connection() as conn:
+            installed = summaries_installed(conn)
+        checked = _phase("DB health check", db.display_stats)
+        if not installed:
+            console.print("[yellow]⚠️ Summary tables are missing: the next start builds them (not timed here)[/yellow]")
+    else:
+        checked = _phase("DB initialization (first run)", db.check_db_health)
+    console.print(f"[bold green]➔ Time to first prompt ≈ {(prompt_wall + checked) * 1000:.0f}ms[/bold green]")
+
+    from agent.graph import get_app
+    _phase("Graph build (background, overlaps the first question)", get_app)
@@ -1,11 +1,66 @@
-from langchain_core.messages import HumanMessage
+from io import BytesIO
+
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich.live import Live
+from rich.markdown import Markdown
+
+from agent.checkpoints import CheckpointCompactor
+from agent.streaming import stream_turn, TurnTimer
 
 console = Console()
 
+
+def print_waterfall(spans):
+    """Per-node latency of one turn as a waterfall, with what each node spent."""
+    if not spans:
+        return
+    start = spans[0].started
+    total_ms = max((s.started - start) * 1000 + s.duration_ms for s in spans) or 1.0
+    # Whatever the other columns leave of the terminal
+    bar_width = max(10, console.width - 64)
+    table = Table(title=f"⏱️  Turn {spans[0].turn} latency ({total_ms:.0f}ms)", show_header=True, header_style="bold cyan")
+    table.add_column("Node", style="magenta", no_wrap=True)
+    table.add_column("Timeline", no_wrap=True)
+    table.add_column("ms", justify="right", no_wrap=True)
+    table.add_column("Tokens in/out", justify="right", no_wrap=True)
+    table.add_column("DB", justify="right", no_wrap=True)
+    table.add_column("Cache", style="green", no_wrap=True)
+    for span in spans:
+        offset = int((span.started - start) * 1000 / total_ms * bar_width)
+        width = max(1, round(span.duration_ms / total_ms * bar_width))
+        color = "red" if span.status == "error" else "yellow" if span.llm_calls else "cyan"
+        # A retry shows as generate_sql #2, #3 ...
+        name = f"{span.node} #{span.attempt + 1}" if span.node == "generate_sql" and span.attempt else span.node
+        table.add_row(
+            name,
+            " " * min(offset, bar_width - width) + f"[{color}]{'█' * width}[/{color}]",
+            f"{span.duration_ms:.0f}",
+            f"{span.prompt_tokens}/{span.completion_tokens}" if span.llm_calls else "",
+            f"{span.db_ms:.0f}ms, {span.rows:,} rows" if span.node == "execute_query" and span.status == "ok" else "",
+            ", ".join(span.cache_hits),
+        )
+    console.print(table)
+    cost = sum(s.cost_usd for s in spans)
+    if cost:
+        console.print(f"[dim]💵 LLM cost this turn: ${cost:.4f}[/dim]")
+
+
+def export_metrics(path=""):
+    """`--metrics [file]`: prints Prometheus text, or writes .jsonl spans / .om OpenMetrics / Prometheus text."""
+    # Lazy like the other langchain imports here: the callback hook loads langchain_core
+    from agent.telemetry import telemetry
+
+    if not path:
+        console.print(telemetry.exposition(), markup=False, highlight=False)
+    elif path.endswith(".jsonl"):
+        console.print(f"[dim]📝 Wrote {telemetry.write_jsonl(path)} node spans to {path}[/dim]")
+    else:
+        with open(path, "w") as f:
+            f.write(telemetry.exposition(openmetrics=path.endswith(".om")))
+        console.print(f"[dim]📝 Wrote metrics to {path}[/dim]")
+
 def run_cli2(app):
     # A hardcoded thread_id ensures memory persists across restarts
     config = {"configurable": {"thread_id": "user_1234"}}
@@ -16,6 +71,8 @@ def run_cli2(app):
         border_style="cyan"
     ))
 
+    from langchain_core.messages import HumanMessage
+
     while True:
         try:
             user_input = input("\n[Query]: ")
@@ -57,13 +114,19 @@ def run_cli2(app):
 
 
 
-def run_cli(app):
+def run_cli(app=None):
+    """
+    Terminal loop. Without `app` the graph is taken from agent.graph.get_app()
+    on the first question, so the prompt shows while it is still being built.
+    """
     config = {"configurable": {"thread_id": "user_1234"}}
     debug_mode = False # Start with debug OFF
+    compactor = None
 
     console.print(Panel.fit(
         "[bold green]💹 Agentic Investment Analyst Online[/bold green]\n"
-        "[dim]Type '--debug' to toggle memory inspection.[/dim]",
+        "[dim]Type '--debug' to toggle memory inspection and latency waterfalls, "
+        "'--metrics \\[file.prom|file.om|file.jsonl]' to export metrics.[/dim]",
         border_style="cyan"
     ))
 
@@ -81,50 +144,111 @@ def run_cli(app):
                 console.print(f"🛠️  Debug Mode is now {status}")
                 continue # Skip the rest of the loop and wait for next input
 
+            if user_input.lower().startswith("--metrics"):
+                export_metrics(user_input[len("--metrics"):].strip())
+                continue
+
+            if app is None:
+                # Waits here if the background build has not finished yet
+                from agent.graph import get_app
+                app = get_app()
+            if compactor is None:
+                # Retention for agent_memory.db; runs in the background between turns, at most every CHECKPOINT_COMPACT_INTERVAL
+                compactor = CheckpointCompactor(app.checkpointer)
+            from langchain_core.messages import HumanMessage
+
             # 2. Prepare Graph Input
-            state_input = {"messages": [HumanMessage(content=user_input)]}
+            # A new question starts with a fresh retry budget
+            state_input = {"messages": [HumanMessage(content=user_input)], "error": "", "attempts": 0}
 
-            # 3. Stream Graph Execution
-            for event in app.stream(state_input, config=config):
-                for node_name, output in event.items():
-                    console.print(f"\n[dim]➔ Finished Node:[/dim] [bold magenta]{node_name}[/bold magenta]")
-
-                    # --- CONDITIONAL DEBUG SECTION ---
-                    if debug_mode:
-                # ... inside the debug section ...
-                        current_state = app.get_state(config)
-                        messages = current_state.values.get("messages", [])
-                        # 1. Update the Column definition to allow wrapping
-                        debug_table = Table(title="🪲 Message State Debugger", show_header=True, header_style="bold cyan")
-                        debug_table.add_column("Type", style="dim", width=15)
-                        debug_table.add_column("Content", overflow="fold") # <--- Magic happens here
-                        debug_table.add_column("ID", style="dim", width=10)
-
-                        for msg in messages:
-                            msg_type = msg.__class__.__name__
-                            color = "green" if "Human" in msg_type else "yellow"
-                            if "System" in msg_type: color = "blue"
-                            if "Remove" in msg_type: color = "red"
-
-                            # 2. Logic Change: Don't slice the SystemMessage!
-                            # We want to see the full summary, but maybe still truncate
-                            # massive raw DB results if they are too long.
-                            content = msg.content
-                            if len(content) > 500: # Only truncate if it's truly massive
-                                content = content[:500] + "... [TRUNCATED]"
-
-                            debug_table.add_row(f"[{color}]{msg_type}[/{color}]", content, str(msg.id)[:8])
-
-                        console.print(debug_table)
-
-                    # --- END DEBUG SECTION ---
-
-                    # 4. Standard Output Logic
-                    if node_name == "generate_sql" and "sql_query" in output:
-                        console.print(f"[dim]Generated SQL:[/dim] [cyan]{output['sql_query']}[/cyan]")
+            # 3. Stream Graph Execution, token by token for the LLM nodes
+            timer = TurnTimer()
+            live, streamed_text, streamed_nodes = None, "", set()
+            for kind, node_name, output in stream_turn(app, state_input, config, timer):
+                if kind == "token":
+                    if live is None:
+                        streamed_text = ""
+                        title = "📊 Analyst Insight" if node_name == "analysis" else "🧮 Generating SQL"
+                        live = Live(console=console, refresh_per_second=12, transient=node_name != "analysis")
+                        live.start()
+                    streamed_text += output
+                    live.update(Panel(Markdown(streamed_text), title=f"[bold green]{title}[/bold green]", border_style="green"))
+                    streamed_nodes.add(node_name)
+                    continue
 
-                    if node_name == "analysis" and "analysis" in output:
-                        console.print(Panel(output["analysis"], title="[bold green]📊 Analyst Insight[/bold green]", border_style="green"))
+                # A node finished: close the live view before anything else prints
+                # (the human review prompt needs the terminal back)
+                if live is not None:
+                    live.stop()
+                    live = None
+                if node_name == "__interrupt__":
+                    continue
+                output = output or {}
+                console.print(f"\n[dim]➔ Finished Node:[/dim] [bold magenta]{node_name}[/bold magenta]")
+                # --- CONDITIONAL DEBUG SECTION ---
+                if debug_mode:
+                    # ... inside the debug section ...
+                    current_state = app.get_state(config)
+                    messages = current_state.values.get("messages", [])
+                    # 1. Update the Column definition to allow wrapping
+                    debug_table = Table(title="🪲 Message State Debugger", show_header=True, header_style="bold cyan")
+                    debug_table.add_column("Type", style="dim", width=15)
+                    debug_table.add_column("Content", overflow="fold") # <--- Magic happens here
+                    debug_table.add_column("ID", style="dim", width=10)
+
+                    for msg in messages:
+                        msg_type = msg.__class__.__name__
+                        color = "green" if "Human" in msg_type else "yellow"
+                        if "System" in msg_type: color = "blue"
+                        if "Remove" in msg_type: color = "red"
+
+                        # 2. Logic Change: Don't slice the SystemMessage!
+                        # We want to see the full summary, but maybe still truncate
+                        # massive raw DB results if they are too long.
+                        content = msg.content
+                        if len(content) > 500: # Only truncate if it's truly massive
+                            content = content[:500] + "... [TRUNCATED]"
+
+                        debug_table.add_row(f"[{color}]{msg_type}[/{color}]", content, str(msg.id)[:8])
+
+                    console.print(debug_table)
+
+                # --- END DEBUG SECTION ---
+
+                # 4. Standard Output Logic
+                if node_name == "generate_sql" and "sql_query" in output:
+                    console.print(f"[dim]Generated SQL:[/dim] [cyan]{output['sql_query']}[/cyan]")
+
+                # Streamed analysis is already on screen in its panel
+                if node_name == "analysis" and "analysis" in output and node_name not in streamed_nodes:
+                    console.print(Panel(output["analysis"], title="[bold green]📊 Analyst Insight[/bold green]", border_style="green"))
+
+                # The chart is drawn straight from the cached PNG bytes
+                if node_name == "visualization" and output.get("chart_key"):
+                    import climage
+                    from agent.charts import chart_cache
+
+                    png = chart_cache.get(output["chart_key"])
+                    if png:
+                        print(climage.convert(BytesIO(png), is_unicode=True, width=100))
+
+            if live is not None:
+                live.stop()
+            if timer.first_token:
+                console.print(f"[dim]⏱️  Time to first token: {timer.report()}[/dim]")
+            if debug_mode:
+                from agent.telemetry import telemetry
+                print_waterfall(telemetry.turn(config["configurable"]["thread_id"]))
+            serde_stats = getattr(app.checkpointer.serde, "take_stats", None)
+            if serde_stats:
+                stats = serde_stats()
+                if stats["steps"]:
+                    written = stats["written_bytes"] + stats["blob_bytes"]
+                    console.print(
+                        f"[dim]💾 Checkpoints: {stats['steps']} steps, {stats['raw_bytes'] / stats['steps'] / 1024:.1f}KB/step "
+                        f"serialized -> {written / stats['steps'] / 1024:.1f}KB/step written ({stats['ratio']:.2f}x)[/dim]"
+                    )
+            compactor.maybe_compact()
 
         except KeyboardInterrupt:
             break